@@ -0,0 +1,122 @@
+"""
+BM25 lexical index over the CTCAE documents.
+
+Lexical matching catches exact clinical terms the embedding model blurs
+(e.g. "mucositis", "neutropenia") and needs no model at all, so it can serve
+results on its own while the embedding model is still loading. The index is
+built from the snapshot's documents on first use, once per knowledge base
+version.
+"""
+
+import re
+import math
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Words that carry no signal in symptom queries or CTCAE grade text
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have i in is it my of on or that the to with "
+    "grade category symptom disorder".split()
+)
+# The first line of a CTCAE document is its term and category; its tokens count this many times
+TITLE_WEIGHT = 3
+
+_indexes: Dict[str, Tuple[str, "BM25Index"]] = {}
+_indexes_lock = threading.Lock()
+
+
+def tokenize(text: str) -> List[str]:
+    # Single characters ("t" from "can't", "b" from "hepatitis B") only add noise matches
+    return [
+        token for token in re.findall(r"[a-z0-9]+", text.casefold())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed document list, with postings kept as NumPy arrays
+    so scoring a query is a few vectorized adds.
+    """
+    def __init__(self, documents: Sequence[str], k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+
+        term_frequencies = []
+        for document in documents:
+            title, _, body = document.partition("\n")
+            counts = Counter(tokenize(body))
+            for token in tokenize(title):
+                counts[token] += TITLE_WEIGHT
+            term_frequencies.append(counts)
+
+        lengths = np.array([sum(counts.values()) for counts in term_frequencies], dtype='float32')
+        average_length = float(lengths.mean()) if self.size else 0.0
+        # Per-document length normalization of the BM25 denominator
+        self._length_norm = k1 * (1 - b + b * lengths / max(average_length, 1e-9))
+
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for document_id, counts in enumerate(term_frequencies):
+            for token, count in counts.items():
+                ids, frequencies = postings.setdefault(token, ([], []))
+                ids.append(document_id)
+                frequencies.append(count)
+        self._postings = {
+            token: (np.array(ids, dtype='int64'), np.array(frequencies, dtype='float32'))
+            for token, (ids, frequencies) in postings.items()
+        }
+        self._idf = {
+            token: math.log(1 + (self.size - len(ids) + 0.5) / (len(ids) + 0.5))
+            for token, (ids, _) in self._postings.items()
+        }
+
+    def __len__(self) -> int:
+        return self.size
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for the query."""
+        scores = np.zeros(self.size, dtype='float32')
+        for token in set(tokenize(query)):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            ids, frequencies = posting
+            scores[ids] += self._idf[token] * frequencies * (self.k1 + 1) / (frequencies + self._length_norm[ids])
+        return scores
+
+    def search(self, query: str, k: int, ids: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        The top-k (document id, score) pairs with a positive score, best first, among
+        all documents or only those in ids.
+        """
+        scores = self.scores(query)
+        if ids is not None:
+            restricted = np.zeros_like(scores)
+            restricted[ids] = scores[ids]
+            scores = restricted
+        n = min(k, int(np.count_nonzero(scores)))
+        if n == 0:
+            return []
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.lexsort((top, -scores[top]))]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def search_many(self, queries: Sequence[str], k: int) -> List[List[Tuple[int, float]]]:
+        return [self.search(query, k) for query in queries]
+
+
+def get_bm25_index(knowledge_base) -> BM25Index:
+    """Returns the BM25 index of a knowledge base snapshot, building it on first use per version."""
+    entry = _indexes.get(knowledge_base.directory)
+    if entry is not None and entry[0] == knowledge_base.version:
+        return entry[1]
+    with _indexes_lock:
+        entry = _indexes.get(knowledge_base.directory)
+        if entry is None or entry[0] != knowledge_base.version:
+            entry = (knowledge_base.version, BM25Index(knowledge_base.documents))
+            _indexes[knowledge_base.directory] = entry
+        return entry[1]
@@ -0,0 +1,76 @@
+"""
+CTCAE context bundles for the symptom multi-select options.
+
+Every option except "Other" names a CTCAE term, so its bundle is read off the
+CTCAE term index when the knowledge base snapshot is assembled; nothing is
+precomputed or stored. "Other" names no symptom until the patient describes
+it, so its bundle is GENERIC_BUNDLE_TERMS: the CTCAE grading scale for an
+adverse event without a term of its own. A symptom list made only of bundled
+symptoms is answered from the bundles (combinations are assembled lazily and
+cached), so the first follow-up turn after symptom selection never searches.
+"""
+
+import threading
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from .ctcae_terms import CTCAETermIndex, format_ctcae_context
+
+# The options offered in the SYMPTOM_SELECTION_SENT step
+SYMPTOM_SELECTION_OPTIONS = (
+    "Fever", "Nausea", "Vomiting", "Diarrhea", "Constipation", "Fatigue",
+    "Headache", "Mouth Sores", "Rash", "Shortness of Breath", "Other",
+)
+OTHER_OPTION = "Other"
+# CTCAE terms bundled for "Other": the generic grade scale of an unlisted adverse event
+GENERIC_BUNDLE_TERMS = ("General disorders and administration site conditions - Other, specify",)
+
+
+class ContextBundles:
+    """
+    CTCAE documents per option, keyed by canonical symptom id, with a lazy cache of
+    the formatted context for each combination of bundled symptoms.
+    """
+    def __init__(self, bundles: Dict[str, Tuple[str, ...]] = None):
+        self.bundles: Dict[str, Tuple[str, ...]] = dict(bundles or {})
+        self._combinations: Dict[Tuple[str, ...], str] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_terms(
+        cls,
+        ctcae_terms: CTCAETermIndex,
+        canonicalize,
+        options: Sequence[str] = SYMPTOM_SELECTION_OPTIONS,
+        generic_terms: Sequence[str] = GENERIC_BUNDLE_TERMS,
+    ) -> "ContextBundles":
+        """
+        Derives a bundle per option from the CTCAE term index; options that resolve to no
+        term are left to live retrieval, except "Other", which gets the generic terms.
+        """
+        bundles = {}
+        for option in options:
+            names = generic_terms if option == OTHER_OPTION else (canonicalize(option),)
+            documents = tuple(dict.fromkeys(term.document for name in names for term in ctcae_terms.lookup(name)))
+            if documents:
+                bundles[canonicalize(option)] = documents
+        return cls(bundles)
+
+    def __len__(self) -> int:
+        return len(self.bundles)
+
+    def __contains__(self, symptom: str) -> bool:
+        return symptom in self.bundles
+
+    def context_for(self, symptoms: Iterable[str]) -> Optional[str]:
+        """Returns the CTCAE context for the symptoms if every one of them is bundled, otherwise None."""
+        key = tuple(dict.fromkeys(symptoms))
+        if not key or any(symptom not in self.bundles for symptom in key):
+            return None
+
+        context = self._combinations.get(key)
+        if context is None:
+            documents = dict.fromkeys(document for symptom in key for document in self.bundles[symptom])
+            context = format_ctcae_context(documents)
+            with self._lock:
+                self._combinations[key] = context
+        return context
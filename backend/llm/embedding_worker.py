@@ -0,0 +1,170 @@
+"""
+Micro-batching embedding worker.
+
+Concurrent turns each encoding one query fight over the CPU. An
+EmbeddingBatcher feeds requests through an asyncio queue: the worker takes
+the first request, keeps collecting for up to max_wait_ms (or until
+max_batch_size texts), encodes them as one batch on a dedicated thread and
+resolves each caller's future. Async callers await encode_async(); code
+running in worker threads calls encode(), which submits to the event loop the
+server attached with attach_event_loop() and blocks on the result, so the
+batcher is a drop-in encoder for the retrieval functions. Calls made on the
+loop thread itself, or before a loop is attached, encode directly.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EMBEDDING_BATCH_SIZE = int(os.environ.get("ONCOLIFE_EMBEDDING_BATCH_SIZE", "32"))
+# How long the worker waits for more requests after the first one
+EMBEDDING_BATCH_WAIT_MS = float(os.environ.get("ONCOLIFE_EMBEDDING_BATCH_WAIT_MS", "5"))
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_batchers: Dict[str, "EmbeddingBatcher"] = {}
+_batchers_lock = threading.Lock()
+
+
+def attach_event_loop(loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+    """Sets the event loop that runs the batching workers (the running loop by default)."""
+    global _loop
+    _loop = loop or asyncio.get_running_loop()
+
+
+class EmbeddingBatcher:
+    """
+    Collects concurrent encode requests into batches for one model.
+    """
+    def __init__(self, model: Any, max_batch_size: int = EMBEDDING_BATCH_SIZE,
+                 max_wait_ms: float = EMBEDDING_BATCH_WAIT_MS):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        # One encoding thread: batches run back to back instead of competing for the CPU
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.requests = 0
+        self.texts = 0
+        self.batches = 0
+        self.direct_calls = 0
+        self.encode_seconds = 0.0
+        self.queue_wait_seconds = 0.0
+        self.batch_sizes: Counter = Counter()
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        # Runs on the loop thread; a new loop (e.g. in tests) gets a new queue and worker
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._worker.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        return self._queue
+
+    async def encode_async(self, texts: Sequence[str]) -> np.ndarray:
+        """Encodes texts as part of the next batch."""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype='float32')
+        future = asyncio.get_running_loop().create_future()
+        self._ensure_worker().put_nowait((texts, future, time.perf_counter()))
+        return await future
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Synchronous encode: batched through the attached loop when called from another
+        thread, otherwise encoded directly.
+        """
+        loop = _loop
+        on_loop_thread = False
+        if loop is not None and loop.is_running():
+            try:
+                on_loop_thread = asyncio.get_running_loop() is loop
+            except RuntimeError:
+                pass
+            if not on_loop_thread:
+                return asyncio.run_coroutine_threadsafe(self.encode_async(texts), loop).result()
+        self.direct_calls += 1
+        return np.asarray(self.model.encode(list(texts)), dtype='float32')
+
+    async def _collect(self) -> List[Tuple[List[str], asyncio.Future, float]]:
+        queue = self._queue
+        batch = [await queue.get()]
+        size = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = queue.get_nowait() if remaining <= 0 else await asyncio.wait_for(queue.get(), remaining)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            texts = [text for request_texts, _, _ in batch for text in request_texts]
+            started = time.perf_counter()
+            try:
+                embeddings = await loop.run_in_executor(
+                    self._executor, lambda: np.asarray(self.model.encode(texts), dtype='float32')
+                )
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.requests += len(batch)
+            self.texts += len(texts)
+            self.batches += 1
+            self.batch_sizes[len(texts)] += 1
+            self.encode_seconds += time.perf_counter() - started
+            self.queue_wait_seconds += sum(started - enqueued for _, _, enqueued in batch)
+
+            offset = 0
+            for request_texts, future, _ in batch:
+                if not future.done():
+                    future.set_result(embeddings[offset:offset + len(request_texts)])
+                offset += len(request_texts)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "texts": self.texts,
+            "batches": self.batches,
+            "direct_calls": self.direct_calls,
+            "mean_batch_size": self.texts / self.batches if self.batches else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "texts_per_second": self.texts / self.encode_seconds if self.encode_seconds else 0.0,
+            "mean_queue_wait_ms": self.queue_wait_seconds / self.requests * 1000 if self.requests else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+def get_embedding_batcher(model_id: str, model: Any) -> EmbeddingBatcher:
+    """Returns the process-wide batcher for a model, creating it on first use."""
+    batcher = _batchers.get(model_id)
+    if batcher is not None and batcher.model is model:
+        return batcher
+    with _batchers_lock:
+        batcher = _batchers.get(model_id)
+        if batcher is None or batcher.model is not model:
+            batcher = EmbeddingBatcher(model)
+            _batchers[model_id] = batcher
+        return batcher
+
+
+def embedding_worker_stats() -> Dict[str, Dict[str, Any]]:
+    """Metrics of every batcher, keyed by model id."""
+    return {model_id: batcher.stats() for model_id, batcher in _batchers.items()}
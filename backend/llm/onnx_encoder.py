@@ -0,0 +1,116 @@
+"""
+Quantized ONNX encoder for the sentence-transformers embedding model.
+
+Loading sentence_transformers pulls in torch, which dominates cold start and
+memory on CPU-only containers. OnnxEncoder runs an int8-quantized ONNX export
+of the same model with its tokenizer through onnxruntime and reproduces the
+sentence-transformers pipeline (mean pooling, then L2 normalization), so it
+can stand in for the SentenceTransformer wherever encode() is called.
+
+Export the model with `python backend/scripts/export_onnx_encoder.py` (needs
+sentence-transformers and onnxruntime) and serve it with `pip install
+onnxruntime tokenizers` and ONCOLIFE_EMBEDDING_BACKEND=onnx.
+"""
+
+import os
+import re
+import json
+from typing import Any, Dict, Sequence
+
+import numpy as np
+
+# Lazy-load onnxruntime and tokenizers to avoid loading them on every import
+onnxruntime = None
+tokenizers = None
+
+ONNX_MODEL_FILENAME = "model_int8.onnx"
+TOKENIZER_FILENAME = "tokenizer.json"
+ENCODER_CONFIG_FILENAME = "encoder_config.json"
+
+# "torch" (sentence-transformers) or "onnx"
+EMBEDDING_BACKEND = os.environ.get("ONCOLIFE_EMBEDDING_BACKEND", "torch").lower()
+# Directory holding the exported models; defaults to ~/.cache/oncolife/onnx
+ONNX_MODEL_DIR = os.environ.get("ONCOLIFE_ONNX_MODEL_DIR", "")
+
+
+def _import_onnx_libraries():
+    global onnxruntime, tokenizers
+    if onnxruntime is None:
+        import onnxruntime as ort
+        onnxruntime = ort
+    if tokenizers is None:
+        import tokenizers as tk
+        tokenizers = tk
+
+
+def onnx_model_dir(model_name: str, base_dir: str = ONNX_MODEL_DIR) -> str:
+    """Returns the directory the ONNX export of a model is stored in."""
+    base_dir = base_dir or os.path.join(os.path.expanduser("~"), ".cache", "oncolife", "onnx")
+    return os.path.join(base_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name) + "-int8")
+
+
+def embedding_model_id(model_name: str, backend: str = EMBEDDING_BACKEND) -> str:
+    """Identifies a model and backend, so embeddings from different backends are cached apart."""
+    return model_name if backend != "onnx" else f"{model_name}@onnx-int8"
+
+
+def write_encoder_config(model_dir: str, config: Dict[str, Any]) -> None:
+    with open(os.path.join(model_dir, ENCODER_CONFIG_FILENAME), 'w') as f:
+        json.dump(config, f, indent=2)
+
+
+class OnnxEncoder:
+    """
+    Sentence encoder backed by an onnxruntime session, with the same encode()
+    contract as SentenceTransformer for the calls made in this package.
+    """
+    def __init__(self, model_dir: str, threads: int = 0):
+        _import_onnx_libraries()
+        with open(os.path.join(model_dir, ENCODER_CONFIG_FILENAME), 'r') as f:
+            config = json.load(f)
+        self.model_dir = model_dir
+        self.max_seq_length = config.get("max_seq_length", 256)
+        self.normalize = config.get("normalize", True)
+        self.dimension = config["dimension"]
+
+        self.tokenizer = tokenizers.Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILENAME))
+        self.tokenizer.enable_truncation(self.max_seq_length)
+        self.tokenizer.enable_padding(pad_id=config.get("pad_token_id", 0), pad_token=config.get("pad_token", "[PAD]"))
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, ONNX_MODEL_FILENAME), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {node.name for node in self.session.get_inputs()}
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        sentences = [sentences] if single else list(sentences)
+        if not sentences:
+            return np.zeros((0, self.dimension), dtype='float32')
+
+        batches = [self._encode_batch(sentences[i:i + batch_size]) for i in range(0, len(sentences), batch_size)]
+        embeddings = np.concatenate(batches)
+        return embeddings[0] if single else embeddings
+
+    def _encode_batch(self, sentences: Sequence[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(list(sentences))
+        input_ids = np.array([e.ids for e in encodings], dtype='int64')
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype='int64')
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            inputs["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype='int64')
+
+        token_embeddings = self.session.run(None, inputs)[0]
+
+        # Mean pooling over the real tokens, as in the sentence-transformers Pooling module
+        mask = attention_mask[..., None].astype('float32')
+        embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings.astype('float32')
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
@@ -0,0 +1,104 @@
+"""
+Retrieval-result cache.
+
+The symptom list rarely changes between FOLLOWUP_QUESTIONS turns and many
+patients share the same symptom sets, so the formatted CTCAE context and the
+documents behind it are cached per (kb version, k, sorted symptom set) with
+LRU and TTL eviction. A hit skips the term lookup, encoding and search.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+RETRIEVAL_CACHE_SIZE = int(os.environ.get("ONCOLIFE_RETRIEVAL_CACHE_SIZE", "512"))
+# Seconds a cached result stays valid; 0 disables expiry
+RETRIEVAL_CACHE_TTL = float(os.environ.get("ONCOLIFE_RETRIEVAL_CACHE_TTL", "3600"))
+
+RetrievalKey = Tuple[str, int, Tuple[str, ...]]
+
+_cache: Optional["RetrievalCache"] = None
+_cache_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class RetrievalResult:
+    context: str
+    documents: Tuple[str, ...]
+
+
+def retrieval_key(symptoms: Iterable[str], kb_version: str, k: int) -> RetrievalKey:
+    """Cache key for a symptom set: order and duplicates do not matter."""
+    return (kb_version, k, tuple(sorted(set(symptoms))))
+
+
+class RetrievalCache:
+    """
+    Thread-safe LRU of retrieval results whose entries also expire after a TTL.
+    """
+    def __init__(self, max_size: int = RETRIEVAL_CACHE_SIZE, ttl: float = RETRIEVAL_CACHE_TTL,
+                 clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries: "OrderedDict[RetrievalKey, Tuple[float, RetrievalResult]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: RetrievalKey) -> Optional[RetrievalResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl > 0 and entry[0] <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: RetrievalKey, result: RetrievalResult) -> None:
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """Returns the process-wide retrieval cache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RetrievalCache()
+    return _cache
@@ -0,0 +1,189 @@
+"""
+Symptom-scoped sections of the general knowledge documents.
+
+The alerts configuration, the written chatbot documentation and the UKONS
+triage toolkit are split into per-symptom sections so a prompt only carries
+the sections for the patient's symptoms plus the global red-flag material.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+GLOBAL_KEY = "global"
+
+# Red-flag symptoms whose sections are included in every prompt
+RED_FLAG_KEYS = frozenset({"trouble_breathing", "chest_pain", "significant_bleeding", "dehydration"})
+
+# Maps document headings and patient-facing names onto the symptom ids used in questions.json
+SYMPTOM_ALIASES = {
+    "bleeding_bruising": "bleeding",
+    "bruising": "bleeding",
+    "eye_problems": "eye_complaints",
+    "ocular_eye_problems": "eye_complaints",
+    "mucositis_oral": "mouth_sores",
+    "mouth_or_throat_sores": "mouth_sores",
+    "anorexia": "no_appetite",
+    "loss_of_appetite": "no_appetite",
+    "diarrhoea": "diarrhea",
+    "urinary": "urinary_problems",
+    "urinary_issues": "urinary_problems",
+    "skin": "skin_rash",
+    "rash": "skin_rash",
+    "skin_rash_or_redness": "skin_rash",
+    "neurosensory_motor": "neuropathy",
+    "numbness_or_tingling": "neuropathy",
+    "fatigue_performance_status": "fatigue",
+    "fever_on_sact": "fever",
+    "fever_not_on_sact": "fever",
+    "shortness_of_breath": "trouble_breathing",
+    "consciousness_cognitive_disturbance": "confusion",
+}
+
+# Lines in the written documentation that start global material after the last symptom
+WRITTEN_DOC_GLOBAL_HEADINGS = ("After summary", "Multi-Day Symptom Tracking", "Patient Guidance")
+
+
+@dataclass(frozen=True)
+class Section:
+    """A contiguous piece of a document that applies to one symptom (or to all)."""
+    key: str
+    title: str
+    text: str
+
+
+def normalize_symptom(name: str) -> str:
+    """Maps a free-form symptom name or heading onto a section key."""
+    slug = re.sub(r"[^a-z0-9]+", "_", name.strip().lower()).strip("_")
+    return SYMPTOM_ALIASES.get(slug, slug)
+
+
+def parse_alert_sections(text: str) -> List[Section]:
+    """
+    Splits oncolife_alerts_configuration.txt into one section per `id:` block,
+    keyed by the block's `symptom:` field.
+    """
+    sections = []
+    block: List[str] = []
+    for line in text.splitlines():
+        if line.startswith("id:"):
+            block = [line]
+        elif block:
+            block.append(line)
+            if line.startswith("reason:"):
+                sections.append(_alert_section(block))
+                block = []
+    if block:
+        sections.append(_alert_section(block))
+    return sections
+
+
+def _alert_section(lines: List[str]) -> Section:
+    fields = dict(
+        line.split(":", 1) for line in lines
+        if ":" in line and not line.startswith(('"', " "))
+    )
+    key = normalize_symptom(fields.get("symptom", GLOBAL_KEY))
+    return Section(key=key, title=fields["id"].strip(), text="\n".join(lines).strip())
+
+
+def parse_written_doc_sections(text: str) -> List[Section]:
+    """
+    Splits written_chatbot_docs.txt at each symptom heading (a line followed by
+    "Short Questions:"); the overview and closing notes become global sections.
+    """
+    lines = text.splitlines()
+    starts: List[Tuple[int, str]] = []
+    for i, line in enumerate(lines):
+        following = next((l for l in lines[i + 1:] if l.strip()), "")
+        if line.strip() and following.strip() == "Short Questions:":
+            starts.append((i, normalize_symptom(line)))
+        elif line.startswith(WRITTEN_DOC_GLOBAL_HEADINGS):
+            starts.append((i, GLOBAL_KEY))
+    return _split_lines(lines, starts)
+
+
+def parse_pdf_sections(text: str) -> List[Section]:
+    """
+    Splits the UKONS triage toolkit text at its numbered toxicity entries
+    ("1. Shortness of breath", ...). The legend and the closing caution are global.
+    """
+    lines = text.splitlines()
+    starts: List[Tuple[int, str]] = []
+    for i, line in enumerate(lines):
+        match = re.match(r"^\d{1,2}\.\s+(\S.*)$", line.strip())
+        if match:
+            starts.append((i, normalize_symptom(match.group(1))))
+        elif line.startswith("CAUTION!"):
+            starts.append((i, GLOBAL_KEY))
+    return _split_lines(lines, starts)
+
+
+def _split_lines(lines: List[str], starts: List[Tuple[int, str]]) -> List[Section]:
+    """Cuts lines into sections at the given starts; anything before the first start is global."""
+    bounds = [(0, GLOBAL_KEY)] + starts if not starts or starts[0][0] > 0 else starts
+    sections = []
+    for n, (start, key) in enumerate(bounds):
+        end = bounds[n + 1][0] if n + 1 < len(bounds) else len(lines)
+        body = "\n".join(lines[start:end]).strip()
+        if body:
+            sections.append(Section(key=key, title=lines[start].strip(), text=body))
+    return _dedupe(sections)
+
+
+def _dedupe(sections: Iterable[Section]) -> List[Section]:
+    # The UKONS PDF repeats its single table on every page
+    seen = set()
+    unique = []
+    for section in sections:
+        if (section.key, section.text) not in seen:
+            seen.add((section.key, section.text))
+            unique.append(section)
+    return unique
+
+
+SECTION_PARSERS: Dict[str, Callable[[str], List[Section]]] = {
+    "oncolife_alerts_configuration.txt": parse_alert_sections,
+    "written_chatbot_docs.txt": parse_written_doc_sections,
+    "ukons_triage_toolkit_v3_final.pdf": parse_pdf_sections,
+}
+
+
+class SectionIndex:
+    """
+    Index of the general documents, sectioned by symptom where a parser exists.
+
+    Documents without a parser (e.g. the bot instructions) are always included whole.
+    """
+    def __init__(self, documents: Sequence[Tuple[str, str]]):
+        self._documents: List[Tuple[str, str, Optional[List[Section]]]] = []
+        for filename, text in documents:
+            parser = SECTION_PARSERS.get(filename)
+            self._documents.append((filename, text, parser(text) if parser else None))
+
+    @property
+    def keys(self) -> frozenset:
+        """All symptom keys that have at least one section."""
+        return frozenset(
+            section.key for _, _, sections in self._documents if sections for section in sections
+        )
+
+    def context_for(self, symptoms: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        Returns one text per general document, in load order. With symptoms, sectioned
+        documents are cut down to the global, red-flag and matching symptom sections;
+        without symptoms every document is returned whole.
+        """
+        if not symptoms:
+            return [text for _, text, _ in self._documents]
+
+        wanted = {GLOBAL_KEY} | RED_FLAG_KEYS | {normalize_symptom(s) for s in symptoms}
+        context = []
+        for _, text, sections in self._documents:
+            if sections is None:
+                context.append(text)
+                continue
+            selected = [section.text for section in sections if section.key in wanted]
+            if selected:
+                context.append("\n\n".join(selected))
+        return context
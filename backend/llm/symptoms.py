@@ -0,0 +1,147 @@
+"""
+Symptom canonicalizer.
+
+Maps free-form symptom names ("Mouth Sores", "mouth sores", "SOB", "diarhea")
+onto canonical symptom ids so every symptom-keyed cache and retrieval sees one
+spelling. Exact names resolve through a dict; anything else is matched on
+character trigrams against the questions.json symptom ids, the synonym table
+and the CTCAE terms. A name with no match is kept as the patient wrote it
+("tingling in my toes"), which is what retrieval searches and the chat stores.
+"""
+
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .ctcae_terms import CTCAETermIndex, CTCAE_SYNONYMS, normalize_term
+from .sections import SYMPTOM_ALIASES, normalize_symptom
+
+# Minimum Dice similarity of trigram sets for a fuzzy match
+TRIGRAM_MATCH_THRESHOLD = 0.6
+
+# Canonicalized names are memoized; the multi-select options and common LLM
+# spellings hit the same few entries
+CANONICALIZE_CACHE_SIZE = 4096
+
+
+def trigrams(text: str) -> Set[str]:
+    """Character trigrams of a normalized name, padded so short words still match."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SymptomCanonicalizer:
+    """
+    Canonical symptom ids with an exact lookup table and a trigram index for fuzzy matches.
+
+    The canonical ids are the questions.json symptom ids plus the targets of the
+    synonym table and any extra ids (e.g. alert rule symptoms). CTCAE terms map onto
+    the canonical id whose synonyms point at them, or onto their own slug.
+    """
+    def __init__(
+        self,
+        symptom_ids: Iterable[str],
+        ctcae_terms: Optional[CTCAETermIndex] = None,
+        aliases: Dict[str, str] = SYMPTOM_ALIASES,
+    ):
+        self.symptom_ids: List[str] = list(dict.fromkeys(
+            [normalize_symptom(s) for s in symptom_ids] + list(aliases.values())
+        ))
+        # Normalized name -> canonical id
+        self._names: Dict[str, str] = {}
+        for symptom in self.symptom_ids:
+            self._add(symptom, symptom)
+        for alias, symptom in aliases.items():
+            self._add(alias, symptom)
+
+        if ctcae_terms is not None:
+            for symptom in self.symptom_ids:
+                for term in ctcae_terms.lookup(symptom):
+                    self._add(term.term, symptom)
+            for name, terms in CTCAE_SYNONYMS.items():
+                mapped = [self._names[normalize_term(t)] for t in terms if normalize_term(t) in self._names]
+                self._add(name, mapped[0] if mapped else normalize_symptom(name))
+            for term in ctcae_terms.terms:
+                self._add(term, normalize_symptom(term))
+
+        self._init_lookup()
+
+    @classmethod
+    def from_names(cls, symptom_ids: Iterable[str], names: Iterable[Tuple[str, str]]) -> "SymptomCanonicalizer":
+        """Restores a canonicalizer from its symptom ids and (normalized name, canonical id) table."""
+        canonicalizer = cls.__new__(cls)
+        canonicalizer.symptom_ids = list(symptom_ids)
+        canonicalizer._names = dict(names)
+        canonicalizer._init_lookup()
+        return canonicalizer
+
+    @property
+    def names(self) -> Dict[str, str]:
+        """Normalized name -> canonical id."""
+        return dict(self._names)
+
+    def _init_lookup(self) -> None:
+        self._vocabulary: List[str] = list(self._names)
+        # The trigram index is only needed for fuzzy matches, so it is built on first use
+        self._trigrams: Optional[Dict[str, List[int]]] = None
+        self._trigram_counts: List[int] = []
+        self._trigram_lock = threading.Lock()
+        self.canonicalize = lru_cache(maxsize=CANONICALIZE_CACHE_SIZE)(self._canonicalize)
+
+    def _trigram_index(self) -> Dict[str, List[int]]:
+        if self._trigrams is None:
+            with self._trigram_lock:
+                if self._trigrams is None:
+                    index: Dict[str, List[int]] = {}
+                    counts = []
+                    for n, name in enumerate(self._vocabulary):
+                        grams = trigrams(name)
+                        counts.append(len(grams))
+                        for gram in grams:
+                            index.setdefault(gram, []).append(n)
+                    self._trigram_counts = counts
+                    self._trigrams = index
+        return self._trigrams
+
+    def _add(self, name: str, symptom: str) -> None:
+        self._names.setdefault(normalize_term(name.replace("_", " ")), symptom)
+
+    def _canonicalize(self, name: str) -> str:
+        key = normalize_term(name.replace("_", " "))
+        if not key:
+            return ""
+        if key in self._names:
+            return self._names[key]
+        match = self.closest(key)
+        return self._names[match] if match else " ".join(name.split())
+
+    def closest(self, key: str) -> Optional[str]:
+        """Returns the vocabulary name most similar to a normalized key, if any is close enough."""
+        grams = trigrams(key)
+        index = self._trigram_index()
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for n in index.get(gram, ()):
+                shared[n] = shared.get(n, 0) + 1
+        best, best_score = None, TRIGRAM_MATCH_THRESHOLD
+        for n, count in shared.items():
+            score = 2 * count / (len(grams) + self._trigram_counts[n])
+            if score >= best_score:
+                best, best_score = n, score
+        return self._vocabulary[best] if best is not None else None
+
+    def canonicalize_all(self, names: Iterable[str]) -> List[str]:
+        """
+        Canonical ids for the names, deduplicated in first-seen order; unmatched free text
+        is deduplicated ignoring case and spacing.
+        """
+        merged: Dict[str, str] = {}
+        for name in names:
+            symptom = self.canonicalize(str(name)) if name else ""
+            if symptom:
+                merged.setdefault(normalize_term(symptom.replace("_", " ")), symptom)
+        return list(merged.values())
+
+    def merge(self, existing: Optional[Sequence[str]], new: Optional[Iterable[str]]) -> List[str]:
+        """Appends new symptoms to an existing symptom list, both canonicalized."""
+        return self.canonicalize_all(list(existing or []) + list(new or []))
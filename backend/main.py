@@ -2,6 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routers.chat.simple_chat_routes import router as chat_router
 from startup_optimizer import preload_everything
+from routers.chat.llm.embedding_worker import attach_event_loop
 
 # Pre-load models and data at startup
 print("🚀 Starting OncoLife Chatbot with optimization...")
@@ -21,6 +22,11 @@ app.add_middleware(
 # Include chat routes
 app.include_router(chat_router, prefix="/api")
 
+@app.on_event("startup")
+async def start_embedding_workers():
+    # Encodes from retrieval threads are batched on the server's event loop
+    attach_event_loop()
+
 @app.get("/")
 async def root():
     return {"message": "OncoLife Chatbot API is running"}
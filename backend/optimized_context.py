@@ -5,31 +5,24 @@ This version pre-loads models and caches data to work better on cloud platforms.
 """
 
 import os
-import json
-import docx
-import numpy as np
-from pypdf import PdfReader
-from typing import List, Dict, Any
+from typing import List
 import threading
 import time
 
-# Global cache for models and data
+from routers.chat.llm.knowledge_base import (
+    get_knowledge_base, get_embedding_model, warm_embedding_model,
+    load_docx, load_pdf, load_txt, VECTOR_STORE_FILENAME, DOCUMENTS_FILENAME,
+)
+from routers.chat.llm.context import ContextLoader
+from routers.chat.llm.bm25 import get_bm25_index
+from routers.chat.llm.categories import CATEGORY_FILTER, get_category_index
+from routers.chat.llm.retrieval import RETRIEVAL_MODE
+
+# Global cache for the embedding model
 _model_cache = {}
-_index_cache = {}
-_documents_cache = {}
 _initialized = False
 _init_lock = threading.Lock()
 
-def _import_embedding_libraries():
-    """Lazy import to avoid loading on every request."""
-    global sentence_transformers, faiss
-    if 'sentence_transformers' not in _model_cache:
-        import sentence_transformers as st
-        _model_cache['sentence_transformers'] = st
-    if 'faiss' not in _model_cache:
-        import faiss as f
-        _model_cache['faiss'] = f
-
 class OptimizedContextLoader:
     """
     Optimized context loader that pre-loads everything at startup.
@@ -37,11 +30,18 @@ class OptimizedContextLoader:
     def __init__(self, directory: str, model_name='all-MiniLM-L6-v2'):
         self.directory = directory
         self.model_name = model_name
-        self.vector_store_path = os.path.join(self.directory, "ctcae_index.faiss")
-        self.documents_path = os.path.join(self.directory, "ctcae_documents.json")
+        self.vector_store_path = os.path.join(self.directory, VECTOR_STORE_FILENAME)
+        self.documents_path = os.path.join(self.directory, DOCUMENTS_FILENAME)
+        # Term lookup and search are the chat's own pipeline; only the snapshot is chosen here
+        self._loader = ContextLoader(directory, model_name)
         
         # Initialize everything at startup
         self._initialize_all()
+
+    @property
+    def knowledge_base(self):
+        """The current snapshot; it may be swapped by a live reload between calls."""
+        return get_knowledge_base(self.directory)
     
     def _initialize_all(self):
         """Initialize all models and data at startup."""
@@ -55,23 +55,21 @@ class OptimizedContextLoader:
             start_time = time.time()
             
             try:
-                # Load embedding model
-                _import_embedding_libraries()
-                st = _model_cache['sentence_transformers']
-                _model_cache['model'] = st.SentenceTransformer(self.model_name)
-                print(f"✅ Loaded embedding model in {time.time() - start_time:.2f}s")
+                if RETRIEVAL_MODE == "dense":
+                    # Load embedding model
+                    _model_cache['model'] = get_embedding_model(self.model_name)
+                    print(f"✅ Loaded embedding model in {time.time() - start_time:.2f}s")
+                elif RETRIEVAL_MODE == "hybrid":
+                    # Lexical results are served until the model is ready
+                    warm_embedding_model(self.model_name)
                 
-                # Load FAISS index
-                if os.path.exists(self.vector_store_path) and os.path.exists(self.documents_path):
-                    f = _model_cache['faiss']
-                    _index_cache['index'] = f.read_index(self.vector_store_path)
-                    with open(self.documents_path, 'r') as file:
-                        _documents_cache['documents'] = json.load(file)
-                    print(f"✅ Loaded FAISS index in {time.time() - start_time:.2f}s")
-                else:
-                    print("⚠️ FAISS index not found, using fallback mode")
-                    _index_cache['index'] = None
-                    _documents_cache['documents'] = []
+                # Load the shared knowledge base snapshot (FAISS index, documents, text files)
+                knowledge_base = get_knowledge_base(self.directory)
+                print(f"✅ Loaded knowledge base in {time.time() - start_time:.2f}s")
+                if RETRIEVAL_MODE != "dense":
+                    get_bm25_index(knowledge_base)
+                if CATEGORY_FILTER:
+                    get_category_index(knowledge_base)
                 
                 _initialized = True
                 print(f"🎉 Context loader ready in {time.time() - start_time:.2f}s")
@@ -79,70 +77,38 @@ class OptimizedContextLoader:
             except Exception as e:
                 print(f"❌ Error initializing: {e}")
                 # Fallback to basic mode
-                _index_cache['index'] = None
-                _documents_cache['documents'] = []
                 _initialized = True
 
-    def retrieve_symptom_context_from_vector_store(self, symptoms: List[str], k: int = 5) -> str:
+    def retrieve_symptom_context_from_vector_store(self, symptoms: List[str], k: int = 5, knowledge_base=None) -> str:
         """
         Fast symptom context retrieval using pre-loaded models.
         """
-        if not _index_cache.get('index') or not symptoms:
+        knowledge_base = knowledge_base or self.knowledge_base
+        if not symptoms:
             return ""
+        symptoms = sorted(set(symptoms))
 
-        try:
-            model = _model_cache.get('model')
-            if not model:
-                return ""
-                
-            query = ", ".join(symptoms)
-            query_embedding = model.encode([query])[0]
-            query_embedding_np = np.array([query_embedding], dtype='float32')
+        bundled_context = knowledge_base.context_bundles.context_for(symptoms)
+        if bundled_context is not None:
+            return bundled_context
 
-            f = _model_cache['faiss']
-            distances, indices = _index_cache['index'].search(query_embedding_np, k)
-            
-            relevant_docs = [_documents_cache['documents'][i] for i in indices[0]]
-            
-            if not relevant_docs:
-                return ""
-
-            formatted_context = "### Relevant CTCAE v5 Criteria (from knowledge base)\n"
-            formatted_context += "\n---\n".join(relevant_docs)
-            
-            return formatted_context
-            
-        except Exception as e:
-            print(f"⚠️ Error in vector search: {e}")
-            return ""
+        if self._loader.model is None:
+            self._loader.model = _model_cache.get('model')
+        # Served from the shared retrieval cache when possible
+        return self._loader._cached_retrieval(symptoms, k, False, knowledge_base).context
 
     def load_context(self, symptoms: List[str] = None) -> str:
         """
         Fast context loading with pre-loaded data.
         """
-        full_context = []
-        
-        # Load static documents (cached)
-        for filename in os.listdir(self.directory):
-            if filename.endswith((".faiss", ".json", "system_prompt.txt")):
-                continue
-            
-            file_path = os.path.join(self.directory, filename)
-            content = ""
-            
-            if filename.endswith(".pdf"):
-                content = self._load_pdf(file_path)
-            elif filename.endswith(".docx"):
-                content = self._load_docx(file_path)
-            elif filename.endswith(".txt"):
-                content = self._load_txt(file_path)
-            
-            if content:
-                full_context.append(content)
+        # Pin one snapshot for the whole call so a concurrent reload can't mix versions
+        knowledge_base = self.knowledge_base
+        # Only the sections for these symptoms (plus red flags) are included
+        full_context = knowledge_base.sections.context_for(symptoms)
 
         # Add symptom-specific context
         if symptoms:
-            symptom_context = self.retrieve_symptom_context_from_vector_store(symptoms)
+            symptom_context = self.retrieve_symptom_context_from_vector_store(symptoms, knowledge_base=knowledge_base)
             if symptom_context:
                 full_context.insert(0, symptom_context)
         
@@ -151,8 +117,7 @@ class OptimizedContextLoader:
     def _load_docx(self, file_path: str) -> str:
         """Loads text from a .docx file."""
         try:
-            doc = docx.Document(file_path)
-            return "\n".join([para.text for para in doc.paragraphs])
+            return load_docx(file_path)
         except Exception as e:
             print(f"⚠️ Error loading DOCX: {e}")
             return ""
@@ -160,11 +125,7 @@ class OptimizedContextLoader:
     def _load_pdf(self, file_path: str) -> str:
         """Loads text from a .pdf file."""
         try:
-            reader = PdfReader(file_path)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() or ""
-            return text
+            return load_pdf(file_path)
         except Exception as e:
             print(f"⚠️ Error loading PDF: {e}")
             return ""
@@ -172,18 +133,14 @@ class OptimizedContextLoader:
     def _load_txt(self, file_path: str) -> str:
         """Loads text from a .txt file."""
         try:
-            with open(file_path, 'r') as f:
-                return f.read()
+            return load_txt(file_path)
         except Exception as e:
             print(f"⚠️ Error loading TXT: {e}")
             return ""
 
     def load_system_prompt(self) -> str:
         """Loads the system prompt."""
-        try:
-            prompt_path = os.path.join(self.directory, "oncolifebot_instructions.txt")
-            with open(prompt_path, 'r') as f:
-                return f.read()
-        except Exception as e:
-            print(f"⚠️ Error loading system prompt: {e}")
-            return "" 
\ No newline at end of file
+        prompt = self.knowledge_base.text("oncolifebot_instructions.txt")
+        if not prompt:
+            print("⚠️ Error loading system prompt: oncolifebot_instructions.txt not found")
+        return prompt
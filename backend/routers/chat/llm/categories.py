@@ -0,0 +1,244 @@
+"""
+CTCAE organ-system categories of the vector store documents.
+
+Every document header records its category ("Symptom/Disorder: Nausea
+(Category: Gastrointestinal disorders)"), so the category id of each vector
+is read off the documents it is stored with. A free-text symptom is routed to
+categories by the CTCAE term names, synonyms and body-part words it
+mentions; "nausea after chemo" only searches the Gastrointestinal entries,
+which is less work and keeps unrelated organ systems out of the prompt.
+Names spread over more than MAX_ROUTED_CATEGORIES categories (e.g. "pain")
+route nowhere, and a symptom with no route searches the whole index. A route
+is a preference, not a restriction: the patient's words need not appear in the
+routed entries ("I have a temperature" routes to Fever, whose grade table says
+"degrees C"), so a routed search with fewer than MIN_ROUTED_RESULTS hits is
+topped up from the unfiltered search.
+"""
+
+import os
+import re
+import threading
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .ctcae_terms import CTCAE_SYNONYMS, normalize_term
+from .numpy_index import NumpyFlatIndex
+
+CATEGORY_FILTER = os.environ.get("ONCOLIFE_CATEGORY_FILTER", "1") != "0"
+# A routing name whose terms span more categories than this says nothing about the organ system
+MAX_ROUTED_CATEGORIES = 2
+# Routes remembered per index; symptoms that reach the vector store are free text
+ROUTE_CACHE_SIZE = 4096
+# Routed searches with fewer hits than this are topped up from the unfiltered search
+MIN_ROUTED_RESULTS = 3
+
+GASTROINTESTINAL = "Gastrointestinal disorders"
+RESPIRATORY = "Respiratory, thoracic and mediastinal disorders"
+SKIN = "Skin and subcutaneous tissue disorders"
+RENAL = "Renal and urinary disorders"
+EYE = "Eye disorders"
+EAR = "Ear and labyrinth disorders"
+CARDIAC = "Cardiac disorders"
+NERVOUS = "Nervous system disorders"
+PSYCHIATRIC = "Psychiatric disorders"
+
+# Patient words that name an organ system but no CTCAE term
+CATEGORY_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "stomach": (GASTROINTESTINAL,),
+    "belly": (GASTROINTESTINAL,),
+    "tummy": (GASTROINTESTINAL,),
+    "bowel": (GASTROINTESTINAL,),
+    "bowels": (GASTROINTESTINAL,),
+    "stool": (GASTROINTESTINAL,),
+    "stools": (GASTROINTESTINAL,),
+    "mouth": (GASTROINTESTINAL,),
+    "gums": (GASTROINTESTINAL,),
+    "swallowing": (GASTROINTESTINAL,),
+    "breathing": (RESPIRATORY,),
+    "breath": (RESPIRATORY,),
+    "breathe": (RESPIRATORY,),
+    "breathless": (RESPIRATORY,),
+    "lungs": (RESPIRATORY,),
+    "skin": (SKIN,),
+    "itchy": (SKIN,),
+    "blisters": (SKIN,),
+    "urine": (RENAL,),
+    "urinating": (RENAL,),
+    "peeing": (RENAL,),
+    "bladder": (RENAL,),
+    "kidney": (RENAL,),
+    "eye": (EYE,),
+    "eyes": (EYE,),
+    "vision": (EYE,),
+    "ear": (EAR,),
+    "ears": (EAR,),
+    "hearing": (EAR,),
+    "heart": (CARDIAC,),
+    "heartbeat": (CARDIAC,),
+    "numb": (NERVOUS,),
+    "numbness": (NERVOUS,),
+    "dizzy": (NERVOUS,),
+    "anxious": (PSYCHIATRIC,),
+    "depressed": (PSYCHIATRIC,),
+}
+
+_HEADER_PATTERN = re.compile(r"^Symptom/Disorder: (.*) \(Category: (.*)\)$")
+
+_indexes: Dict[str, Tuple[str, "CategoryIndex"]] = {}
+_indexes_lock = threading.Lock()
+
+
+def parse_document_header(document: str) -> Tuple[str, str]:
+    """The (term, category) of a CTCAE document, or empty strings if it has no header."""
+    match = _HEADER_PATTERN.match(document.partition("\n")[0])
+    return (match.group(1), match.group(2)) if match else ("", "")
+
+
+class CategoryIndex:
+    """
+    Category id of every document, the documents of each category, and the
+    routing of symptoms onto categories.
+    """
+    def __init__(self, documents: Sequence[str],
+                 synonyms: Mapping[str, Tuple[str, ...]] = CTCAE_SYNONYMS,
+                 keywords: Mapping[str, Tuple[str, ...]] = CATEGORY_KEYWORDS):
+        headers = [parse_document_header(document) for document in documents]
+        self.names: Tuple[str, ...] = tuple(dict.fromkeys(category for _, category in headers if category))
+        ids = {name: category_id for category_id, name in enumerate(self.names)}
+        # -1 marks documents without a header; no route reaches them
+        self.category_ids = np.array([ids.get(category, -1) for _, category in headers], dtype='int16')
+
+        term_categories = {normalize_term(term): category for term, category in headers if term}
+        routing: Dict[str, set] = {}
+        for name in term_categories:
+            # A term name also names every longer term that contains it ("pain" -> "eye pain", ...)
+            padded = f" {name} "
+            routing[name] = {category for term, category in term_categories.items() if padded in f" {term} "}
+        for name, targets in synonyms.items():
+            routing.setdefault(normalize_term(name), set()).update(
+                term_categories[normalize_term(term)] for term in targets if normalize_term(term) in term_categories
+            )
+        for name, categories in keywords.items():
+            routing.setdefault(normalize_term(name), set()).update(category for category in categories if category in ids)
+
+        self._routes: Dict[str, Tuple[int, ...]] = {
+            name: tuple(sorted(ids[category] for category in categories))
+            for name, categories in routing.items() if 0 < len(categories) <= MAX_ROUTED_CATEGORIES
+        }
+        self._members: Dict[Tuple[int, ...], np.ndarray] = {}
+        self._routed: Dict[str, Optional[Tuple[int, ...]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def route(self, symptom: str) -> Optional[Tuple[int, ...]]:
+        """The category ids a symptom searches, or None to search every document."""
+        if symptom in self._routed:
+            return self._routed[symptom]
+        padded = f" {normalize_term(symptom)} "
+        categories = set()
+        for name, route in self._routes.items():
+            if f" {name} " in padded:
+                categories.update(route)
+        route = tuple(sorted(categories)) or None
+        if len(self._routed) < ROUTE_CACHE_SIZE:
+            self._routed[symptom] = route
+        return route
+
+    def members(self, route: Tuple[int, ...]) -> np.ndarray:
+        """Sorted ids of the documents in the given categories."""
+        members = self._members.get(route)
+        if members is None:
+            members = np.flatnonzero(np.isin(self.category_ids, route)).astype('int64')
+            self._members[route] = members
+        return members
+
+    def document_ids(self, symptom: str) -> Optional[np.ndarray]:
+        """The ids of the documents a symptom searches, or None for all of them."""
+        route = self.route(symptom)
+        return None if route is None else self.members(route)
+
+    def search(self, index: Any, queries: np.ndarray, k: int, symptoms: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Searches each query (one per symptom) within its symptom's categories, one
+        batched search per distinct route, in the layout of index.search. Queries with
+        fewer than MIN_ROUTED_RESULTS routed hits are topped up from one unfiltered search.
+        """
+        groups: Dict[Optional[Tuple[int, ...]], List[int]] = {}
+        for row, symptom in enumerate(symptoms):
+            groups.setdefault(self.route(symptom), []).append(row)
+        if list(groups) == [None]:
+            return index.search(queries, k)
+
+        distances = np.empty((len(queries), k), dtype='float32')
+        indices = np.empty((len(queries), k), dtype='int64')
+        for route, rows in groups.items():
+            ids = None if route is None else self.members(route)
+            distances[rows], indices[rows] = filtered_search(index, queries[rows], k, ids)
+
+        minimum = min(k, MIN_ROUTED_RESULTS)
+        thin = [row for row in range(len(queries)) if np.count_nonzero(indices[row] >= 0) < minimum]
+        if thin:
+            fallback_distances, fallback_indices = index.search(queries[thin], k)
+            for row, row_distances, row_indices in zip(thin, fallback_distances, fallback_indices):
+                hits = [(d, i) for d, i in zip(distances[row], indices[row]) if i >= 0]
+                hits += [(d, i) for d, i in zip(row_distances, row_indices) if i >= 0 and i not in indices[row]]
+                hits += [(np.inf, -1)] * (k - len(hits))
+                distances[row], indices[row] = zip(*hits[:k])
+        return distances, indices
+
+    def lexical_search(self, lexical_index: Any, symptom: str, k: int) -> List[Tuple[int, float]]:
+        """
+        BM25 hits of a symptom within its categories, topped up from the unfiltered
+        search when the route has fewer than MIN_ROUTED_RESULTS of them.
+        """
+        ids = self.document_ids(symptom)
+        hits = lexical_index.search(symptom, k, ids)
+        if ids is None or len(hits) >= min(k, MIN_ROUTED_RESULTS):
+            return hits
+        routed = {document_id for document_id, _ in hits}
+        return (hits + [hit for hit in lexical_index.search(symptom, k) if hit[0] not in routed])[:k]
+
+
+def filtered_search(index: Any, queries: np.ndarray, k: int, ids: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Searches only the given document ids: NumPy indexes score just those rows and FAISS
+    indexes use an ID selector. Index types without selector support (e.g. PQ) search
+    everything and drop the other ids.
+    """
+    if ids is None:
+        return index.search(queries, k)
+    if isinstance(index, NumpyFlatIndex):
+        return index.search(queries, k, ids=ids)
+
+    from .knowledge_base import _import_faiss
+    from .index_types import search_parameters
+    faiss = _import_faiss()
+    selector = faiss.IDSelectorBatch(ids)
+    try:
+        return index.search(queries, k, params=search_parameters(faiss, index, selector))
+    except RuntimeError:
+        pass
+
+    distances, indices = index.search(queries, index.ntotal)
+    filtered_distances = np.full((len(queries), k), np.inf, dtype='float32')
+    filtered_indices = np.full((len(queries), k), -1, dtype='int64')
+    for row in range(len(queries)):
+        keep = np.flatnonzero(np.isin(indices[row], ids))[:k]
+        filtered_distances[row, :len(keep)] = distances[row, keep]
+        filtered_indices[row, :len(keep)] = indices[row, keep]
+    return filtered_distances, filtered_indices
+
+
+def get_category_index(knowledge_base) -> CategoryIndex:
+    """Returns the category index of a knowledge base snapshot, building it on first use per version."""
+    entry = _indexes.get(knowledge_base.directory)
+    if entry is not None and entry[0] == knowledge_base.version:
+        return entry[1]
+    with _indexes_lock:
+        entry = _indexes.get(knowledge_base.directory)
+        if entry is None or entry[0] != knowledge_base.version:
+            entry = (knowledge_base.version, CategoryIndex(knowledge_base.documents))
+            _indexes[knowledge_base.directory] = entry
+        return entry[1]
@@ -0,0 +1,44 @@
+"""
+Bounded thread pool for retrieval and context assembly.
+
+Query encoding, vector search, file reads and prompt assembly all block, so
+async handlers await them through run_in_context_pool() instead of running
+them on the event loop, where one slow turn would stall every other
+connection. The pool is bounded so a burst of turns queues up instead of
+oversubscribing the CPU, and encodes issued from its threads are batched by
+the embedding worker on the caller's loop.
+"""
+
+import os
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from .embedding_worker import attach_event_loop
+
+CONTEXT_POOL_WORKERS = int(os.environ.get("ONCOLIFE_CONTEXT_POOL_WORKERS", "4"))
+
+T = TypeVar("T")
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_context_pool() -> ThreadPoolExecutor:
+    """Returns the process-wide context pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=CONTEXT_POOL_WORKERS, thread_name_prefix="context")
+    return _pool
+
+
+async def run_in_context_pool(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Runs a blocking retrieval or context call in the context pool and awaits its result."""
+    loop = asyncio.get_running_loop()
+    # Encodes from the pool threads are batched on this loop
+    attach_event_loop(loop)
+    return await loop.run_in_executor(get_context_pool(), functools.partial(func, *args, **kwargs))
@@ -0,0 +1,167 @@
+"""
+Bounded LRU cache of query embeddings.
+
+The same symptom strings are encoded over and over for different patients, so
+query embeddings are cached per model, keyed by normalized text. The cache
+counts hits, misses and evictions and can persist itself to an .npz file so it
+survives restarts.
+"""
+
+import os
+import re
+import atexit
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+EMBEDDING_CACHE_SIZE = int(os.environ.get("ONCOLIFE_EMBEDDING_CACHE_SIZE", "1024"))
+# Directory for persisted caches (one .npz per model); empty disables persistence
+EMBEDDING_CACHE_DIR = os.environ.get("ONCOLIFE_EMBEDDING_CACHE_DIR", "")
+# Persist after this many new entries (and at exit)
+EMBEDDING_CACHE_SAVE_EVERY = 64
+
+_caches: Dict[str, "EmbeddingCache"] = {}
+_caches_lock = threading.Lock()
+
+
+def normalize_query(text: str) -> str:
+    """Case-folds a query and collapses whitespace so trivially different spellings share an entry."""
+    return re.sub(r"\s+", " ", text.casefold()).strip()
+
+
+class EmbeddingCache:
+    """
+    Thread-safe LRU map from normalized query text to its embedding.
+    """
+    def __init__(self, max_size: int = EMBEDDING_CACHE_SIZE, path: Optional[str] = None):
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        if path:
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = normalize_query(text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, text: str, embedding: np.ndarray) -> None:
+        key = normalize_query(text)
+        with self._lock:
+            self._put(key, np.asarray(embedding, dtype='float32'))
+        if self.path and self._unsaved >= EMBEDDING_CACHE_SAVE_EVERY:
+            self.save()
+
+    def _put(self, key: str, embedding: np.ndarray) -> None:
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+        self._unsaved += 1
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def encode(self, model: Any, texts: Sequence[str]) -> np.ndarray:
+        """
+        Returns the embeddings for texts in order, encoding only the cache misses in one
+        batched call.
+        """
+        embeddings: List[Optional[np.ndarray]] = [self.get(text) for text in texts]
+        missing = list(dict.fromkeys(
+            normalize_query(text) for text, embedding in zip(texts, embeddings) if embedding is None
+        ))
+        if missing:
+            encoded = dict(zip(missing, np.asarray(model.encode(missing), dtype='float32')))
+            for key, embedding in encoded.items():
+                self.put(key, embedding)
+            embeddings = [
+                embedding if embedding is not None else encoded[normalize_query(text)]
+                for text, embedding in zip(texts, embeddings)
+            ]
+        return np.stack(embeddings)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def load(self) -> None:
+        """Loads persisted entries (oldest first), ignoring a missing or unreadable file."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                keys, matrix = list(data["keys"]), data["embeddings"]
+        except (OSError, KeyError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable embedding cache {self.path}: {e}")
+            return
+        with self._lock:
+            for key, embedding in zip(keys, matrix):
+                self._put(str(key), embedding)
+            self._unsaved = 0
+        print(f"✅ Loaded {len(keys)} cached query embeddings from {self.path}")
+
+    def save(self) -> None:
+        """Writes the entries to the cache file atomically."""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._entries:
+                return
+            keys = np.array(list(self._entries), dtype=str)
+            matrix = np.stack(list(self._entries.values()))
+            self._unsaved = 0
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez(tmp_path, keys=keys, embeddings=matrix)
+        os.replace(tmp_path, self.path)
+
+
+class CachedEncoder:
+    """Wraps a model so encode() goes through an embedding cache."""
+    def __init__(self, model: Any, cache: EmbeddingCache):
+        self.model = model
+        self.cache = cache
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        return self.cache.encode(self.model, texts)
+
+
+def get_embedding_cache(model_name: str) -> EmbeddingCache:
+    """Returns the process-wide embedding cache for a model, creating it on first use."""
+    cache = _caches.get(model_name)
+    if cache is not None:
+        return cache
+    with _caches_lock:
+        cache = _caches.get(model_name)
+        if cache is None:
+            path = None
+            if EMBEDDING_CACHE_DIR:
+                safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+                path = os.path.join(EMBEDDING_CACHE_DIR, f"{safe_name}.npz")
+            cache = EmbeddingCache(EMBEDDING_CACHE_SIZE, path)
+            if path:
+                atexit.register(cache.save)
+            _caches[model_name] = cache
+        return cache
@@ -0,0 +1,531 @@
+"""
+Process-wide knowledge base snapshot.
+
+Reading the model_inputs directory (FAISS index, CTCAE documents, PDF/DOCX/TXT
+files) is expensive, so it is done once per directory and the resulting
+immutable snapshot is shared by every context loader in the process.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
+
+import docx
+import numpy as np
+import pypdf
+from pypdf import PdfReader
+
+from .alert_rules import AlertEngine, ALERTS_FILENAME, compile_rule
+from .context_bundles import ContextBundles
+from .ctcae_terms import CTCAETermIndex, CTCAE_FILENAME
+from .document_store import open_document_store, read_vector_store
+from .index_types import configure_index
+from .kb_artifact import (
+    ARTIFACT_FILENAME, ArtifactError, open_artifact, read_artifact_version, write_artifact,
+    pack_strings, pack_records, pack_matrix, join_items, split_items, join_pairs, split_pairs,
+)
+from .numpy_index import NumpyFlatIndex
+from .onnx_encoder import EMBEDDING_BACKEND, OnnxEncoder, embedding_model_id, onnx_model_dir
+from .question_bank import Question, QuestionBank, QUESTIONS_FILENAME
+from .sections import SectionIndex
+from .symptoms import SymptomCanonicalizer
+from .text_cache import cached_extract, file_sha256
+
+# Lazy-load sentence-transformers and faiss to avoid loading them on every import
+sentence_transformers = None
+faiss = None
+
+VECTOR_STORE_FILENAME = "ctcae_index.faiss"
+EMBEDDINGS_FILENAME = "ctcae_embeddings.npy"
+DOCUMENTS_FILENAME = "ctcae_documents.json"
+SYSTEM_PROMPT_FILENAME = "system_prompt.txt"
+
+# "faiss", or "numpy" for exact search over EMBEDDINGS_FILENAME without importing faiss
+SEARCH_ENGINE = os.environ.get("ONCOLIFE_SEARCH_ENGINE", "faiss").lower()
+
+# Global snapshot and model caches, guarded by their locks
+_knowledge_bases: Dict[str, "KnowledgeBase"] = {}
+_knowledge_base_lock = threading.Lock()
+_embedding_models: Dict[str, Any] = {}
+_embedding_model_lock = threading.Lock()
+_embedding_model_warmups: Dict[str, threading.Thread] = {}
+_watchers: Dict[str, "KnowledgeBaseWatcher"] = {}
+
+
+def _import_embedding_libraries():
+    global sentence_transformers
+    if sentence_transformers is None:
+        import sentence_transformers as st
+        sentence_transformers = st
+
+
+def _import_faiss():
+    global faiss
+    if faiss is None:
+        import faiss as f
+        faiss = f
+    return faiss
+
+
+@dataclass(frozen=True)
+class KnowledgeBase:
+    """
+    Immutable snapshot of everything loaded from a model_inputs directory.
+
+    A reload builds a new snapshot and swaps it in; callers that already hold a
+    reference keep using the old version until they finish.
+    """
+    directory: str
+    version: str
+    texts: Mapping[str, str]
+    sections: SectionIndex
+    index: Any
+    documents: Sequence[str]
+    question_bank: QuestionBank
+    alert_engine: AlertEngine
+    ctcae_terms: CTCAETermIndex
+    symptoms: SymptomCanonicalizer
+    context_bundles: ContextBundles
+
+    @property
+    def system_prompt(self) -> str:
+        return self.texts.get(SYSTEM_PROMPT_FILENAME, "")
+
+    def text(self, filename: str) -> str:
+        """Returns the extracted text of a file in the snapshot, or an empty string."""
+        return self.texts.get(filename, "")
+
+
+# Bump when extraction logic changes so cached text is re-extracted
+PDF_EXTRACTOR_VERSION = f"pypdf-{pypdf.__version__}-1"
+DOCX_EXTRACTOR_VERSION = "python-docx-1"
+
+
+def _extract_docx(file_path: str) -> str:
+    doc = docx.Document(file_path)
+    return "\n".join([para.text for para in doc.paragraphs])
+
+
+def _extract_pdf(file_path: str) -> str:
+    reader = PdfReader(file_path)
+    text = ""
+    for page in reader.pages:
+        text += page.extract_text() or ""
+    return text
+
+
+def load_docx(file_path: str) -> str:
+    """Loads text from a .docx file, using the extracted-text cache."""
+    return cached_extract(file_path, _extract_docx, DOCX_EXTRACTOR_VERSION)
+
+
+def load_pdf(file_path: str) -> str:
+    """Loads text from a .pdf file, using the extracted-text cache."""
+    return cached_extract(file_path, _extract_pdf, PDF_EXTRACTOR_VERSION)
+
+
+def load_txt(file_path: str) -> str:
+    """Loads text from a .txt file."""
+    with open(file_path, 'r') as f:
+        return f.read()
+
+
+def load_document(file_path: str) -> str:
+    """Loads text from a .pdf, .docx or .txt file, or returns an empty string."""
+    if file_path.endswith(".pdf"):
+        return load_pdf(file_path)
+    elif file_path.endswith(".docx"):
+        return load_docx(file_path)
+    elif file_path.endswith(".txt"):
+        return load_txt(file_path)
+    return ""
+
+
+def _source_filenames(directory: str):
+    """
+    Lists the source files of a model_inputs directory, skipping hidden files, caches
+    and the compiled artifact (which is derived from the other files).
+    """
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        filename for filename in os.listdir(directory)
+        if not filename.startswith(".") and filename != ARTIFACT_FILENAME
+        and os.path.isfile(os.path.join(directory, filename))
+    )
+
+
+def directory_fingerprint(directory: str) -> Tuple[Tuple[str, int, int], ...]:
+    """Cheap change detector: (name, size, mtime) of every source file."""
+    fingerprint = []
+    for filename in _source_filenames(directory):
+        try:
+            stat = os.stat(os.path.join(directory, filename))
+        except FileNotFoundError:
+            continue
+        fingerprint.append((filename, stat.st_size, stat.st_mtime_ns))
+    return tuple(fingerprint)
+
+
+def compute_version(directory: str) -> str:
+    """Returns a short id derived from the names and contents of the source files."""
+    digest = hashlib.sha256()
+    for filename in _source_filenames(directory):
+        digest.update(filename.encode("utf-8"))
+        digest.update(file_sha256(os.path.join(directory, filename)).encode("ascii"))
+    return digest.hexdigest()[:12]
+
+
+def load_vector_index(directory: str, engine: str = SEARCH_ENGINE) -> Any:
+    """
+    Opens the vector index of a directory with the configured search engine, or
+    returns None if there is none. The NumPy engine falls back to FAISS when the
+    embeddings file is missing.
+    """
+    embeddings_path = os.path.join(directory, EMBEDDINGS_FILENAME)
+    if engine == "numpy":
+        if os.path.exists(embeddings_path):
+            return NumpyFlatIndex.from_npy(embeddings_path)
+        print(f"Warning: {EMBEDDINGS_FILENAME} not found; using the FAISS index instead. "
+              f"Export it with `python backend/scripts/export_embeddings.py`.")
+    elif engine != "faiss":
+        print(f"Warning: Unknown search engine {engine!r}; using FAISS.")
+
+    vector_store_path = os.path.join(directory, VECTOR_STORE_FILENAME)
+    if os.path.exists(vector_store_path):
+        faiss = _import_faiss()
+        return configure_index(faiss, read_vector_store(faiss, vector_store_path))
+    return None
+
+
+def build_knowledge_base(directory: str) -> KnowledgeBase:
+    """
+    Reads the model_inputs directory from disk and returns a new snapshot. A compiled
+    artifact for the current version of the directory is used instead of the sources.
+    """
+    directory = os.path.abspath(directory)
+    version = compute_version(directory)
+
+    artifact_path = os.path.join(directory, ARTIFACT_FILENAME)
+    if os.path.exists(artifact_path):
+        if read_artifact_version(artifact_path) == version:
+            try:
+                return load_knowledge_base_artifact(artifact_path, directory)
+            except (ArtifactError, KeyError, ValueError) as e:
+                print(f"Warning: Could not load {ARTIFACT_FILENAME} ({e}); reading the sources instead.")
+        else:
+            print(f"Warning: {ARTIFACT_FILENAME} is stale; rebuild it with "
+                  f"`python backend/scripts/compile_kb_artifact.py`.")
+
+    texts = {}
+    for filename in _source_filenames(directory):
+        if filename.endswith((".faiss", ".json", ".npy")):
+            continue
+
+        content = load_document(os.path.join(directory, filename))
+        if content:
+            texts[filename] = content
+
+    index = None
+    documents = ()
+    documents_path = os.path.join(directory, DOCUMENTS_FILENAME)
+    if os.path.exists(documents_path):
+        index = load_vector_index(directory)
+    if index is not None:
+        print(f"Loaded vector index ({type(index).__name__}, {index.ntotal} vectors) and documents.")
+        documents = open_document_store(documents_path)
+    else:
+        print("Warning: Pre-built vector store not found. Symptom context will be disabled.")
+        print(f"Please run `python backend/scripts/build_vector_store.py` to generate it.")
+
+    questions_path = os.path.join(directory, QUESTIONS_FILENAME)
+    question_bank = QuestionBank.from_file(questions_path) if os.path.exists(questions_path) else QuestionBank([])
+
+    ctcae = {}
+    ctcae_path = os.path.join(directory, CTCAE_FILENAME)
+    if os.path.exists(ctcae_path):
+        with open(ctcae_path, 'r') as f:
+            ctcae = json.load(f)
+
+    knowledge_base = assemble_knowledge_base(
+        directory=directory,
+        version=version,
+        texts=texts,
+        index=index,
+        documents=documents,
+        question_bank=question_bank,
+        alert_engine=AlertEngine.from_text(texts.get(ALERTS_FILENAME, "")),
+        ctcae=ctcae,
+    )
+    print(f"Knowledge base version {version} loaded from {directory}")
+    return knowledge_base
+
+
+def assemble_knowledge_base(
+    directory: str,
+    version: str,
+    texts: Mapping[str, str],
+    index: Any,
+    documents: Sequence[str],
+    question_bank: QuestionBank,
+    alert_engine: AlertEngine,
+    ctcae: Mapping[str, Mapping[str, Mapping[str, str]]],
+    symptoms: Optional[SymptomCanonicalizer] = None,
+) -> KnowledgeBase:
+    """Builds the derived indexes (unless given) and returns the snapshot."""
+    general_documents = [(filename, text) for filename, text in texts.items() if filename != SYSTEM_PROMPT_FILENAME]
+    ctcae_terms = CTCAETermIndex(ctcae)
+    symptoms = symptoms or SymptomCanonicalizer(
+        list(question_bank.symptoms) + [rule.symptom for rule in alert_engine.rules], ctcae_terms
+    )
+    return KnowledgeBase(
+        directory=directory,
+        version=version,
+        texts=MappingProxyType(dict(texts)),
+        sections=SectionIndex(general_documents),
+        index=index,
+        documents=documents,
+        question_bank=question_bank,
+        alert_engine=alert_engine,
+        ctcae_terms=ctcae_terms,
+        symptoms=symptoms,
+        context_bundles=ContextBundles.from_terms(ctcae_terms, symptoms.canonicalize),
+    )
+
+
+# ===============================================================================
+# Compiled artifact
+# ===============================================================================
+
+def compile_knowledge_base_artifact(directory: str, output_path: Optional[str] = None) -> str:
+    """
+    Compiles a model_inputs directory into a single memory-mappable artifact and
+    returns its path (by default ARTIFACT_FILENAME inside the directory).
+    """
+    directory = os.path.abspath(directory)
+    output_path = output_path or os.path.join(directory, ARTIFACT_FILENAME)
+    knowledge_base = build_knowledge_base(directory)
+
+    sections = {
+        "texts": pack_records(knowledge_base.texts.items(), 2),
+        "documents": pack_strings(knowledge_base.documents),
+        "questions": pack_records(
+            ((q.id, q.text, q.symptom, q.data_attribute, q.phase) for q in knowledge_base.question_bank.questions), 5
+        ),
+        "alert_rules": pack_records(
+            (
+                (rule.id, rule.symptom, rule.when, str(rule.override_to_grade), rule.reason,
+                 join_items(rule.long_questions))
+                for rule in knowledge_base.alert_engine.rules
+            ), 6
+        ),
+        "ctcae": pack_records(
+            (
+                (term.category, term.term, join_pairs(term.grades))
+                for term in knowledge_base.ctcae_terms.terms.values()
+            ), 3
+        ),
+        "symptom_ids": pack_strings(knowledge_base.symptoms.symptom_ids),
+        "symptom_names": pack_records(knowledge_base.symptoms.names.items(), 2),
+    }
+    index = knowledge_base.index
+    embeddings_path = os.path.join(directory, EMBEDDINGS_FILENAME)
+    if index is not None:
+        # The exported matrix is exact whatever the index type (IVF and PQ cannot reconstruct it)
+        embeddings = np.load(embeddings_path) if os.path.exists(embeddings_path) else index.reconstruct_n(0, index.ntotal)
+        sections["embeddings"] = pack_matrix(embeddings, index.metric_type)
+
+    write_artifact(output_path, knowledge_base.version, sections)
+    print(f"📦 Compiled knowledge base {knowledge_base.version} into {output_path} "
+          f"({os.path.getsize(output_path) / 1024:.0f} KB)")
+    return output_path
+
+
+def load_knowledge_base_artifact(artifact_path: str, directory: Optional[str] = None) -> KnowledgeBase:
+    """
+    Opens a compiled artifact with a read-only memory map and returns its snapshot.
+    Documents are decoded on access and nothing is parsed from JSON. The FAISS index
+    is memory-mapped from the vector store next to the artifact (identical, since the
+    versions match) and only filled from the embedding matrix when that file is absent.
+    """
+    start_time = time.time()
+    artifact = open_artifact(artifact_path)
+    directory = os.path.abspath(directory or os.path.dirname(artifact_path))
+
+    index = None
+    vector_store_path = os.path.join(directory, VECTOR_STORE_FILENAME)
+    if "embeddings" in artifact and SEARCH_ENGINE == "numpy":
+        # Searches the mapped matrix in place
+        index = NumpyFlatIndex(*artifact.matrix("embeddings"))
+    elif "embeddings" in artifact and os.path.exists(vector_store_path):
+        faiss = _import_faiss()
+        index = configure_index(faiss, read_vector_store(faiss, vector_store_path))
+    elif "embeddings" in artifact:
+        embeddings, metric_type = artifact.matrix("embeddings")
+        index = _import_faiss().IndexFlat(embeddings.shape[1], metric_type)
+        index.add(embeddings)
+
+    ctcae: Dict[str, Dict[str, Dict[str, str]]] = {}
+    for category, term, grades in artifact.records("ctcae", 3):
+        ctcae.setdefault(category, {})[term] = dict(split_pairs(grades))
+
+    knowledge_base = assemble_knowledge_base(
+        directory=directory,
+        version=artifact.version,
+        texts=dict(artifact.records("texts", 2)),
+        index=index,
+        documents=artifact.strings("documents"),
+        question_bank=QuestionBank(Question(*record) for record in artifact.records("questions", 5)),
+        alert_engine=AlertEngine(
+            compile_rule(rule_id, symptom, when, int(grade), reason, split_items(long_questions))
+            for rule_id, symptom, when, grade, reason, long_questions in artifact.records("alert_rules", 6)
+        ),
+        ctcae=ctcae,
+        symptoms=SymptomCanonicalizer.from_names(
+            artifact.strings("symptom_ids"), artifact.records("symptom_names", 2)
+        ),
+    )
+    print(f"Knowledge base version {artifact.version} opened from {artifact_path} "
+          f"in {(time.time() - start_time) * 1000:.1f}ms")
+    return knowledge_base
+
+
+def get_knowledge_base(directory: str) -> KnowledgeBase:
+    """
+    Returns the shared snapshot for a directory, building it on first use.
+    """
+    key = os.path.abspath(directory)
+    knowledge_base = _knowledge_bases.get(key)
+    if knowledge_base is not None:
+        return knowledge_base
+
+    with _knowledge_base_lock:
+        knowledge_base = _knowledge_bases.get(key)
+        if knowledge_base is None:
+            knowledge_base = build_knowledge_base(key)
+            _knowledge_bases[key] = knowledge_base
+        return knowledge_base
+
+
+def reload_knowledge_base(directory: str) -> KnowledgeBase:
+    """
+    Rebuilds the snapshot for a directory and atomically swaps it in.
+    """
+    key = os.path.abspath(directory)
+    knowledge_base = build_knowledge_base(key)
+    with _knowledge_base_lock:
+        previous = _knowledge_bases.get(key)
+        _knowledge_bases[key] = knowledge_base
+    if previous is not None:
+        print(f"🔄 Knowledge base reloaded: {previous.version} -> {knowledge_base.version}")
+    return knowledge_base
+
+
+class KnowledgeBaseWatcher:
+    """
+    Polls a model_inputs directory and reloads the snapshot in the background when it changes.
+    """
+    def __init__(self, directory: str, interval: float = 5.0):
+        self.directory = os.path.abspath(directory)
+        self.interval = interval
+        self._fingerprint = directory_fingerprint(self.directory)
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="kb-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            fingerprint = directory_fingerprint(self.directory)
+            if fingerprint == self._fingerprint:
+                continue
+            # Wait for the directory to settle so half-written files are not loaded
+            time.sleep(min(self.interval, 1.0))
+            fingerprint = directory_fingerprint(self.directory)
+            try:
+                reload_knowledge_base(self.directory)
+                self._fingerprint = fingerprint
+            except Exception as e:
+                # Keep serving the previous snapshot and retry on the next change
+                print(f"❌ Knowledge base reload failed, keeping previous version: {e}")
+                self._fingerprint = fingerprint
+
+
+def start_knowledge_base_watcher(directory: str, interval: float = 5.0) -> Optional[KnowledgeBaseWatcher]:
+    """
+    Starts (once per directory) a background watcher that live-reloads the snapshot.
+    An interval of zero or less disables watching.
+    """
+    if interval <= 0:
+        return None
+    key = os.path.abspath(directory)
+    with _knowledge_base_lock:
+        watcher = _watchers.get(key)
+        if watcher is None:
+            watcher = KnowledgeBaseWatcher(key, interval)
+            _watchers[key] = watcher
+            watcher.start()
+            print(f"👀 Watching {key} for knowledge base changes every {interval}s")
+        return watcher
+
+
+def get_embedding_model(model_name: str = 'all-MiniLM-L6-v2', backend: str = EMBEDDING_BACKEND):
+    """
+    Returns the shared encoder for a model name, loading it on first use: the
+    SentenceTransformer, or its quantized ONNX export when the backend is "onnx".
+    """
+    key = embedding_model_id(model_name, backend)
+    model = _embedding_models.get(key)
+    if model is not None:
+        return model
+
+    with _embedding_model_lock:
+        model = _embedding_models.get(key)
+        if model is None:
+            if backend == "onnx":
+                model = OnnxEncoder(onnx_model_dir(model_name))
+            else:
+                _import_embedding_libraries()
+                model = sentence_transformers.SentenceTransformer(model_name)
+            _embedding_models[key] = model
+        return model
+
+
+def embedding_model_if_ready(model_name: str = 'all-MiniLM-L6-v2', backend: str = EMBEDDING_BACKEND):
+    """Returns the shared encoder if it has been loaded, without loading it."""
+    return _embedding_models.get(embedding_model_id(model_name, backend))
+
+
+def warm_embedding_model(model_name: str = 'all-MiniLM-L6-v2', backend: str = EMBEDDING_BACKEND) -> None:
+    """
+    Starts loading the shared encoder in a background thread (once per model), so
+    callers can serve lexical results instead of blocking on the load.
+    """
+    key = embedding_model_id(model_name, backend)
+    if key in _embedding_models or key in _embedding_model_warmups:
+        return
+
+    def load():
+        start_time = time.time()
+        try:
+            get_embedding_model(model_name, backend)
+            print(f"✅ Embedding model {key} warmed up in {time.time() - start_time:.2f}s")
+        except Exception as e:
+            # Retrieval keeps serving lexical results
+            print(f"❌ Could not load embedding model {key}: {e}")
+
+    with _embedding_model_lock:
+        if key in _embedding_models or key in _embedding_model_warmups:
+            return
+        thread = threading.Thread(target=load, name=f"warm-{key}", daemon=True)
+        _embedding_model_warmups[key] = thread
+    thread.start()
@@ -0,0 +1,232 @@
+"""
+Token-budgeted prompt builder for the knowledge base query.
+
+Each part of the user prompt is a section with a priority. When the prompt is
+over the budget for the provider model, the lowest-priority sections are
+trimmed first (whole parts, then text) and every trim is reported.
+"""
+
+import os
+import re
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# User-prompt token budgets per provider model; the system prompt and the
+# completion need the rest of each model's context window.
+MODEL_TOKEN_BUDGETS = {
+    "gpt-4o": 32000,
+    "llama-3.3-70b-versatile": 16000,
+    "qwen-3-32b": 8000,
+}
+DEFAULT_TOKEN_BUDGET = 8000
+
+KB_CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+# Section priorities: lower is trimmed first, None is never trimmed
+KB_CONTEXT_PRIORITY = 10
+HISTORY_PRIORITY = 20
+PENDING_QUESTIONS_PRIORITY = 30
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]|\s+")
+
+
+def _parse_budget_overrides(value: str) -> Dict[str, int]:
+    """Parses ONCOLIFE_PROMPT_TOKEN_BUDGETS, e.g. "gpt-4o=24000,qwen-3-32b=6000"."""
+    overrides = {}
+    for item in value.split(","):
+        if "=" in item:
+            model, budget = item.split("=", 1)
+            overrides[model.strip()] = int(budget)
+    return overrides
+
+
+MODEL_TOKEN_BUDGETS.update(_parse_budget_overrides(os.environ.get("ONCOLIFE_PROMPT_TOKEN_BUDGETS", "")))
+
+
+def count_tokens(text: str) -> int:
+    """
+    Offline token estimate for BPE tokenizers (GPT-4o, Llama 3, Qwen 3).
+
+    Words count one token per four characters, punctuation one token each and
+    runs of whitespace one token, which slightly overestimates real BPE counts
+    so the budget errs on the safe side.
+    """
+    tokens = 0
+    for piece in _TOKEN_PATTERN.findall(text):
+        if piece[0].isspace():
+            tokens += 1 if len(piece) > 1 or piece == "\n" else 0
+        elif piece[0].isalnum() or piece[0] == "_":
+            tokens += (len(piece) + 3) // 4
+        else:
+            tokens += 1
+    return tokens
+
+
+def token_budget_for(model: str) -> int:
+    """Returns the user-prompt token budget for a provider model."""
+    return MODEL_TOKEN_BUDGETS.get(model, DEFAULT_TOKEN_BUDGET)
+
+
+@dataclass
+class PromptSection:
+    name: str
+    parts: List[Any]
+    priority: Optional[int] = None
+    drop_from: str = "end"  # Which end loses parts first: "start" or "end"
+    render: Optional[Callable[[List[Any]], str]] = None
+    joiner: str = "\n"
+
+    def text(self) -> str:
+        if self.render:
+            return self.render(self.parts)
+        return self.joiner.join(self.parts)
+
+
+@dataclass
+class TrimRecord:
+    section: str
+    tokens_before: int
+    tokens_after: int
+    parts_dropped: int = 0
+    truncated: bool = False
+
+    def __str__(self) -> str:
+        detail = f"{self.parts_dropped} part(s) dropped" + (", text truncated" if self.truncated else "")
+        return f"{self.section}: {self.tokens_before} -> {self.tokens_after} tokens ({detail})"
+
+
+@dataclass
+class BuiltPrompt:
+    text: str
+    tokens: int
+    budget: int
+    section_tokens: Dict[str, int]
+    trimmed: List[TrimRecord] = field(default_factory=list)
+
+
+class PromptBuilder:
+    """
+    Assembles prompt sections in order and trims them to fit a token budget.
+    """
+    def __init__(self, budget: int, count: Callable[[str], int] = count_tokens):
+        self.budget = budget
+        self.count = count
+        self.sections: List[PromptSection] = []
+
+    def add(self, name: str, parts: Sequence[Any], priority: Optional[int] = None, **kwargs) -> "PromptBuilder":
+        self.sections.append(PromptSection(name=name, parts=list(parts), priority=priority, **kwargs))
+        return self
+
+    def add_text(self, name: str, text: str, priority: Optional[int] = None) -> "PromptBuilder":
+        return self.add(name, [text], priority)
+
+    def build(self) -> BuiltPrompt:
+        tokens = {section.name: self.count(section.text()) for section in self.sections}
+        # Account for the newline joining sections
+        total = sum(tokens.values()) + len(self.sections) - 1
+        trimmed = []
+
+        trimmable = sorted(
+            (section for section in self.sections if section.priority is not None),
+            key=lambda section: section.priority,
+        )
+        for section in trimmable:
+            if total <= self.budget:
+                break
+            before = tokens[section.name]
+            record = TrimRecord(section=section.name, tokens_before=before, tokens_after=before)
+            while total > self.budget and section.parts:
+                if len(section.parts) == 1 and isinstance(section.parts[0], str):
+                    allowed = max(0, tokens[section.name] - (total - self.budget))
+                    section.parts[0] = self._truncate(section.parts[0], allowed, section.drop_from)
+                    record.truncated = True
+                else:
+                    section.parts.pop(0 if section.drop_from == "start" else -1)
+                    record.parts_dropped += 1
+                new_tokens = self.count(section.text())
+                total += new_tokens - tokens[section.name]
+                tokens[section.name] = new_tokens
+                if record.truncated:
+                    break
+            record.tokens_after = tokens[section.name]
+            trimmed.append(record)
+
+        text = "\n".join(section.text() for section in self.sections)
+        return BuiltPrompt(text=text, tokens=total, budget=self.budget, section_tokens=tokens, trimmed=trimmed)
+
+    def _truncate(self, text: str, max_tokens: int, drop_from: str) -> str:
+        """Cuts text at a line boundary so it fits max_tokens, keeping the opposite end."""
+        lines = text.split("\n")
+        if drop_from == "start":
+            lines.reverse()
+        kept, used = [], 0
+        for line in lines:
+            line_tokens = self.count(line) + 1
+            if used + line_tokens > max_tokens:
+                break
+            kept.append(line)
+            used += line_tokens
+        if drop_from == "start":
+            kept.reverse()
+        return "\n".join(kept)
+
+
+def build_user_prompt(
+    knowledge_base_context: str,
+    context: Dict[str, Any],
+    model: str,
+    pending_questions: str = "",
+    triggered_alerts: str = "",
+    alert_attributes: str = "",
+) -> BuiltPrompt:
+    """
+    Builds the knowledge base query's user prompt within the budget for a provider model.
+
+    The instructions, latest message, current symptoms, triggered alerts and alert
+    attributes are never trimmed. The knowledge base context loses its trailing
+    documents first (the retrieved CTCAE criteria come first and are kept longest),
+    then the chat history loses its oldest messages, then the pending question list
+    is cut.
+    """
+    builder = PromptBuilder(token_budget_for(model))
+    builder.add_text("kb_header", "### Knowledge Base Context ###")
+    builder.add(
+        "knowledge_base", knowledge_base_context.split(KB_CONTEXT_SEPARATOR),
+        priority=KB_CONTEXT_PRIORITY, drop_from="end", joiner=KB_CONTEXT_SEPARATOR,
+    )
+    builder.add_text("conversation_header", "\n### Conversation Context ###")
+    builder.add_text("symptoms", f"Current Symptoms: {context.get('patient_state', {}).get('current_symptoms', [])}")
+    if triggered_alerts:
+        builder.add_text(
+            "triggered_alerts",
+            "\n### Triggered Alerts (deterministic; apply these grade overrides) ###\n" + triggered_alerts,
+        )
+    if pending_questions:
+        builder.add_text("pending_questions_header", "\n### Pending Questions (ask one of these next) ###")
+        builder.add(
+            "pending_questions", pending_questions.split("\n"),
+            priority=PENDING_QUESTIONS_PRIORITY, drop_from="end",
+        )
+    if alert_attributes:
+        builder.add_text(
+            "alert_attributes",
+            "\n### Alert Attributes (report under the symptom whenever the patient mentions them) ###\n"
+            + alert_attributes,
+        )
+    builder.add(
+        "history", context.get('history', []), priority=HISTORY_PRIORITY, drop_from="start",
+        render=lambda history: f"Chat History (most recent messages): {json.dumps(history, indent=2)}",
+    )
+    builder.add_text("latest_input", f"\n### User's Latest Message ###\nUser: \"{context.get('latest_input', '')}\"")
+    builder.add_text(
+        "instructions",
+        "\n### Instructions ###\n"
+        "Follow the conversation workflow defined in your system instructions. Remember to respond with valid JSON only."
+    )
+
+    prompt = builder.build()
+    if prompt.trimmed:
+        print(f"✂️ Prompt trimmed to {prompt.tokens}/{prompt.budget} tokens for {model}: "
+              + "; ".join(str(record) for record in prompt.trimmed))
+    return prompt
@@ -0,0 +1,161 @@
+"""
+In-memory question bank built from questions.json.
+
+Questions are indexed by symptom, phase and data attribute so each prompt can
+carry only the pending questions for the symptom currently being assessed.
+Collected attributes are kept per symptom id: "days_in_a_row" answered for
+diarrhea does not answer the fatigue question of the same name.
+"""
+
+import re
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from .sections import normalize_symptom
+
+QUESTIONS_FILENAME = "questions.json"
+PHASES = ("short", "long")
+# Scope of attributes that describe the patient rather than one of their symptoms
+GENERAL_SCOPE = "general"
+
+# Share of a question's words an assistant message must contain to count as asked
+ASKED_WORD_OVERLAP = 0.6
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+@dataclass(frozen=True)
+class Question:
+    id: str
+    text: str
+    symptom: str
+    data_attribute: str
+    phase: str
+
+
+def _words(text: str) -> frozenset:
+    return frozenset(word for word in _WORD_PATTERN.findall(text.lower()) if len(word) > 2)
+
+
+class QuestionBank:
+    """
+    Read-only index over the structured questions, by symptom, phase and attribute.
+    """
+    def __init__(self, questions: Iterable[Question]):
+        self.questions: Tuple[Question, ...] = tuple(questions)
+        self._by_id: Dict[str, Question] = {}
+        self._by_symptom_phase: Dict[Tuple[str, str], List[Question]] = {}
+        self._by_attribute: Dict[str, List[Question]] = {}
+        self._words: Dict[str, frozenset] = {}
+        for question in self.questions:
+            self._by_id[question.id] = question
+            self._by_symptom_phase.setdefault((question.symptom, question.phase), []).append(question)
+            self._by_attribute.setdefault(question.data_attribute, []).append(question)
+            self._words[question.id] = _words(question.text)
+
+    @classmethod
+    def from_file(cls, file_path: str) -> "QuestionBank":
+        with open(file_path, 'r') as f:
+            return cls(Question(**entry) for entry in json.load(f))
+
+    @property
+    def symptoms(self) -> Tuple[str, ...]:
+        """Symptom ids in the order they first appear in the bank."""
+        return tuple(dict.fromkeys(question.symptom for question in self.questions))
+
+    def get(self, question_id: str) -> Optional[Question]:
+        return self._by_id.get(question_id)
+
+    def questions_for(self, symptom: str, phase: Optional[str] = None) -> List[Question]:
+        """Questions for a symptom, optionally limited to one phase, in bank order."""
+        symptom = normalize_symptom(symptom)
+        phases = (phase,) if phase else PHASES
+        return [q for p in phases for q in self._by_symptom_phase.get((symptom, p), [])]
+
+    def questions_for_attribute(self, data_attribute: str) -> List[Question]:
+        return list(self._by_attribute.get(data_attribute, []))
+
+    def was_asked(self, question: Question, assistant_messages: Sequence[frozenset]) -> bool:
+        """True if any assistant message (as a word set) covers most of the question's words."""
+        words = self._words[question.id]
+        if not words:
+            return False
+        return any(len(words & message) >= ASKED_WORD_OVERLAP * len(words) for message in assistant_messages)
+
+    def pending_questions(
+        self,
+        symptom: str,
+        history: Sequence[Dict[str, Any]] = (),
+        answered_attributes: Iterable[str] = (),
+        phases: Sequence[str] = ("short",),
+    ) -> List[Question]:
+        """
+        Questions for a symptom that have not been asked yet and whose attribute is not known.
+        """
+        answered = set(answered_attributes)
+        assistant_messages = [
+            _words(str(message.get("content", ""))) for message in history
+            if message.get("sender") == "assistant"
+        ]
+        return [
+            question
+            for phase in phases
+            for question in self.questions_for(symptom, phase)
+            if question.data_attribute not in answered and not self.was_asked(question, assistant_messages)
+        ]
+
+    def current_assessment(
+        self,
+        symptoms: Sequence[str],
+        history: Sequence[Dict[str, Any]] = (),
+        answered_attributes: Mapping[str, Iterable[str]] = None,
+        long_phase_symptoms: Iterable[str] = (),
+    ) -> Tuple[Optional[str], List[Question]]:
+        """
+        Returns the first of the patient's symptoms that still has pending questions,
+        with those questions. answered_attributes holds the attributes already known per
+        symptom id, so an answer for one symptom never skips another symptom's question.
+        Long-phase questions are only pending for symptoms in long_phase_symptoms (i.e.
+        those with a triggered alert).
+        """
+        answered_attributes = answered_attributes or {}
+        long_phase = {normalize_symptom(s) for s in long_phase_symptoms}
+        for symptom in dict.fromkeys(normalize_symptom(s) for s in symptoms):
+            phases = PHASES if symptom in long_phase else ("short",)
+            pending = self.pending_questions(symptom, history, answered_attributes.get(symptom, ()), phases)
+            if pending:
+                return symptom, pending
+        return None, []
+
+    def scope_attributes(
+        self,
+        attributes: Mapping[str, Any],
+        symptoms: Sequence[str],
+        assessing: Optional[str] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Files reported attributes under the symptom they describe. Entries nested by symptom
+        ({"fatigue": {"days_in_a_row": 5}}) keep their symptom; a flat attribute goes to the
+        only patient symptom with a question for it, else to the symptom being assessed, else
+        to GENERAL_SCOPE.
+        """
+        patient_symptoms = list(dict.fromkeys(normalize_symptom(s) for s in symptoms))
+        scoped: Dict[str, Dict[str, Any]] = {}
+        for name, value in attributes.items():
+            if isinstance(value, dict):
+                scoped.setdefault(normalize_symptom(name), {}).update(value)
+                continue
+            askers = [s for s in patient_symptoms if any(q.symptom == s for q in self.questions_for_attribute(name))]
+            symptom = askers[0] if len(askers) == 1 else (assessing or GENERAL_SCOPE)
+            scoped.setdefault(symptom, {})[name] = value
+        return scoped
+
+    def format_pending(self, symptom: Optional[str], pending: Sequence[Question]) -> str:
+        """Formats the candidate question list for the prompt."""
+        if not symptom or not pending:
+            return ""
+        lines = [f"Currently assessing: {symptom}"]
+        for question in pending:
+            lines.append(f"- [{question.phase}] ({question.data_attribute}) {question.text}")
+        return "\n".join(lines)
@@ -0,0 +1,153 @@
+"""
+Per-query selection of the retrieved CTCAE documents.
+
+A fixed top-k sends the same number of documents for a precise query as for
+a vague one, and near-duplicate entries ("Rash acneiform", "Rash
+maculo-papular") can fill the whole quota. DocumentSelector works on each
+symptom's candidate ranking and its query embedding:
+
+1. distance cutoff: candidates further than MAX_DISTANCE (squared L2 between
+   unit embeddings, 2 - 2 cos) from the query are dropped;
+2. adaptive k: so are candidates more than ADAPTIVE_MARGIN further than the
+   best remaining one, so a clear match is sent alone;
+3. maximal marginal relevance: the quota is filled greedily by
+   MMR_LAMBDA * relevance - (1 - MMR_LAMBDA) * max sim(doc, selected), where
+   relevance is the query similarity at the candidate's rank.
+
+The top-ranked candidate is always kept. The cutoff and adaptive k only
+apply to dense rankings: a hybrid ranking's strong BM25 matches can sit far
+from the query embedding, so fused rankings only go through MMR.
+
+Each query's SelectionStats report how many documents were kept and the
+prompt characters saved against the fixed quota.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .numpy_index import NumpyFlatIndex
+
+# Squared L2 distance between unit query and document embeddings; inf disables the cutoff
+MAX_DISTANCE = float(os.environ.get("ONCOLIFE_RETRIEVAL_MAX_DISTANCE", "1.3"))
+# Candidates further than this beyond the best one are dropped; inf keeps the full quota
+ADAPTIVE_MARGIN = float(os.environ.get("ONCOLIFE_RETRIEVAL_ADAPTIVE_MARGIN", "0.25"))
+# Relevance weight of MMR; 1 ranks by relevance alone (no diversification)
+MMR_LAMBDA = float(os.environ.get("ONCOLIFE_RETRIEVAL_MMR_LAMBDA", "0.7"))
+# Candidates per query the selection chooses from
+SELECTION_CANDIDATES = 20
+
+
+@dataclass(frozen=True)
+class SelectionStats:
+    query: str
+    candidates: int
+    kept: int
+    # Documents the fixed quota would have sent
+    baseline: int
+    characters: int
+    characters_saved: int
+
+    def __str__(self) -> str:
+        return (f"{self.query!r}: kept {self.kept}/{self.baseline} of {self.candidates} candidates, "
+                f"{self.characters} chars ({self.characters_saved:+d} saved)")
+
+
+def document_vectors(index: Any, ids: np.ndarray) -> Optional[np.ndarray]:
+    """The stored vectors of the given ids, or None if the index cannot reconstruct them."""
+    if isinstance(index, NumpyFlatIndex):
+        return np.asarray(index.embeddings[ids], dtype='float32')
+    try:
+        return np.asarray(index.reconstruct_batch(ids), dtype='float32')
+    except (RuntimeError, AttributeError):
+        return None
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def maximal_marginal_relevance(relevance: np.ndarray, similarity: np.ndarray, count: int,
+                               mmr_lambda: float = MMR_LAMBDA) -> List[int]:
+    """
+    Greedy MMR over candidates: positions (into relevance) of up to count picks, each
+    maximizing mmr_lambda * relevance - (1 - mmr_lambda) * its highest similarity
+    to the picks so far. Ties go to the earlier candidate.
+    """
+    selected: List[int] = []
+    redundancy = np.zeros(len(relevance), dtype='float32')
+    available = np.ones(len(relevance), dtype=bool)
+    for _ in range(min(count, len(relevance))):
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        selected.append(pick)
+        available[pick] = False
+        redundancy = np.maximum(redundancy, similarity[pick])
+    return selected
+
+
+class DocumentSelector:
+    """
+    Applies the distance cutoff, adaptive k and MMR to each query's candidates.
+    """
+    def __init__(self, documents: Sequence[str], max_distance: float = MAX_DISTANCE,
+                 adaptive_margin: float = ADAPTIVE_MARGIN, mmr_lambda: float = MMR_LAMBDA):
+        self.documents = documents
+        self.max_distance = max_distance
+        self.adaptive_margin = adaptive_margin
+        self.mmr_lambda = mmr_lambda
+
+    def _characters(self, ids: Sequence[int]) -> int:
+        return sum(len(self.documents[i]) for i in ids)
+
+    def select(self, index: Any, queries: np.ndarray, rankings: np.ndarray, quota: int,
+               symptoms: Sequence[str], cutoff: bool = True) -> Tuple[List[List[int]], List[SelectionStats]]:
+        """
+        Re-ranks each query's candidate ids (-1 padded) by MMR, after the distance cutoff
+        and adaptive k unless cutoff is False (for rankings not ordered by distance); the
+        stats count the first quota of each ranking. Rankings are kept as they are when
+        the index cannot return its vectors (e.g. IVF).
+        """
+        selected, stats = [], []
+        queries = _normalize(np.asarray(queries, dtype='float32'))
+        for query, ranking, symptom in zip(queries, rankings, symptoms):
+            candidates = np.array([i for i in ranking if i >= 0], dtype='int64')
+            baseline = [int(i) for i in candidates[:quota]]
+            vectors = document_vectors(index, candidates) if len(candidates) else None
+            if vectors is None:
+                ranked = [int(i) for i in candidates]
+            else:
+                vectors = _normalize(vectors)
+                keep = np.ones(len(candidates), dtype=bool)
+                if cutoff:
+                    distances = np.sum((vectors - query) ** 2, axis=1)
+                    keep = distances <= self.max_distance
+                    keep &= distances <= distances[keep].min(initial=distances[0]) + self.adaptive_margin
+                # A vague query still gets its best match
+                keep[0] = True
+                positions = np.flatnonzero(keep)
+                # The i-th ranked candidate gets the i-th highest similarity, so MMR keeps the
+                # ranking's order (e.g. the fused hybrid one) and only trades it against redundancy
+                relevance = np.sort(vectors[positions] @ query)[::-1]
+                picks = maximal_marginal_relevance(
+                    relevance, vectors[positions] @ vectors[positions].T, len(positions), self.mmr_lambda
+                )
+                ranked = [int(candidates[positions[pick]]) for pick in picks]
+
+            # The merge takes each query's share from the front of its ranking
+            kept = ranked[:quota]
+            characters = self._characters(kept)
+            selected.append(ranked)
+            stats.append(SelectionStats(
+                query=symptom,
+                candidates=len(candidates),
+                kept=len(kept),
+                baseline=len(baseline),
+                characters=characters,
+                characters_saved=self._characters(baseline) - characters,
+            ))
+        return selected, stats
@@ -17,6 +17,7 @@ from .models import (
     Message
 )
 from .services import ConversationService
+from .llm.embedding_worker import embedding_worker_stats
 
 router = APIRouter(prefix="/chat", tags=["Chat Conversation"])
 
@@ -99,6 +100,13 @@ def force_create_new_session(
         }
     )
 
+@router.get(
+    "/metrics/embedding",
+    summary="Throughput and batch-size metrics of the embedding workers"
+)
+def get_embedding_metrics():
+    return embedding_worker_stats()
+
 def convert_message_for_frontend(message: Message) -> Message:
     """Converts message types from database format to frontend format."""
     if hasattr(message, 'message_type') and isinstance(message.message_type, str):
@@ -0,0 +1,104 @@
+"""
+Benchmarks the vector index types against exact search.
+
+Builds each index type over the CTCAE embeddings and runs a fixed query set
+(every question-bank symptom plus every CTCAE term name) against it,
+reporting build time, recall@k against exact (flat) search, p50/p99
+single-query latency and index memory. Use it to pick ONCOLIFE_INDEX_TYPE
+and the nprobe/efSearch settings as the corpus grows:
+
+    python backend/scripts/benchmark_index_types.py [model_inputs_dir] [--k 5]
+        [--types flat,hnsw,ivf,pq] [--nprobe 8] [--ef-search 64]
+
+Without the embedding model installed, the queries fall back to the stored
+document embeddings with small noise added, which is flagged in the output.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+from routers.chat.llm.index_types import INDEX_TYPES, build_index, configure_index, index_factory_string, index_memory
+from routers.chat.llm.knowledge_base import (
+    EMBEDDINGS_FILENAME, VECTOR_STORE_FILENAME, _import_faiss, get_embedding_model,
+)
+from benchmark_onnx_encoder import benchmark_queries
+
+DEFAULT_DIRECTORY = os.path.join(BACKEND_DIR, 'model_inputs')
+
+
+def load_embeddings(directory: str) -> np.ndarray:
+    embeddings_path = os.path.join(directory, EMBEDDINGS_FILENAME)
+    if os.path.exists(embeddings_path):
+        return np.load(embeddings_path)
+    index = _import_faiss().read_index(os.path.join(directory, VECTOR_STORE_FILENAME))
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def query_embeddings(queries, embeddings: np.ndarray, model_name: str) -> np.ndarray:
+    try:
+        return np.asarray(get_embedding_model(model_name).encode(queries), dtype='float32')
+    except ImportError as e:
+        print(f"⚠️ Embedding model unavailable ({e}); using perturbed document embeddings as queries")
+        rng = np.random.default_rng(0)
+        rows = embeddings[rng.integers(0, len(embeddings), len(queries))]
+        return (rows + rng.normal(0, 0.02, rows.shape)).astype('float32')
+
+
+def recall_at_k(approximate: np.ndarray, exact: np.ndarray) -> float:
+    """Mean fraction of the exact top-k ids that the approximate top-k contains."""
+    k = exact.shape[1]
+    return float(np.mean([len(set(a) & set(e)) / k for a, e in zip(approximate, exact)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("directory", nargs="?", default=DEFAULT_DIRECTORY)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--types", default=",".join(INDEX_TYPES),
+                        help="Comma-separated index types or FAISS factory strings (separate those with ';')")
+    parser.add_argument("--nprobe", type=int, default=8)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--model", default='all-MiniLM-L6-v2')
+    args = parser.parse_args()
+    directory = os.path.abspath(args.directory)
+    faiss = _import_faiss()
+
+    embeddings = np.ascontiguousarray(load_embeddings(directory), dtype='float32')
+    queries = benchmark_queries(directory)
+    vectors = query_embeddings(queries, embeddings, args.model)
+
+    exact = faiss.IndexFlatL2(embeddings.shape[1])
+    exact.add(embeddings)
+    _, ground_truth = exact.search(vectors, args.k)
+
+    print(f"{len(queries)} queries over {len(embeddings)} vectors, k={args.k}, "
+          f"nprobe={args.nprobe}, efSearch={args.ef_search}")
+    print(f"{'index':<18}{'build s':>9}{'recall@k':>10}{'p50 us':>9}{'p99 us':>9}{'memory KB':>11}")
+    separator = ";" if ";" in args.types else ","
+    for index_type in filter(None, (t.strip() for t in args.types.split(separator))):
+        start = time.perf_counter()
+        index = configure_index(faiss, build_index(faiss, embeddings, index_type), args.nprobe, args.ef_search)
+        build_time = time.perf_counter() - start
+
+        latencies = []
+        for vector in vectors:
+            start = time.perf_counter()
+            index.search(vector[None, :], args.k)
+            latencies.append(time.perf_counter() - start)
+        _, ids = index.search(vectors, args.k)
+
+        name = index_factory_string(index_type, *embeddings.shape)
+        print(f"{name:<18}{build_time:>9.2f}{recall_at_k(ids, ground_truth):>10.3f}"
+              f"{np.percentile(latencies, 50) * 1e6:>9.1f}{np.percentile(latencies, 99) * 1e6:>9.1f}"
+              f"{index_memory(faiss, index) / 1024:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Checks the quantized ONNX encoder against the sentence-transformers model and
+benchmarks both.
+
+Each backend runs in its own interpreter so load time and peak RSS are
+measured in isolation. The queries are the question-bank symptoms and the
+CTCAE terms. Reports the cosine similarity between the two backends'
+embeddings (exits non-zero below --min-cosine), load time, single-query
+p50/p99 latency, batch throughput and peak RSS:
+
+    python backend/scripts/benchmark_onnx_encoder.py [model_inputs_dir] [--model NAME] [--min-cosine 0.99]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+import numpy as np
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+from routers.chat.llm.knowledge_base import get_knowledge_base, get_embedding_model
+
+DEFAULT_DIRECTORY = os.path.join(BACKEND_DIR, 'model_inputs')
+BACKENDS = ("torch", "onnx")
+
+
+def benchmark_queries(directory: str):
+    """Every question-bank symptom plus every CTCAE term name, deduplicated."""
+    knowledge_base = get_knowledge_base(directory)
+    queries = list(knowledge_base.question_bank.symptoms)
+    queries += [term.term for term in knowledge_base.ctcae_terms.terms.values()]
+    return list(dict.fromkeys(queries))
+
+
+def run_worker(backend: str, directory: str, model_name: str, output_path: str) -> None:
+    """Loads one backend, encodes the queries and writes embeddings and stats."""
+    queries = benchmark_queries(directory)
+    start = time.perf_counter()
+    model = get_embedding_model(model_name, backend)
+    load_time = time.perf_counter() - start
+
+    model.encode(queries[:8])  # warm up
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        model.encode([query])
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    embeddings = np.asarray(model.encode(queries, batch_size=64), dtype='float32')
+    batch_time = time.perf_counter() - start
+
+    np.save(output_path, embeddings)
+    print(json.dumps({
+        "load_ms": load_time * 1000,
+        "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "p99_ms": float(np.percentile(latencies, 99)) * 1000,
+        "batch_qps": len(queries) / batch_time,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("directory", nargs="?", default=DEFAULT_DIRECTORY)
+    parser.add_argument("--model", default='all-MiniLM-L6-v2')
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    parser.add_argument("--worker", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    directory = os.path.abspath(args.directory)
+
+    if args.worker:
+        run_worker(args.worker, directory, args.model, args.output)
+        return
+
+    stats, embeddings = {}, {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for backend in BACKENDS:
+            output_path = os.path.join(tmp_dir, f"{backend}.npy")
+            result = subprocess.run(
+                [sys.executable, __file__, directory, "--model", args.model,
+                 "--worker", backend, "--output", output_path],
+                check=True, capture_output=True, text=True,
+            )
+            stats[backend] = json.loads(result.stdout.strip().splitlines()[-1])
+            embeddings[backend] = np.load(output_path)
+
+    print(f"{len(embeddings['torch'])} queries, model {args.model}")
+    print(f"{'backend':<8}{'load ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'batch q/s':>12}{'peak RSS MB':>14}")
+    for backend in BACKENDS:
+        s = stats[backend]
+        print(f"{backend:<8}{s['load_ms']:>10.0f}{s['p50_ms']:>10.2f}{s['p99_ms']:>10.2f}"
+              f"{s['batch_qps']:>12.0f}{s['max_rss_mb']:>14.0f}")
+
+    torch_embeddings, onnx_embeddings = embeddings["torch"], embeddings["onnx"]
+    cosine = np.einsum('ij,ij->i', torch_embeddings, onnx_embeddings) / (
+        np.linalg.norm(torch_embeddings, axis=1) * np.linalg.norm(onnx_embeddings, axis=1)
+    )
+    print(f"Cosine similarity torch vs onnx: min {cosine.min():.4f}  mean {cosine.mean():.4f}")
+    if cosine.min() < args.min_cosine:
+        print(f"❌ Minimum cosine similarity is below {args.min_cosine}")
+        sys.exit(1)
+    print("✅ ONNX encoder matches the sentence-transformers embeddings")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Compares the FAISS and NumPy vector search engines.
+
+Reports the import and load time of each engine (imports are timed in a fresh
+interpreter), single-query and batched search latency, and how often the two
+engines return the same ids. Queries are perturbed copies of the stored
+embeddings, so no embedding model is needed:
+
+    python backend/scripts/benchmark_search_engines.py [model_inputs_dir] [--queries N] [--k K]
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+import statistics
+
+import numpy as np
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+from routers.chat.llm.knowledge_base import load_vector_index
+
+DEFAULT_DIRECTORY = os.path.join(BACKEND_DIR, 'model_inputs')
+
+
+def import_time(module: str, runs: int = 5) -> float:
+    """Median seconds to import a module in a fresh interpreter, minus interpreter startup."""
+    def timed(code: str) -> float:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True)
+        return time.perf_counter() - start
+
+    baseline = statistics.median(timed("pass") for _ in range(runs))
+    return statistics.median(timed(f"import {module}") for _ in range(runs)) - baseline
+
+
+def percentile(values, q: float) -> float:
+    return float(np.percentile(values, q))
+
+
+def search_latencies(index, queries: np.ndarray, k: int):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    _, ids = index.search(queries, k)
+    return latencies, time.perf_counter() - start, ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("directory", nargs="?", default=DEFAULT_DIRECTORY)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+    directory = os.path.abspath(args.directory)
+
+    print("Import time (fresh interpreter):")
+    for module in ("numpy", "faiss"):
+        print(f"  {module:<6} {import_time(module) * 1000:8.1f} ms")
+
+    indexes = {}
+    print("Load time:")
+    for engine in ("faiss", "numpy"):
+        start = time.perf_counter()
+        indexes[engine] = load_vector_index(directory, engine)
+        print(f"  {engine:<6} {(time.perf_counter() - start) * 1000:8.2f} ms ({type(indexes[engine]).__name__})")
+
+    rng = np.random.default_rng(0)
+    stored = indexes["numpy"].reconstruct_n(0, indexes["numpy"].ntotal)
+    queries = stored[rng.integers(0, len(stored), args.queries)]
+    queries = (queries + rng.normal(0, 0.02, queries.shape)).astype('float32')
+
+    print(f"Search latency ({args.queries} queries, k={args.k}):")
+    results = {}
+    for engine, index in indexes.items():
+        index.search(queries[:10], args.k)  # warm up
+        latencies, batch_time, ids = search_latencies(index, queries, args.k)
+        results[engine] = ids
+        print(f"  {engine:<6} p50 {percentile(latencies, 50) * 1e6:7.1f} us  "
+              f"p99 {percentile(latencies, 99) * 1e6:7.1f} us  "
+              f"batch {batch_time * 1000:7.2f} ms")
+
+    agreement = np.mean(np.all(results["faiss"] == results["numpy"], axis=1))
+    print(f"Identical top-{args.k} ids: {agreement:.1%} of queries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Builds the CTCAE vector store from CTCAE.json, re-embedding only what changed.
+
+Writes ctcae_documents.json (one document per CTCAE term), ctcae_index.faiss,
+ctcae_embeddings.npy (for the NumPy search engine) and
+ctcae_vector_manifest.json, which records the embedding model and a content
+hash for each document's embedding. On rebuild, embeddings whose document
+hash is unchanged are reused from the previous store and only changed or
+added documents are encoded, in batches spread over worker threads:
+
+    python backend/scripts/build_vector_store.py [model_inputs_dir ...] [--model NAME]
+        [--index-type TYPE] [--batch-size 64] [--workers 4] [--full] [--dry-run]
+
+The index type comes from --index-type (default ONCOLIFE_INDEX_TYPE: flat,
+hnsw, ivf, pq or a FAISS factory string); changing it only rebuilds the index.
+A store without a manifest is assumed to use the given model. Recompile the
+artifact afterwards.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+from routers.chat.llm.ctcae_terms import CTCAE_FILENAME, CTCAETerm
+from routers.chat.llm.index_types import INDEX_TYPE, build_index, index_factory_string
+from routers.chat.llm.knowledge_base import (
+    DOCUMENTS_FILENAME, EMBEDDINGS_FILENAME, VECTOR_STORE_FILENAME, _import_faiss, get_embedding_model,
+)
+
+DEFAULT_DIRECTORIES = [os.path.join(BACKEND_DIR, 'model_inputs')]
+DEFAULT_MODEL = 'all-MiniLM-L6-v2'
+MANIFEST_FILENAME = "ctcae_vector_manifest.json"
+MANIFEST_FORMAT_VERSION = 1
+
+
+def document_hash(document: str) -> str:
+    return hashlib.sha256(document.encode("utf-8")).hexdigest()[:16]
+
+
+def ctcae_documents(ctcae_path: str) -> List[str]:
+    """One document per CTCAE term, in file order, formatted as the runtime expects."""
+    with open(ctcae_path, 'r') as f:
+        ctcae = json.load(f)
+    return [
+        CTCAETerm(
+            term=term,
+            category=category,
+            grades=tuple((grade, text) for grade, text in grades.items() if text),
+        ).document
+        for category, terms in ctcae.items()
+        for term, grades in terms.items()
+    ]
+
+
+def load_previous_embeddings(directory: str, model_name: str) -> Dict[str, np.ndarray]:
+    """Maps document hashes to the embeddings of the existing store, if it used the same model."""
+    documents_path = os.path.join(directory, DOCUMENTS_FILENAME)
+    vector_store_path = os.path.join(directory, VECTOR_STORE_FILENAME)
+    manifest_path = os.path.join(directory, MANIFEST_FILENAME)
+    if not os.path.exists(documents_path) or not os.path.exists(vector_store_path):
+        return {}
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get("format") != MANIFEST_FORMAT_VERSION or manifest.get("model") != model_name:
+            print(f"Existing store was built with {manifest.get('model')!r}; re-embedding everything.")
+            return {}
+        hashes = manifest["hashes"]
+    else:
+        with open(documents_path, 'r') as f:
+            hashes = [document_hash(document) for document in json.load(f)]
+
+    # The exported matrix is exact; IVF and PQ indexes cannot reconstruct their vectors
+    embeddings_path = os.path.join(directory, EMBEDDINGS_FILENAME)
+    if os.path.exists(embeddings_path):
+        embeddings = np.load(embeddings_path)
+    else:
+        index = _import_faiss().read_index(vector_store_path)
+        embeddings = index.reconstruct_n(0, index.ntotal)
+    if len(embeddings) != len(hashes):
+        print("Existing store is inconsistent; re-embedding everything.")
+        return {}
+    return dict(zip(hashes, embeddings))
+
+
+def encode_batched(model, documents: Sequence[str], batch_size: int, workers: int) -> np.ndarray:
+    """Encodes documents in batches on a thread pool (the encoders release the GIL), keeping order."""
+    batches = [documents[i:i + batch_size] for i in range(0, len(documents), batch_size)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        encoded = list(executor.map(lambda batch: np.asarray(model.encode(list(batch)), dtype='float32'), batches))
+    return np.concatenate(encoded)
+
+
+def _write_atomically(file_path: str, write) -> None:
+    tmp_path = f"{file_path}.tmp{os.path.splitext(file_path)[1]}"
+    write(tmp_path)
+    os.replace(tmp_path, file_path)
+
+
+def write_vector_store(directory: str, documents: List[str], hashes: List[str],
+                       embeddings: np.ndarray, model_name: str, index_type: str) -> None:
+    faiss = _import_faiss()
+    index = build_index(faiss, embeddings, index_type)
+
+    def write_json(data, indent=None):
+        def write(path):
+            with open(path, 'w') as f:
+                json.dump(data, f, indent=indent)
+        return write
+
+    _write_atomically(os.path.join(directory, VECTOR_STORE_FILENAME), lambda path: faiss.write_index(index, path))
+    _write_atomically(os.path.join(directory, EMBEDDINGS_FILENAME), lambda path: np.save(path, embeddings))
+    _write_atomically(os.path.join(directory, DOCUMENTS_FILENAME), write_json(documents))
+    _write_atomically(os.path.join(directory, MANIFEST_FILENAME), write_json({
+        "format": MANIFEST_FORMAT_VERSION,
+        "model": model_name,
+        "dimension": int(embeddings.shape[1]),
+        "index": index_factory_string(index_type, *embeddings.shape),
+        "hashes": hashes,
+    }, indent=2))
+
+
+def _manifest_index(directory: str) -> str:
+    manifest_path = os.path.join(directory, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return ""
+    with open(manifest_path, 'r') as f:
+        return json.load(f).get("index", "Flat")
+
+
+def build_vector_store(directory: str, model_name: str = DEFAULT_MODEL, index_type: str = INDEX_TYPE,
+                       batch_size: int = 64, workers: int = 4, full: bool = False, dry_run: bool = False) -> None:
+    start_time = time.time()
+    documents = ctcae_documents(os.path.join(directory, CTCAE_FILENAME))
+    hashes = [document_hash(document) for document in documents]
+    previous = {} if full else load_previous_embeddings(directory, model_name)
+
+    changed = [n for n, document_hash_ in enumerate(hashes) if document_hash_ not in previous]
+    print(f"{len(documents)} documents: {len(documents) - len(changed)} unchanged, {len(changed)} to embed")
+    if dry_run:
+        return
+    if not changed and len(previous) == len(documents):
+        dimension = len(next(iter(previous.values())))
+        if _manifest_index(directory) == index_factory_string(index_type, len(documents), dimension):
+            print(f"✅ Vector store in {directory} is up to date")
+            return
+
+    embeddings = [previous.get(document_hash_) for document_hash_ in hashes]
+    if changed:
+        model = get_embedding_model(model_name)
+        encoded = encode_batched(model, [documents[n] for n in changed], batch_size, workers)
+        for n, embedding in zip(changed, encoded):
+            embeddings[n] = embedding
+
+    write_vector_store(directory, documents, hashes, np.stack(embeddings).astype('float32'), model_name, index_type)
+    print(f"📦 Wrote the vector store to {directory} in {time.time() - start_time:.1f}s; recompile "
+          f"the artifact (scripts/compile_kb_artifact.py).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("directories", nargs="*", default=DEFAULT_DIRECTORIES)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--index-type", default=INDEX_TYPE)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--full", action="store_true", help="Re-embed every document")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be re-embedded")
+    args = parser.parse_args()
+    for directory in args.directories:
+        build_vector_store(os.path.abspath(directory), args.model, args.index_type, args.batch_size,
+                           args.workers, args.full, args.dry_run)
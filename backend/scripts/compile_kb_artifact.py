@@ -0,0 +1,25 @@
+"""
+Compiles a model_inputs directory into a single memory-mappable knowledge base artifact.
+
+The artifact holds the extracted document text, the CTCAE documents with an
+offset table, the embedding matrix, the question bank, the alert rules, the
+CTCAE terms and the symptom names. Loaders use it automatically while it
+matches the directory's current version. Recompile after changing any file:
+
+    python backend/scripts/compile_kb_artifact.py [model_inputs_dir ...]
+"""
+
+import os
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+from routers.chat.llm.knowledge_base import compile_knowledge_base_artifact
+
+DEFAULT_DIRECTORIES = [os.path.join(BACKEND_DIR, 'model_inputs')]
+
+
+if __name__ == "__main__":
+    for directory in sys.argv[1:] or DEFAULT_DIRECTORIES:
+        compile_knowledge_base_artifact(os.path.abspath(directory))
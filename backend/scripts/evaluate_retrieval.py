@@ -0,0 +1,210 @@
+"""
+Evaluates CTCAE retrieval quality and latency against a labeled query set.
+
+Each case of retrieval_eval_set.json (next to this script) pairs a query, a
+question-bank symptom id or a patient phrasing, with the CTCAE terms it
+should retrieve. Every query is canonicalized like a symptom the LLM reports
+(ContextLoader.merge_symptoms) and runs through
+ContextLoader.retrieve_symptom_documents, the same term lookup, category
+filter, search and document selection the chat uses. The runner reports
+recall@k, MRR and latency per retrieval mode (lexical, dense, hybrid),
+overall and split by cases resolved by the term lookup and cases sent to
+search. Each mode runs with the model and indexes loaded but empty query
+embedding and retrieval caches, so modes do not warm each other: cold p50/p99
+is a case's first run, warm p50 the same case rerun right after it with its
+query embeddings cached (a mode passed explicitly bypasses the retrieval
+cache, so warm runs still search). Run it before and after an encoder, index
+or cache change.
+The other ONCOLIFE_* settings select the rest of the pipeline under test:
+
+    python backend/scripts/evaluate_retrieval.py [model_inputs_dir] [--k 5] [--eval-set PATH]
+        [--modes lexical,dense,hybrid] [--repeat 1] [--verbose] [--json PATH] [--min-recall 0.9]
+
+Without the embedding model installed, only lexical mode is evaluated, which
+is flagged in the output. --min-recall gates the ONCOLIFE_RETRIEVAL_MODE mode,
+or lexical mode when that one could not run.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+from routers.chat.llm.bm25 import get_bm25_index
+from routers.chat.llm.categories import CATEGORY_FILTER, get_category_index, parse_document_header
+from routers.chat.llm.context import ContextLoader
+from routers.chat.llm.embedding_cache import EmbeddingCache
+from routers.chat.llm.knowledge_base import get_embedding_model
+from routers.chat.llm.retrieval import RETRIEVAL_MODE
+from routers.chat.llm.retrieval_cache import RetrievalCache
+
+DEFAULT_DIRECTORY = os.path.join(BACKEND_DIR, 'model_inputs')
+DEFAULT_EVAL_SET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'retrieval_eval_set.json')
+MODES = ("lexical", "dense", "hybrid")
+
+
+def load_eval_set(file_path: str) -> List[Dict[str, Any]]:
+    with open(file_path, 'r') as f:
+        cases = json.load(f)
+    for case in cases:
+        if not case.get("query") or not case.get("expected"):
+            raise ValueError(f"Eval case needs a query and expected terms: {case}")
+    return cases
+
+
+def reciprocal_rank(retrieved: Sequence[str], expected: Sequence[str]) -> float:
+    """1 / rank of the first expected term retrieved, or 0."""
+    for rank, term in enumerate(retrieved, start=1):
+        if term in expected:
+            return 1.0 / rank
+    return 0.0
+
+
+def reset_caches(loader: ContextLoader) -> None:
+    """Gives the loader empty private query caches, leaving the process-wide (and persisted) ones alone."""
+    loader.embedding_cache = EmbeddingCache(loader.embedding_cache.max_size)
+    loader.retrieval_cache = RetrievalCache(loader.retrieval_cache.max_size, loader.retrieval_cache.ttl)
+
+
+def timed_retrieval(loader: ContextLoader, symptoms: List[str], k: int, mode: str):
+    # The loaders log every retrieval; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        documents = loader.retrieve_symptom_documents(symptoms, k, wait_for_model=True, mode=mode)
+        return documents, time.perf_counter() - start
+
+
+def evaluate_case(loader: ContextLoader, case: Dict[str, Any], k: int, mode: str, repeat: int) -> Dict[str, Any]:
+    """
+    Runs one case, returning its retrieved terms, metrics and best-of-repeat cold and
+    warm latency. Every repeat starts from empty caches.
+    """
+    # The chat only ever retrieves for canonicalized symptoms
+    symptoms = loader.merge_symptoms([], [case["query"]])
+    cold, warm = [], []
+    for _ in range(repeat):
+        reset_caches(loader)
+        documents, latency = timed_retrieval(loader, symptoms, k, mode)
+        cold.append(latency)
+        warm.append(timed_retrieval(loader, symptoms, k, mode)[1])
+
+    retrieved = [parse_document_header(document)[0] for document in documents][:k]
+    expected = case["expected"]
+    _, misses = loader.knowledge_base.ctcae_terms.resolve(symptoms)
+    return {
+        "query": case["query"],
+        "symptoms": symptoms,
+        "symptom": case.get("symptom"),
+        "expected": expected,
+        "retrieved": retrieved,
+        "stage": "search" if misses else "lookup",
+        "recall": len(set(expected) & set(retrieved)) / len(expected),
+        "reciprocal_rank": reciprocal_rank(retrieved, expected),
+        "latency_ms": min(cold) * 1000,
+        "warm_latency_ms": min(warm) * 1000,
+    }
+
+
+def summarize(results: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    if not results:
+        return {"cases": 0}
+    latencies = [result["latency_ms"] for result in results]
+    return {
+        "cases": len(results),
+        "recall_at_k": float(np.mean([result["recall"] for result in results])),
+        "mrr": float(np.mean([result["reciprocal_rank"] for result in results])),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "warm_p50_ms": float(np.percentile([result["warm_latency_ms"] for result in results], 50)),
+    }
+
+
+def evaluate_mode(loader: ContextLoader, cases: Sequence[Dict[str, Any]], mode: str, k: int,
+                  repeat: int) -> Dict[str, Any]:
+    """Runs every case with the given retrieval mode and summarizes them overall and per stage."""
+    # Build the indexes and load the model up front so the first case is not charged for them
+    with contextlib.redirect_stdout(io.StringIO()):
+        get_bm25_index(loader.knowledge_base)
+        if CATEGORY_FILTER:
+            get_category_index(loader.knowledge_base)
+        if mode != "lexical":
+            loader._initialize_model()
+    results = [evaluate_case(loader, case, k, mode, repeat) for case in cases]
+    summaries = {"all": summarize(results)}
+    for stage in ("lookup", "search"):
+        summaries[stage] = summarize([result for result in results if result["stage"] == stage])
+    return {"summary": summaries, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("directory", nargs="?", default=DEFAULT_DIRECTORY)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--eval-set", default=DEFAULT_EVAL_SET)
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated retrieval modes to evaluate")
+    parser.add_argument("--repeat", type=int, default=1, help="Cold runs per case; the fastest is reported")
+    parser.add_argument("--verbose", action="store_true", help="List the cases that missed an expected term")
+    parser.add_argument("--json", help="Also write the summary and per-case results to this file")
+    parser.add_argument("--min-recall", type=float, help="Exit non-zero if recall@k falls below this")
+    args = parser.parse_args()
+
+    cases = load_eval_set(args.eval_set)
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"unknown retrieval modes {sorted(unknown)}; choose from {', '.join(MODES)}")
+    with contextlib.redirect_stdout(io.StringIO()):
+        loader = ContextLoader(os.path.abspath(args.directory))
+
+    if any(mode != "lexical" for mode in modes):
+        try:
+            get_embedding_model(loader.model_name)
+        except (ImportError, OSError) as e:
+            skipped = [mode for mode in modes if mode != "lexical"]
+            print(f"⚠️ Embedding model unavailable ({e}); skipping the {', '.join(skipped)} mode(s)")
+            modes = [mode for mode in modes if mode == "lexical"]
+    if not modes:
+        sys.exit("❌ None of the requested retrieval modes can be evaluated")
+
+    evaluations = {mode: evaluate_mode(loader, cases, mode, args.k, args.repeat) for mode in modes}
+
+    print(f"{len(cases)} cases, k={args.k}, knowledge base {loader.knowledge_base.version}")
+    print(f"{'mode':<9}{'cases':<8}{'count':>7}{'recall@k':>10}{'MRR':>8}"
+          f"{'cold p50':>10}{'cold p99':>10}{'warm p50':>10}  (ms)")
+    for mode, evaluation in evaluations.items():
+        for name, summary in evaluation["summary"].items():
+            if summary["cases"]:
+                print(f"{mode:<9}{name:<8}{summary['cases']:>7}{summary['recall_at_k']:>10.3f}{summary['mrr']:>8.3f}"
+                      f"{summary['p50_ms']:>10.2f}{summary['p99_ms']:>10.2f}{summary['warm_p50_ms']:>10.2f}")
+
+    if args.verbose:
+        for mode, evaluation in evaluations.items():
+            for result in evaluation["results"]:
+                if result["recall"] < 1:
+                    print(f"  ❌ [{mode}] {result['query']!r} -> {result['symptoms']} ({result['stage']}): "
+                          f"expected {result['expected']}, got {result['retrieved']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"k": args.k, "version": loader.knowledge_base.version, "modes": evaluations}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+    gated = RETRIEVAL_MODE if RETRIEVAL_MODE in evaluations else "lexical"
+    if args.min_recall is not None and gated in evaluations:
+        recall = evaluations[gated]["summary"]["all"]["recall_at_k"]
+        if recall < args.min_recall:
+            print(f"❌ {gated} recall@k {recall:.3f} is below {args.min_recall}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
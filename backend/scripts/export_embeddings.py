@@ -0,0 +1,42 @@
+"""
+Exports the FAISS vector store's embeddings to ctcae_embeddings.npy.
+
+The NumPy search engine (ONCOLIFE_SEARCH_ENGINE=numpy) searches this matrix
+directly, so deployments using it never import faiss. Re-export after
+rebuilding ctcae_index.faiss:
+
+    python backend/scripts/export_embeddings.py [model_inputs_dir ...]
+"""
+
+import os
+import sys
+
+import numpy as np
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+from routers.chat.llm.knowledge_base import EMBEDDINGS_FILENAME, VECTOR_STORE_FILENAME, _import_faiss
+from routers.chat.llm.numpy_index import METRIC_L2
+
+DEFAULT_DIRECTORIES = [os.path.join(BACKEND_DIR, 'model_inputs')]
+
+
+def export_embeddings(directory: str) -> str:
+    """Writes the embedding matrix of a directory's FAISS index and returns its path."""
+    index = _import_faiss().read_index(os.path.join(directory, VECTOR_STORE_FILENAME))
+    if index.metric_type != METRIC_L2:
+        # The NumPy engine loads the .npy as an L2 index
+        raise ValueError(f"{VECTOR_STORE_FILENAME} uses metric {index.metric_type}; only L2 is supported")
+
+    file_path = os.path.join(directory, EMBEDDINGS_FILENAME)
+    tmp_path = f"{file_path}.tmp.npy"
+    np.save(tmp_path, np.ascontiguousarray(index.reconstruct_n(0, index.ntotal), dtype='<f4'))
+    os.replace(tmp_path, file_path)
+    print(f"📦 Exported {index.ntotal}x{index.d} embeddings to {file_path}")
+    return file_path
+
+
+if __name__ == "__main__":
+    for directory in sys.argv[1:] or DEFAULT_DIRECTORIES:
+        export_embeddings(os.path.abspath(directory))
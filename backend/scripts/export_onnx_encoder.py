@@ -0,0 +1,79 @@
+"""
+Exports the embedding model to an int8-quantized ONNX encoder.
+
+Traces the sentence-transformers model's transformer to ONNX, quantizes its
+weights to int8 with onnxruntime dynamic quantization, and saves the fast
+tokenizer and pooling settings next to it. Needs sentence-transformers and
+onnxruntime; the served encoder needs only onnxruntime and tokenizers:
+
+    python backend/scripts/export_onnx_encoder.py [model_name] [--output DIR]
+
+Check the export with `python backend/scripts/benchmark_onnx_encoder.py`.
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BACKEND_DIR)
+
+from routers.chat.llm.onnx_encoder import ONNX_MODEL_FILENAME, onnx_model_dir, write_encoder_config
+
+DEFAULT_MODEL = 'all-MiniLM-L6-v2'
+
+
+def export_onnx_encoder(model_name: str, output_dir: str) -> str:
+    """Writes the quantized model, tokenizer and encoder config and returns the directory."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    pooling = model[1]
+    if not pooling.pooling_mode_mean_tokens:
+        raise ValueError(f"{model_name} does not use mean pooling, which is all OnnxEncoder implements")
+
+    os.makedirs(output_dir, exist_ok=True)
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fp32_path = os.path.join(tmp_dir, "model.onnx")
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer,
+                tuple(sample[name] for name in input_names),
+                fp32_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+            )
+        quantize_dynamic(fp32_path, os.path.join(output_dir, ONNX_MODEL_FILENAME), weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(output_dir)
+    write_encoder_config(output_dir, {
+        "model_name": model_name,
+        "dimension": model.get_sentence_embedding_dimension(),
+        "max_seq_length": model.max_seq_length,
+        "normalize": any(type(module).__name__ == "Normalize" for module in model),
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+    })
+    size = os.path.getsize(os.path.join(output_dir, ONNX_MODEL_FILENAME)) / 1024 / 1024
+    print(f"📦 Exported {model_name} to {output_dir} ({size:.1f} MB int8)")
+    return output_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("model_name", nargs="?", default=DEFAULT_MODEL)
+    parser.add_argument("--output", help="Output directory (defaults to the directory the loader reads)")
+    args = parser.parse_args()
+    export_onnx_encoder(args.model_name, os.path.abspath(args.output or onnx_model_dir(args.model_name)))
@@ -8,6 +8,10 @@ import os
 import time
 import threading
 from optimized_context import OptimizedContextLoader
+from routers.chat.llm.knowledge_base import start_knowledge_base_watcher
+
+# Seconds between model_inputs change checks; 0 disables live reload
+KB_WATCH_INTERVAL = float(os.environ.get("ONCOLIFE_KB_WATCH_INTERVAL", "5"))
 
 def preload_everything():
     """Pre-load all models and data at startup."""
@@ -24,7 +28,11 @@ def preload_everything():
         # Test the context loading
         test_context = context_loader.load_context(symptoms=['fever', 'nausea'])
         
+        # Live-reload the knowledge base when model_inputs changes
+        start_knowledge_base_watcher(model_inputs_path, KB_WATCH_INTERVAL)
+        
         print(f"✅ Pre-loading completed in {time.time() - start_time:.2f}s")
+        print(f"📚 Knowledge base version: {context_loader.knowledge_base.version}")
         print(f"📊 Test context length: {len(test_context)} characters")
         
         return context_loader
@@ -0,0 +1,473 @@
+"""
+Compiled rule engine for oncolife_alerts_configuration.txt.
+
+Each rule's `when:` expression is parsed into a small, safe expression AST
+(comparisons, `in` lists, `and`/`or`/`not`, parentheses) and compiled into
+Python closures, so red-flag overrides can be evaluated deterministically
+over a chat's structured attributes in microseconds on every turn.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+
+from llm.question_bank import GENERAL_SCOPE
+from llm.sections import RED_FLAG_KEYS, normalize_symptom
+
+ALERTS_FILENAME = "oncolife_alerts_configuration.txt"
+
+Predicate = Callable[[Mapping[str, Any]], bool]
+
+_TOKEN_SPEC = [
+    ("NUMBER", r"-?\d+(?:\.\d+)?"),
+    ("STRING", r'"[^"]*"|\'[^\']*\''),
+    ("OP", r"==|!=|>=|<=|>|<"),
+    ("LPAREN", r"\("),
+    ("RPAREN", r"\)"),
+    ("LBRACKET", r"\["),
+    ("RBRACKET", r"\]"),
+    ("COMMA", r","),
+    ("NAME", r"[A-Za-z_][A-Za-z0-9_]*"),
+    ("SKIP", r"\s+"),
+    ("MISMATCH", r"."),
+]
+_TOKEN_PATTERN = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in _TOKEN_SPEC))
+_KEYWORDS = {"and", "or", "not", "in", "true", "false"}
+_TRUTHY = {"true", "yes", "y", "1"}
+_FALSY = {"false", "no", "n", "0"}
+
+
+class AlertRuleError(ValueError):
+    """Raised when an alert rule or its `when:` expression cannot be parsed."""
+
+
+@dataclass(frozen=True)
+class AlertRule:
+    id: str
+    symptom: str
+    when: str
+    override_to_grade: int
+    reason: str
+    long_questions: Tuple[str, ...]
+    attributes: FrozenSet[str]
+    predicate: Predicate = field(repr=False, compare=False)
+
+    def matches(self, attributes: Mapping[str, Any]) -> bool:
+        return self.predicate(attributes)
+
+
+# ===============================================================================
+# Expression parsing
+# ===============================================================================
+
+def _tokenize(expression: str) -> List[Tuple[str, str]]:
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(expression):
+        kind, value = match.lastgroup, match.group()
+        if kind == "SKIP":
+            continue
+        if kind == "MISMATCH":
+            raise AlertRuleError(f"Unexpected character {value!r} in {expression!r}")
+        if kind == "NAME" and value in _KEYWORDS:
+            kind = value.upper()
+        tokens.append((kind, value))
+    return tokens
+
+
+class _Parser:
+    """
+    Recursive-descent parser producing a nested-tuple AST:
+
+        ("or", a, b) | ("and", a, b) | ("not", a)
+        ("cmp", op, name, literal) | ("in", name, (literals...)) | ("truthy", name)
+    """
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.tokens = _tokenize(expression)
+        self.pos = 0
+
+    def parse(self):
+        node = self._or()
+        if self.pos != len(self.tokens):
+            raise AlertRuleError(f"Unexpected {self.tokens[self.pos][1]!r} in {self.expression!r}")
+        return node
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else None
+
+    def _take(self, kind: str) -> str:
+        if self._peek() != kind:
+            found = self.tokens[self.pos][1] if self.pos < len(self.tokens) else "end of expression"
+            raise AlertRuleError(f"Expected {kind} but found {found!r} in {self.expression!r}")
+        value = self.tokens[self.pos][1]
+        self.pos += 1
+        return value
+
+    def _or(self):
+        node = self._and()
+        while self._peek() == "OR":
+            self.pos += 1
+            node = ("or", node, self._and())
+        return node
+
+    def _and(self):
+        node = self._not()
+        while self._peek() == "AND":
+            self.pos += 1
+            node = ("and", node, self._not())
+        return node
+
+    def _not(self):
+        if self._peek() == "NOT":
+            self.pos += 1
+            return ("not", self._not())
+        return self._atom()
+
+    def _atom(self):
+        if self._peek() == "LPAREN":
+            self.pos += 1
+            node = self._or()
+            self._take("RPAREN")
+            return node
+
+        name = self._take("NAME")
+        if self._peek() == "OP":
+            op = self._take("OP")
+            return ("cmp", op, name, self._literal())
+        if self._peek() == "IN":
+            self.pos += 1
+            self._take("LBRACKET")
+            values = [self._literal()]
+            while self._peek() == "COMMA":
+                self.pos += 1
+                values.append(self._literal())
+            self._take("RBRACKET")
+            return ("in", name, tuple(values))
+        return ("truthy", name)
+
+    def _literal(self):
+        kind = self._peek()
+        if kind == "NUMBER":
+            value = self._take("NUMBER")
+            return float(value) if "." in value else int(value)
+        if kind == "STRING":
+            return self._take("STRING")[1:-1]
+        if kind in ("TRUE", "FALSE"):
+            self.pos += 1
+            return kind == "TRUE"
+        raise AlertRuleError(f"Expected a literal in {self.expression!r}")
+
+
+def parse_expression(expression: str):
+    """Parses a `when:` expression into its AST."""
+    return _Parser(expression).parse()
+
+
+def _attribute_names(node) -> FrozenSet[str]:
+    kind = node[0]
+    if kind in ("or", "and"):
+        return _attribute_names(node[1]) | _attribute_names(node[2])
+    if kind == "not":
+        return _attribute_names(node[1])
+    if kind == "cmp":
+        return frozenset({node[2]})
+    return frozenset({node[1]})
+
+
+# ===============================================================================
+# Compilation
+# ===============================================================================
+
+_MISSING = object()
+
+
+def _coerce(value: Any, like: Any) -> Any:
+    """Coerces an attribute value reported as text to the type of the rule's literal."""
+    if isinstance(like, bool):
+        if isinstance(value, str):
+            lowered = value.strip().lower()
+            if lowered in _TRUTHY:
+                return True
+            if lowered in _FALSY:
+                return False
+        return value
+    if isinstance(like, (int, float)) and isinstance(value, str):
+        try:
+            return float(value.strip().rstrip("%°F").strip())
+        except ValueError:
+            return value
+    if isinstance(like, str) and isinstance(value, str):
+        return value.strip().lower()
+    return value
+
+
+_COMPARATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+}
+
+
+def _compile(node) -> Predicate:
+    kind = node[0]
+    if kind == "or":
+        left, right = _compile(node[1]), _compile(node[2])
+        return lambda attributes: left(attributes) or right(attributes)
+    if kind == "and":
+        left, right = _compile(node[1]), _compile(node[2])
+        return lambda attributes: left(attributes) and right(attributes)
+    if kind == "not":
+        inner = _compile(node[1])
+        return lambda attributes: not inner(attributes)
+    if kind == "cmp":
+        _, op, name, literal = node
+        compare = _COMPARATORS[op]
+        literal = literal.lower() if isinstance(literal, str) else literal
+
+        def predicate(attributes):
+            # Unknown attributes never trigger an alert
+            value = attributes.get(name, _MISSING)
+            if value is _MISSING or value is None:
+                return False
+            try:
+                return compare(_coerce(value, literal), literal)
+            except TypeError:
+                return False
+        return predicate
+    if kind == "in":
+        _, name, literals = node
+        options = {literal.lower() if isinstance(literal, str) else literal for literal in literals}
+        sample = literals[0]
+
+        def predicate(attributes):
+            value = attributes.get(name, _MISSING)
+            if value is _MISSING or value is None:
+                return False
+            # Multi-select answers arrive as lists and match if any option is selected
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            return any(_coerce(v, sample) in options for v in values)
+        return predicate
+    if kind == "truthy":
+        name = node[1]
+        return lambda attributes: _coerce(attributes.get(name), True) is True
+    raise AlertRuleError(f"Unknown expression node {kind!r}")
+
+
+def compile_expression(expression: str) -> Tuple[Predicate, FrozenSet[str]]:
+    """Compiles a `when:` expression into a predicate and the attributes it reads."""
+    ast = parse_expression(expression)
+    return _compile(ast), _attribute_names(ast)
+
+
+# ===============================================================================
+# Rule file parsing and evaluation
+# ===============================================================================
+
+def parse_alert_rules(text: str) -> List[AlertRule]:
+    """
+    Parses every `id:` ... `reason:` block of the alerts configuration into a compiled rule.
+    """
+    rules = []
+    block: List[str] = []
+    for line in text.splitlines():
+        if line.startswith("id:"):
+            block = [line]
+        elif block:
+            block.append(line)
+            if line.startswith("reason:"):
+                rules.append(_parse_rule_block(block))
+                block = []
+    return rules
+
+
+def _parse_rule_block(lines: List[str]) -> AlertRule:
+    fields: Dict[str, str] = {}
+    long_questions = []
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith('"'):
+            long_questions.append(stripped.strip('"'))
+        elif ":" in line:
+            key, value = line.split(":", 1)
+            fields[key.strip()] = value.split(" #", 1)[0].strip()
+
+    try:
+        rule_id = fields["id"]
+        when = fields["when"]
+        grade = int(fields["override_to_grade"])
+    except (KeyError, ValueError) as e:
+        raise AlertRuleError(f"Malformed alert rule block starting {lines[0]!r}: {e}")
+
+    return compile_rule(
+        rule_id, fields.get("symptom", ""), when, grade, fields.get("reason", "").strip('"'), long_questions
+    )
+
+
+def compile_rule(
+    rule_id: str, symptom: str, when: str, override_to_grade: int, reason: str, long_questions: Iterable[str] = ()
+) -> AlertRule:
+    """Compiles one rule from its fields."""
+    predicate, attributes = compile_expression(when)
+    return AlertRule(
+        id=rule_id,
+        symptom=symptom,
+        when=when,
+        override_to_grade=override_to_grade,
+        reason=reason,
+        long_questions=tuple(long_questions),
+        attributes=attributes,
+        predicate=predicate,
+    )
+
+
+class AlertEngine:
+    """
+    Evaluates the compiled alert rules over a chat's structured attributes.
+    """
+    def __init__(self, rules: Iterable[AlertRule]):
+        self.rules: Tuple[AlertRule, ...] = tuple(rules)
+        # Index rules by attribute so evaluation skips rules with no known inputs
+        self._rules_by_attribute: Dict[str, List[AlertRule]] = {}
+        self._attributes_by_symptom: Dict[str, set] = {}
+        for rule in self.rules:
+            for attribute in rule.attributes:
+                self._rules_by_attribute.setdefault(attribute, []).append(rule)
+            self._attributes_by_symptom.setdefault(normalize_symptom(rule.symptom), set()).update(rule.attributes)
+
+    @classmethod
+    def from_text(cls, text: str) -> "AlertEngine":
+        return cls(parse_alert_rules(text))
+
+    @property
+    def attributes(self) -> FrozenSet[str]:
+        return frozenset(self._rules_by_attribute)
+
+    def attributes_for(self, symptom: str) -> FrozenSet[str]:
+        """The attributes read by the rules of one symptom."""
+        return frozenset(self._attributes_by_symptom.get(normalize_symptom(symptom), ()))
+
+    def evaluate(
+        self, attributes: Mapping[str, Mapping[str, Any]], symptoms: Optional[Iterable[str]] = None
+    ) -> List[AlertRule]:
+        """
+        Returns the rules triggered by the per-symptom attributes, in file order. A symptom's
+        rules read that symptom's attributes and GENERAL_SCOPE only; the red-flag rules read
+        every symptom's. With symptoms, only rules for those symptoms and the red-flag rules
+        are considered.
+        """
+        if not attributes:
+            return []
+        merged = flatten_attributes(attributes)
+        candidates = {
+            rule.id for name in merged for rule in self._rules_by_attribute.get(name, ())
+        }
+        wanted = None
+        if symptoms is not None:
+            wanted = RED_FLAG_KEYS | {normalize_symptom(s) for s in symptoms}
+        scopes: Dict[str, Mapping[str, Any]] = {}
+        triggered = []
+        for rule in self.rules:
+            symptom = normalize_symptom(rule.symptom)
+            if rule.id not in candidates or (wanted is not None and symptom not in wanted):
+                continue
+            if symptom not in scopes:
+                scopes[symptom] = merged if symptom in RED_FLAG_KEYS else {
+                    **attributes.get(GENERAL_SCOPE, {}), **attributes.get(symptom, {})
+                }
+            if rule.matches(scopes[symptom]):
+                triggered.append(rule)
+        return triggered
+
+    def override_grades(
+        self, attributes: Mapping[str, Mapping[str, Any]], symptoms: Optional[Iterable[str]] = None
+    ) -> Dict[str, int]:
+        """Returns the highest override grade per symptom for the triggered rules."""
+        grades: Dict[str, int] = {}
+        for rule in self.evaluate(attributes, symptoms):
+            grades[rule.symptom] = max(grades.get(rule.symptom, 0), rule.override_to_grade)
+        return grades
+
+
+def merge_attributes(attributes: Dict[str, Dict[str, Any]], new: Mapping[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    Merges per-symptom attributes ({symptom: {attribute: value}}) into attributes in place,
+    so later answers win. Flat entries, recorded before attributes were kept per symptom,
+    go to GENERAL_SCOPE.
+    """
+    for name, value in new.items():
+        if isinstance(value, dict):
+            attributes.setdefault(name, {}).update(value)
+        else:
+            attributes.setdefault(GENERAL_SCOPE, {})[name] = value
+    return attributes
+
+
+def flatten_attributes(attributes: Mapping[str, Mapping[str, Any]]) -> Dict[str, Any]:
+    """One attribute dict over every symptom, for the rules that do not belong to a symptom."""
+    flat: Dict[str, Any] = {}
+    for values in attributes.values():
+        flat.update(values)
+    return flat
+
+
+def collect_attributes(history: Iterable[Mapping[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Merges the per-symptom data attributes recorded on assistant messages
+    (structured_data["data_attributes"]), oldest first, so later answers win.
+    """
+    attributes: Dict[str, Dict[str, Any]] = {}
+    for message in history:
+        structured_data = message.get("structured_data") or {}
+        recorded = structured_data.get("data_attributes") if isinstance(structured_data, dict) else None
+        if isinstance(recorded, dict):
+            merge_attributes(attributes, recorded)
+    return attributes
+
+
+def apply_overrides(
+    severity_list: Optional[Mapping[str, Any]],
+    overrides: Mapping[str, int],
+    canonicalize: Optional[Callable[[str], str]] = None,
+) -> Dict[str, Any]:
+    """
+    Raises each symptom's severity to at least its override grade. With canonicalize, the
+    severity list's keys (LLM spellings such as "Vomiting") are first mapped onto the
+    canonical ids the overrides use, keeping the highest grade of any duplicates.
+    """
+    merged: Dict[str, Any] = {}
+    for symptom, severity in (severity_list or {}).items():
+        key = (canonicalize(symptom) or symptom) if canonicalize else symptom
+        current = merged.get(key)
+        if key not in merged or (isinstance(severity, int) and (not isinstance(current, int) or current < severity)):
+            merged[key] = severity
+    for symptom, grade in overrides.items():
+        symptom = (canonicalize(symptom) or symptom) if canonicalize else symptom
+        current = merged.get(symptom)
+        if not isinstance(current, int) or current < grade:
+            merged[symptom] = grade
+    return merged
+
+
+def format_alert_attributes(engine: AlertEngine, question_bank: Any, symptoms: Iterable[str]) -> str:
+    """
+    Formats, per patient symptom and red flag, the attributes its rules read that none of
+    its questions collect, so the LLM can report them when the patient mentions them.
+    """
+    lines = []
+    for symptom in dict.fromkeys([normalize_symptom(s) for s in symptoms] + sorted(RED_FLAG_KEYS)):
+        asked = {question.data_attribute for question in question_bank.questions_for(symptom)}
+        names = sorted(engine.attributes_for(symptom) - asked)
+        if names:
+            lines.append(f"- {symptom}: {', '.join(names)}")
+    return "\n".join(lines)
+
+
+def format_triggered_alerts(rules: Iterable[AlertRule]) -> str:
+    """Formats triggered rules for the prompt."""
+    return "\n".join(
+        f"- {rule.id} ({rule.symptom}): override to grade {rule.override_to_grade} - {rule.reason}"
+        for rule in rules
+    )
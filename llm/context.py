@@ -1,80 +1,181 @@
 import os
 import json
-import docx
-import numpy as np
-from pypdf import PdfReader
-from typing import List, Dict, Any
-
-# Lazy-load sentence-transformers and faiss to avoid loading them on every import
-sentence_transformers = None
-faiss = None
-
-def _import_embedding_libraries():
-    global sentence_transformers, faiss
-    if sentence_transformers is None:
-        import sentence_transformers as st
-        sentence_transformers = st
-    if faiss is None:
-        import faiss as f
-        faiss = f
+from typing import List, Dict, Any, Optional, Tuple
+
+from llm.alert_rules import AlertRule, apply_overrides, format_alert_attributes, merge_attributes
+from llm.ctcae_terms import format_ctcae_context
+from llm.onnx_encoder import embedding_model_id
+from llm.embedding_cache import CachedEncoder, get_embedding_cache
+from llm.embedding_worker import get_embedding_batcher
+from llm.bm25 import get_bm25_index
+from llm.categories import CATEGORY_FILTER, get_category_index
+from llm.retrieval import RETRIEVAL_MODE, search_hybrid_per_symptom, search_per_symptom
+from llm.selection import DocumentSelector
+from llm.retrieval_cache import RetrievalResult, get_retrieval_cache, retrieval_key
+from llm.knowledge_base import (
+    get_knowledge_base, get_embedding_model, embedding_model_if_ready, warm_embedding_model,
+    load_docx, load_pdf, load_txt, VECTOR_STORE_FILENAME, DOCUMENTS_FILENAME,
+)
 
 class ContextLoader:
     """
-    Loads context from files and pre-computed vector stores.
+    Loads context from the shared knowledge base snapshot and pre-computed vector stores.
+
+    A loader pins the snapshot current when it is built, so everything one turn reads
+    (prompt, alerts, overrides, version) comes from one version; build a loader per turn,
+    or call current(), to pick up a live reload.
     """
     def __init__(self, directory: str, model_name='all-MiniLM-L6-v2'):
         self.directory = directory
         self.model_name = model_name
-        self.vector_store_path = os.path.join(self.directory, "ctcae_index.faiss")
-        self.documents_path = os.path.join(self.directory, "ctcae_documents.json")
+        self.vector_store_path = os.path.join(self.directory, VECTOR_STORE_FILENAME)
+        self.documents_path = os.path.join(self.directory, DOCUMENTS_FILENAME)
         self.model = None
-        self.index = None
-        self.documents = []
-        self._load_vector_store()
+        # Query embeddings are shared by every loader using the same model
+        self.embedding_cache = get_embedding_cache(embedding_model_id(model_name))
+        self.retrieval_cache = get_retrieval_cache()
+        self.knowledge_base = get_knowledge_base(self.directory)
+
+    def current(self) -> "ContextLoader":
+        """This loader if its snapshot is still the live one, else a loader pinned to the new snapshot."""
+        knowledge_base = get_knowledge_base(self.directory)
+        if knowledge_base is self.knowledge_base:
+            return self
+        loader = ContextLoader(self.directory, self.model_name)
+        loader.model = self.model
+        return loader
 
-    def _initialize_model(self):
+    @property
+    def index(self):
+        return self.knowledge_base.index
+
+    @property
+    def documents(self):
+        return self.knowledge_base.documents
+
+    def _initialize_model(self, wait: bool = True) -> bool:
+        """
+        Loads the embedding model; with wait=False only starts loading it in the background.
+        Returns whether the model is ready.
+        """
         if self.model is None:
-            _import_embedding_libraries()
-            self.model = sentence_transformers.SentenceTransformer(self.model_name)
-
-    def _load_vector_store(self):
-        """Loads the pre-computed FAISS vector store from disk."""
-        if os.path.exists(self.vector_store_path) and os.path.exists(self.documents_path):
-            print("Loading existing FAISS index and documents.")
-            _import_embedding_libraries()
-            self.index = faiss.read_index(self.vector_store_path)
-            with open(self.documents_path, 'r') as f:
-                self.documents = json.load(f)
-        else:
-            print("Warning: Pre-built vector store not found. Symptom context will be disabled.")
-            print(f"Please run `python backend/scripts/build_vector_store.py` to generate it.")
-            self.index = None
-            self.documents = []
+            if wait:
+                self.model = get_embedding_model(self.model_name)
+            else:
+                self.model = embedding_model_if_ready(self.model_name)
+                if self.model is None:
+                    warm_embedding_model(self.model_name)
+        return self.model is not None
+
+    def _encoder(self) -> CachedEncoder:
+        """The model behind the query embedding cache and the micro-batching worker."""
+        batcher = get_embedding_batcher(embedding_model_id(self.model_name), self.model)
+        return CachedEncoder(batcher, self.embedding_cache)
+
+    def retrieve_symptom_documents(self, symptoms: List[str], k: int = 5, wait_for_model: bool = True,
+                                   mode: Optional[str] = None) -> List[str]:
+        """
+        Retrieves the relevant CTCAE documents for the symptoms. Symptoms that name a CTCAE
+        term resolve directly to its grade table; the rest are searched with one query per
+        symptom (BM25 fused with the vector store in hybrid mode), sharing the top-k results
+        through a per-symptom quota.
+
+        Results share the retrieval cache with retrieve_symptom_context_from_vector_store. An
+        explicit mode, which overrides ONCOLIFE_RETRIEVAL_MODE, bypasses the cache since its
+        entries are not keyed by mode.
+        """
+        if mode is not None:
+            return self._retrieve_symptom_documents(symptoms, k, wait_for_model, self.knowledge_base, mode)[0]
+        if not symptoms:
+            return []
+        return list(self._cached_retrieval(symptoms, k, wait_for_model, self.knowledge_base).documents)
+
+    def _cached_retrieval(self, symptoms: List[str], k: int, wait_for_model: bool, knowledge_base) -> RetrievalResult:
+        """
+        Serves the symptom set from the retrieval cache, or retrieves it and caches the
+        result once it is final. Order and duplicates in symptoms do not matter.
+        """
+        symptoms = sorted(set(symptoms))
+        # Repeat turns and symptom sets shared across patients skip retrieval entirely
+        key = retrieval_key(symptoms, knowledge_base.version, k)
+        cached = self.retrieval_cache.get(key)
+        if cached is not None:
+            print(f"CTCAE context served from the retrieval cache for {symptoms}")
+            return cached
+
+        relevant_docs, final = self._retrieve_symptom_documents(symptoms, k, wait_for_model, knowledge_base)
+        result = RetrievalResult(format_ctcae_context(relevant_docs), tuple(relevant_docs))
+        if final:
+            self.retrieval_cache.put(key, result)
+        return result
+
+    def _retrieve_symptom_documents(self, symptoms: List[str], k: int, wait_for_model: bool,
+                                    knowledge_base, mode: Optional[str] = None) -> Tuple[List[str], bool]:
+        """
+        Returns the documents and whether they are final, i.e. False for lexical-only
+        results served while the embedding model is still loading. Everything is read
+        from the given snapshot so a reload mid-call cannot mix versions.
+        """
+        mode = mode or RETRIEVAL_MODE
+        if not symptoms:
+            return [], True
+
+        hits, misses = knowledge_base.ctcae_terms.resolve(symptoms)
+        relevant_docs = [term.document for term in hits]
+        print(f"CTCAE term lookup: {len(hits)} term(s) matched, {len(misses)} symptom(s) sent to the vector store")
+
+        final = True
+        index, documents = knowledge_base.index, knowledge_base.documents
+        if misses and index:
+            # Each symptom searches only the CTCAE categories it is routed to
+            categories = get_category_index(knowledge_base) if CATEGORY_FILTER else None
+            # Distance cutoff, adaptive k and MMR over each symptom's candidates
+            selector = DocumentSelector(documents)
+            selection_stats = []
+            if mode == "dense":
+                self._initialize_model()
+                encoder = self._encoder()
+                document_ids = search_per_symptom(
+                    encoder, index, misses, k, categories, selector=selector, stats=selection_stats
+                )
+            else:
+                encoder = None
+                if mode != "lexical" and self._initialize_model(wait=wait_for_model):
+                    encoder = self._encoder()
+                elif mode != "lexical":
+                    print("🔤 Embedding model still loading; serving lexical-only results")
+                    final = False
+                document_ids = search_hybrid_per_symptom(
+                    encoder, index, get_bm25_index(knowledge_base), misses, k,
+                    categories=categories, selector=selector, stats=selection_stats,
+                )
+            for stats in selection_stats:
+                print(f"Document selection {stats}")
+            for i in document_ids:
+                if documents[i] not in relevant_docs:
+                    relevant_docs.append(documents[i])
+
+        return relevant_docs, final
 
     def retrieve_symptom_context_from_vector_store(self, symptoms: List[str], k: int = 5) -> str:
         """
-        Retrieves the top-k relevant CTCAE criteria from the vector store based on symptoms.
+        Retrieves the relevant CTCAE criteria for the symptoms, from the retrieval cache or
+        the context bundles when possible.
         """
-        if not self.index or not symptoms:
+        if not symptoms:
             return ""
+        symptoms = sorted(set(symptoms))
+        knowledge_base = self.knowledge_base
 
-        self._initialize_model()
-        query = ", ".join(symptoms)
-        query_embedding = self.model.encode([query])[0]
-        
-        # FAISS expects a 2D array for searching
-        query_embedding_np = np.array([query_embedding], dtype='float32')
-
-        distances, indices = self.index.search(query_embedding_np, k)
-        
-        relevant_docs = [self.documents[i] for i in indices[0]]
-        
-        if not relevant_docs:
+        formatted_context = knowledge_base.context_bundles.context_for(symptoms)
+        if formatted_context is None:
+            formatted_context = self._cached_retrieval(symptoms, k, False, knowledge_base).context
+        else:
+            print(f"CTCAE context served from context bundles for {symptoms}")
+
+        if not formatted_context:
             return ""
 
-        formatted_context = "### Relevant CTCAE v5 Criteria (from knowledge base)\n"
-        formatted_context += "\n---\n".join(relevant_docs)
-        
         print("\n==================== CTCAE Context Retrieved ====================")
         print(formatted_context)
         print("=================================================================\n")
@@ -84,50 +185,109 @@ class ContextLoader:
     def load_context(self, symptoms: List[str] = None) -> str:
         """
         Loads general documents and retrieves symptom-specific context using the vector store.
+        With symptoms, the general documents are cut down to the matching and red-flag sections.
         """
-        full_context = []
-        for filename in os.listdir(self.directory):
-            if filename.endswith((".faiss", ".json", "system_prompt.txt")):
-                continue
-            
-            file_path = os.path.join(self.directory, filename)
-            content = ""
-            if filename.endswith(".pdf"):
-                content = self._load_pdf(file_path)
-            elif filename.endswith(".docx"):
-                content = self._load_docx(file_path)
-            elif filename.endswith(".txt"):
-                content = self._load_txt(file_path)
-            
-            if content:
-                full_context.append(content)
+        full_context = self.knowledge_base.sections.context_for(symptoms)
 
         # Add symptom-specific context if symptoms are provided
         if symptoms:
             symptom_context = self.retrieve_symptom_context_from_vector_store(symptoms)
             if symptom_context:
                 full_context.insert(0, symptom_context) # Prepend for importance
-        
+
         return "\n\n---\n\n".join(full_context)
 
+    def merge_symptoms(self, existing: Optional[List[str]], new: Optional[List[str]]) -> List[str]:
+        """
+        Merges new symptoms into a symptom list, mapping every spelling onto its canonical id.
+        """
+        return self.knowledge_base.symptoms.merge(existing, new)
+
+    def evaluate_alerts(self, symptoms: List[str], attributes: Optional[Dict[str, Dict[str, Any]]] = None) -> List[AlertRule]:
+        """
+        Evaluates the compiled alert rules over the per-symptom attributes collected so far.
+        """
+        return self.knowledge_base.alert_engine.evaluate(attributes or {}, symptoms or [])
+
+    def pending_questions_prompt(
+        self,
+        symptoms: List[str],
+        history: List[Dict[str, Any]] = None,
+        attributes: Optional[Dict[str, Dict[str, Any]]] = None,
+        triggered_alerts: Optional[List[AlertRule]] = None,
+    ) -> str:
+        """
+        Returns the pending questions from questions.json for the symptom currently being assessed.
+        Attributes already collected for that symptom are skipped and symptoms with a triggered
+        alert get their long-phase questions too.
+        """
+        question_bank = self.knowledge_base.question_bank
+        symptom, pending = question_bank.current_assessment(
+            symptoms or [], history or [], attributes or {},
+            long_phase_symptoms=[rule.symptom for rule in triggered_alerts or []],
+        )
+        return question_bank.format_pending(symptom, pending)
+
+    def alert_attributes_prompt(self, symptoms: List[str]) -> str:
+        """
+        Returns the alert rule attributes no pending question collects, per patient symptom
+        and red flag, for the LLM to report when the patient mentions them.
+        """
+        knowledge_base = self.knowledge_base
+        return format_alert_attributes(knowledge_base.alert_engine, knowledge_base.question_bank, symptoms or [])
+
+    def scope_attributes(
+        self,
+        new_attributes: Dict[str, Any],
+        symptoms: List[str],
+        history: List[Dict[str, Any]] = None,
+        attributes: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Files the attributes the LLM reported this turn under their symptoms. Flat values that
+        several symptoms ask for go to the symptom whose questions were pending this turn.
+        """
+        question_bank = self.knowledge_base.question_bank
+        assessing, _ = question_bank.current_assessment(
+            symptoms or [], history or [], attributes or {},
+            long_phase_symptoms=[rule.symptom for rule in self.evaluate_alerts(symptoms, attributes)],
+        )
+        return question_bank.scope_attributes(new_attributes or {}, symptoms or [], assessing)
+
+    def record_attributes(
+        self,
+        reported: Any,
+        symptoms: List[str],
+        history: List[Dict[str, Any]],
+        attributes: Dict[str, Dict[str, Any]],
+    ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, int]]:
+        """
+        Files the attributes the LLM reported this turn under their symptoms and merges them
+        into attributes in place. Returns this turn's scoped attributes, to store on the reply,
+        and the alert override grade per symptom over everything collected so far.
+        """
+        new_attributes = self.scope_attributes(
+            reported if isinstance(reported, dict) else {}, symptoms, history, attributes
+        )
+        merge_attributes(attributes, new_attributes)
+        return new_attributes, self.knowledge_base.alert_engine.override_grades(attributes, symptoms or [])
+
+    def apply_severity_overrides(self, severity_list: Optional[Dict[str, Any]], overrides: Dict[str, int]) -> Dict[str, Any]:
+        """Raises severities to the override grades, keyed by canonical symptom id."""
+        return apply_overrides(severity_list, overrides, self.knowledge_base.symptoms.canonicalize)
+
     # Keep the existing loader methods (_load_docx, _load_pdf, _load_txt, _load_json, load_system_prompt)
     def _load_docx(self, file_path: str) -> str:
         """Loads text from a .docx file."""
-        doc = docx.Document(file_path)
-        return "\n".join([para.text for para in doc.paragraphs])
+        return load_docx(file_path)
 
     def _load_pdf(self, file_path: str) -> str:
         """Loads text from a .pdf file."""
-        reader = PdfReader(file_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() or ""
-        return text
+        return load_pdf(file_path)
 
     def _load_txt(self, file_path: str) -> str:
         """Loads text from a .txt file."""
-        with open(file_path, 'r') as f:
-            return f.read()
+        return load_txt(file_path)
 
     def _load_json(self, file_path: str) -> Dict[str, Any]:
         """Loads data from a .json file."""
@@ -138,7 +298,4 @@ class ContextLoader:
         """
         Loads the system prompt from 'system_prompt.txt'.
         """
-        system_prompt_path = os.path.join(self.directory, "system_prompt.txt")
-        if os.path.exists(system_prompt_path):
-            return self._load_txt(system_prompt_path)
-        return ""
\ No newline at end of file
+        return self.knowledge_base.system_prompt
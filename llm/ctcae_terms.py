@@ -0,0 +1,132 @@
+"""
+Direct term index over CTCAE.json.
+
+Symptoms that name a CTCAE term (exactly, case-folded, or through the synonym
+table) resolve to that term's grade table with a dict lookup; only the rest
+need an embedding and a vector store search.
+"""
+
+import re
+import json
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+CTCAE_FILENAME = "CTCAE.json"
+CTCAE_CONTEXT_HEADER = "### Relevant CTCAE v5 Criteria (from knowledge base)\n"
+CTCAE_DOCUMENT_SEPARATOR = "\n---\n"
+
+# Patient-facing symptom names (multi-select options, questions.json ids and
+# common abbreviations) mapped onto CTCAE v5 terms
+CTCAE_SYNONYMS: Dict[str, Tuple[str, ...]] = {
+    "mouth sores": ("Mucositis oral",),
+    "mouth or throat sores": ("Mucositis oral", "Sore throat"),
+    "mucositis": ("Mucositis oral",),
+    "rash": ("Rash maculo-papular", "Rash acneiform"),
+    "skin rash": ("Rash maculo-papular", "Rash acneiform"),
+    "shortness of breath": ("Dyspnea",),
+    "sob": ("Dyspnea",),
+    "trouble breathing": ("Dyspnea",),
+    "breathlessness": ("Dyspnea",),
+    "no appetite": ("Anorexia",),
+    "loss of appetite": ("Anorexia",),
+    "numbness or tingling": ("Peripheral sensory neuropathy", "Paresthesia"),
+    "neuropathy": ("Peripheral sensory neuropathy", "Peripheral motor neuropathy"),
+    "tingling": ("Paresthesia",),
+    "swelling": ("Edema limbs",),
+    "bleeding": ("Bruising", "Epistaxis", "Hematuria"),
+    "urinary issues": ("Urinary frequency", "Urinary urgency", "Urinary tract pain"),
+    "urinary problems": ("Urinary frequency", "Urinary urgency", "Urinary tract pain"),
+    "eye complaints": ("Eye pain", "Blurred vision", "Dry eye"),
+    "eye problems": ("Eye pain", "Blurred vision", "Dry eye"),
+    "chest pain": ("Chest pain - cardiac", "Non-cardiac chest pain"),
+    "tiredness": ("Fatigue",),
+    "temperature": ("Fever",),
+    "diarrhoea": ("Diarrhea",),
+    "throwing up": ("Vomiting",),
+    "feeling sick": ("Nausea",),
+    "hair loss": ("Alopecia",),
+    "itching": ("Pruritus",),
+    "taste changes": ("Dysgeusia",),
+}
+
+
+@dataclass(frozen=True)
+class CTCAETerm:
+    term: str
+    category: str
+    grades: Tuple[Tuple[str, str], ...]
+
+    @property
+    def document(self) -> str:
+        """The term formatted exactly as in ctcae_documents.json."""
+        text = f"Symptom/Disorder: {self.term} (Category: {self.category})\n"
+        for grade, description in self.grades:
+            text += f"  - Grade {grade}: {description}\n"
+        return text
+
+
+def normalize_term(text: str) -> str:
+    """Case-folds a term and collapses punctuation and whitespace to single spaces."""
+    return re.sub(r"[^a-z0-9]+", " ", text.casefold()).strip()
+
+
+def format_ctcae_context(documents: Iterable[str]) -> str:
+    """Formats CTCAE documents as the symptom context block of the prompt."""
+    documents = list(documents)
+    if not documents:
+        return ""
+    return CTCAE_CONTEXT_HEADER + CTCAE_DOCUMENT_SEPARATOR.join(documents)
+
+
+class CTCAETermIndex:
+    """
+    Exact, case-folded and synonym lookup from symptom names to CTCAE terms.
+    """
+    def __init__(self, ctcae: Mapping[str, Mapping[str, Mapping[str, str]]],
+                 synonyms: Mapping[str, Tuple[str, ...]] = CTCAE_SYNONYMS):
+        self.terms: Dict[str, CTCAETerm] = {}
+        for category, terms in ctcae.items():
+            for term, grades in terms.items():
+                self.terms[term] = CTCAETerm(
+                    term=term,
+                    category=category,
+                    grades=tuple((grade, text) for grade, text in grades.items() if text),
+                )
+
+        self._folded: Dict[str, Tuple[str, ...]] = {normalize_term(term): (term,) for term in self.terms}
+        self._synonyms: Dict[str, Tuple[str, ...]] = {
+            normalize_term(name): tuple(term for term in targets if term in self.terms)
+            for name, targets in synonyms.items()
+        }
+
+    @classmethod
+    def from_file(cls, file_path: str) -> "CTCAETermIndex":
+        with open(file_path, 'r') as f:
+            return cls(json.load(f))
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def lookup(self, symptom: str) -> Tuple[CTCAETerm, ...]:
+        """Returns the CTCAE terms a symptom name resolves to, or () on a miss."""
+        if symptom in self.terms:
+            return (self.terms[symptom],)
+        key = normalize_term(symptom)
+        names = self._folded.get(key) or self._synonyms.get(key) or ()
+        return tuple(self.terms[name] for name in names)
+
+    def resolve(self, symptoms: Iterable[str]) -> Tuple[List[CTCAETerm], List[str]]:
+        """
+        Splits symptoms into the CTCAE terms they resolve to (deduplicated, in order)
+        and the symptoms that missed the index.
+        """
+        hits: Dict[str, CTCAETerm] = {}
+        misses = []
+        for symptom in symptoms:
+            terms = self.lookup(symptom)
+            if not terms:
+                misses.append(symptom)
+            for term in terms:
+                hits.setdefault(term.term, term)
+        return list(hits.values()), misses
+
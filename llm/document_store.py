@@ -0,0 +1,81 @@
+"""
+Memory-mapped vector store and document store.
+
+Reading ctcae_index.faiss and parsing ctcae_documents.json give every process
+its own private copy of the embeddings and documents. Instead the index is
+opened with FAISS memory mapping and the documents are converted once into a
+packed string table (cached next to the extracted text, keyed by the JSON's
+SHA-256) that is memory-mapped read-only. Uvicorn workers opening the same
+files then share the page cache instead of each holding a copy.
+"""
+
+import os
+import json
+import mmap
+import tempfile
+from typing import Any, Optional, Sequence
+
+from llm.kb_artifact import StringTable, pack_strings
+from llm.text_cache import cache_dir_for, file_sha256
+
+# Set to 0 to read the index and documents into process memory instead
+KB_MMAP = os.environ.get("ONCOLIFE_KB_MMAP", "1") != "0"
+
+# Bump when the string table layout changes so cached stores are rebuilt
+DOCUMENT_STORE_VERSION = "strtab-1"
+
+
+def read_vector_store(faiss: Any, file_path: str, use_mmap: bool = KB_MMAP) -> Any:
+    """
+    Reads a FAISS index, memory-mapping its vectors when the index type supports
+    it; falls back to a regular read if the mapped read fails.
+    """
+    if use_mmap:
+        # IO_FLAG_MMAP_IFC also maps flat (IndexFlatCodes) storage on recent FAISS
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+        try:
+            return faiss.read_index(file_path, flags)
+        except RuntimeError as e:
+            print(f"Warning: Could not memory-map {os.path.basename(file_path)} ({e}); reading it instead.")
+    return faiss.read_index(file_path)
+
+
+def map_file(file_path: str) -> mmap.mmap:
+    """Memory-maps a file read-only."""
+    with open(file_path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _write_document_store(documents_path: str, store_path: str) -> None:
+    with open(documents_path, 'r') as f:
+        documents = json.load(f)
+    # Write atomically so concurrent workers never map a partial store
+    store_dir = os.path.dirname(store_path)
+    os.makedirs(store_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=store_dir, suffix=".tmp")
+    with os.fdopen(fd, 'wb') as f:
+        f.write(pack_strings(documents))
+    os.replace(tmp_path, store_path)
+
+
+def open_document_store(
+    documents_path: str,
+    use_mmap: bool = KB_MMAP,
+    cache_dir: Optional[str] = None,
+) -> Sequence[str]:
+    """
+    Returns the documents of a JSON list as a read-only sequence, backed by a
+    memory-mapped string table built on first use.
+    """
+    if use_mmap:
+        cache_dir = cache_dir or cache_dir_for(documents_path)
+        store_path = os.path.join(cache_dir, f"{file_sha256(documents_path)}-{DOCUMENT_STORE_VERSION}.bin")
+        try:
+            if not os.path.exists(store_path):
+                _write_document_store(documents_path, store_path)
+            return StringTable(map_file(store_path), 0)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not memory-map {os.path.basename(documents_path)} ({e}); reading it instead.")
+
+    with open(documents_path, 'r') as f:
+        return tuple(json.load(f))
@@ -0,0 +1,86 @@
+"""
+Configurable FAISS index types for the CTCAE vector store.
+
+backend/scripts/build_vector_store.py builds the index type named by
+ONCOLIFE_INDEX_TYPE (flat, hnsw, ivf or pq, or any FAISS index_factory
+string) and the loaders apply the search-time parameters (nprobe for IVF,
+efSearch for HNSW) after reading it. The named types size themselves to the
+corpus so they stay trainable as it grows beyond CTCAE;
+backend/scripts/benchmark_index_types.py compares their recall, latency and
+memory.
+"""
+
+import os
+import math
+from typing import Any
+
+import numpy as np
+
+INDEX_TYPES = ("flat", "hnsw", "ivf", "pq")
+
+INDEX_TYPE = os.environ.get("ONCOLIFE_INDEX_TYPE", "flat")
+# IVF lists probed per query, and HNSW candidate list size at search time
+INDEX_NPROBE = int(os.environ.get("ONCOLIFE_INDEX_NPROBE", "8"))
+INDEX_EF_SEARCH = int(os.environ.get("ONCOLIFE_INDEX_EF_SEARCH", "64"))
+
+HNSW_M = 32
+# FAISS k-means wants about 39 training points per centroid
+_POINTS_PER_CENTROID = 39
+
+
+def index_factory_string(index_type: str, count: int, dimension: int) -> str:
+    """
+    The FAISS index_factory string for a named index type and corpus size; any other
+    value is passed through as a factory string.
+    """
+    index_type = index_type.strip()
+    name = index_type.lower()
+    if name == "flat":
+        return "Flat"
+    if name == "hnsw":
+        return f"HNSW{HNSW_M},Flat"
+    if name == "ivf":
+        nlist = max(1, min(int(4 * math.sqrt(count)), count // _POINTS_PER_CENTROID))
+        return f"IVF{nlist},Flat"
+    if name == "pq":
+        # Up to 48 sub-quantizers dividing the dimension; 4-bit codes until there is data for 8
+        subquantizers = max(m for m in range(1, min(48, dimension) + 1) if dimension % m == 0)
+        nbits = 8 if count >= _POINTS_PER_CENTROID * 256 else 4
+        return f"PQ{subquantizers}x{nbits}"
+    return index_type
+
+
+def configure_index(faiss: Any, index: Any, nprobe: int = INDEX_NPROBE, ef_search: int = INDEX_EF_SEARCH) -> Any:
+    """Applies the search-time parameters that the index type supports."""
+    parameters = faiss.ParameterSpace()
+    for name, value in (("nprobe", nprobe), ("efSearch", ef_search)):
+        try:
+            parameters.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass  # Not a parameter of this index type
+    return index
+
+
+def search_parameters(faiss: Any, index: Any, selector: Any) -> Any:
+    """Search parameters restricting a search to an ID selector, keeping the index's nprobe/efSearch."""
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def build_index(faiss: Any, embeddings: np.ndarray, index_type: str = INDEX_TYPE) -> Any:
+    """Builds, trains and fills an L2 index of the given type over the embeddings."""
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    count, dimension = embeddings.shape
+    index = faiss.index_factory(dimension, index_factory_string(index_type, count, dimension), faiss.METRIC_L2)
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add(embeddings)
+    return configure_index(faiss, index)
+
+
+def index_memory(faiss: Any, index: Any) -> int:
+    """Serialized size of an index in bytes, a close proxy for its memory footprint."""
+    return int(faiss.serialize_index(index).nbytes)
@@ -0,0 +1,205 @@
+"""
+Single-file, memory-mappable knowledge base artifact.
+
+backend/scripts/compile_kb_artifact.py compiles a model_inputs directory into
+one versioned binary file so a process can open the knowledge base with a
+memory map instead of reading the FAISS index, parsing the JSON files and
+extracting text from the PDF. Layout (little-endian):
+
+    header    magic, format version, source kb version, section count
+    sections  (name, offset, length) per section
+    payload   each section, 64-byte aligned
+
+String data is stored as string tables (a count, an offset table and a UTF-8
+blob) and decoded on access; the embedding matrix is a float32 block read
+straight out of the map.
+"""
+
+import os
+import mmap
+import struct
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+ARTIFACT_FILENAME = "knowledge_base.okb"
+ARTIFACT_MAGIC = b"ONCOLKB\x00"
+ARTIFACT_FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<8sI16sI")       # magic, format version, kb version, section count
+_SECTION = struct.Struct("<16sQQ")        # name, offset, length
+_COUNT = struct.Struct("<I")
+_OFFSET = struct.Struct("<Q")
+_MATRIX = struct.Struct("<IIi")           # rows, dimension, FAISS metric type
+_ALIGNMENT = 64
+
+# Separators for list-valued fields inside a string table entry
+_ITEM_SEPARATOR = "\x1e"
+_PAIR_SEPARATOR = "\x1f"
+
+
+class ArtifactError(ValueError):
+    """Raised when a file is not a knowledge base artifact or has an unsupported format."""
+
+
+class StringTable(Sequence[str]):
+    """Read-only sequence of strings decoded lazily from a string table in a buffer."""
+    def __init__(self, buffer, offset: int):
+        self._buffer = buffer
+        (self._count,) = _COUNT.unpack_from(buffer, offset)
+        self._offsets_at = offset + _COUNT.size
+        self._blob_at = self._offsets_at + _OFFSET.size * (self._count + 1)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _item(self, i: int) -> str:
+        start, end = struct.unpack_from("<QQ", self._buffer, self._offsets_at + _OFFSET.size * i)
+        return bytes(self._buffer[self._blob_at + start:self._blob_at + end]).decode("utf-8")
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._item(n) for n in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("string table index out of range")
+        return self._item(i)
+
+    def __iter__(self) -> Iterator[str]:
+        # Full scans read the offset table and the blob once
+        offsets = struct.unpack_from(f"<{self._count + 1}Q", self._buffer, self._offsets_at)
+        blob = bytes(self._buffer[self._blob_at:self._blob_at + offsets[-1]])
+        return (blob[offsets[n]:offsets[n + 1]].decode("utf-8") for n in range(self._count))
+
+
+def pack_strings(strings: Iterable[str]) -> bytes:
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = [0]
+    for item in encoded:
+        offsets.append(offsets[-1] + len(item))
+    return (
+        _COUNT.pack(len(encoded))
+        + struct.pack(f"<{len(offsets)}Q", *offsets)
+        + b"".join(encoded)
+    )
+
+
+def pack_records(records: Iterable[Sequence[str]], width: int) -> bytes:
+    flat = []
+    for record in records:
+        if len(record) != width:
+            raise ArtifactError(f"Expected {width} fields, got {len(record)}")
+        flat.extend(record)
+    return pack_strings(flat)
+
+
+def unpack_records(table: StringTable, width: int) -> List[Tuple[str, ...]]:
+    items = list(table)
+    return [tuple(items[n:n + width]) for n in range(0, len(items), width)]
+
+
+def join_items(items: Iterable[str]) -> str:
+    return _ITEM_SEPARATOR.join(items)
+
+
+def split_items(value: str) -> List[str]:
+    return value.split(_ITEM_SEPARATOR) if value else []
+
+
+def join_pairs(pairs: Iterable[Tuple[str, str]]) -> str:
+    return join_items(f"{key}{_PAIR_SEPARATOR}{value}" for key, value in pairs)
+
+
+def split_pairs(value: str) -> List[Tuple[str, str]]:
+    return [tuple(item.split(_PAIR_SEPARATOR, 1)) for item in split_items(value)]
+
+
+def pack_matrix(matrix: np.ndarray, metric_type: int) -> bytes:
+    matrix = np.ascontiguousarray(matrix, dtype="<f4")
+    header = _MATRIX.pack(matrix.shape[0], matrix.shape[1], metric_type)
+    padding = b"\x00" * (-len(header) % _ALIGNMENT)
+    return header + padding + matrix.tobytes()
+
+
+def unpack_matrix(buffer, offset: int) -> Tuple[np.ndarray, int]:
+    rows, dimension, metric_type = _MATRIX.unpack_from(buffer, offset)
+    data_at = offset + _MATRIX.size + (-_MATRIX.size % _ALIGNMENT)
+    matrix = np.frombuffer(buffer, dtype="<f4", count=rows * dimension, offset=data_at)
+    return matrix.reshape(rows, dimension), metric_type
+
+
+def write_artifact(file_path: str, version: str, sections: Mapping[str, bytes]) -> None:
+    """Writes the named sections to an artifact file atomically."""
+    header_size = _HEADER.size + _SECTION.size * len(sections)
+    table, payload = [], b""
+    offset = header_size + (-header_size % _ALIGNMENT)
+    for name, data in sections.items():
+        table.append(_SECTION.pack(name.encode("ascii"), offset, len(data)))
+        padding = b"\x00" * (-len(data) % _ALIGNMENT)
+        payload += data + padding
+        offset += len(data) + len(padding)
+
+    header = _HEADER.pack(ARTIFACT_MAGIC, ARTIFACT_FORMAT_VERSION, version.encode("ascii"), len(sections))
+    header += b"".join(table)
+    header += b"\x00" * (-len(header) % _ALIGNMENT)
+
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(payload)
+    os.replace(tmp_path, file_path)
+
+
+@dataclass
+class Artifact:
+    """An open artifact: its source version and a memory map of the named sections."""
+    path: str
+    version: str
+    buffer: Any
+    sections: Dict[str, Tuple[int, int]]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.sections
+
+    def strings(self, name: str) -> StringTable:
+        return StringTable(self.buffer, self.sections[name][0])
+
+    def records(self, name: str, width: int) -> List[Tuple[str, ...]]:
+        return unpack_records(self.strings(name), width)
+
+    def matrix(self, name: str) -> Tuple[np.ndarray, int]:
+        return unpack_matrix(self.buffer, self.sections[name][0])
+
+
+def _read_header(buffer) -> Tuple[str, Dict[str, Tuple[int, int]]]:
+    if len(buffer) < _HEADER.size:
+        raise ArtifactError("File is too small to be a knowledge base artifact")
+    magic, format_version, version, count = _HEADER.unpack_from(buffer, 0)
+    if magic != ARTIFACT_MAGIC:
+        raise ArtifactError("Not a knowledge base artifact")
+    if format_version != ARTIFACT_FORMAT_VERSION:
+        raise ArtifactError(f"Unsupported artifact format {format_version}")
+    sections = {}
+    for n in range(count):
+        name, offset, length = _SECTION.unpack_from(buffer, _HEADER.size + _SECTION.size * n)
+        sections[name.rstrip(b"\x00").decode("ascii")] = (offset, length)
+    return version.rstrip(b"\x00").decode("ascii"), sections
+
+
+def read_artifact_version(file_path: str) -> Optional[str]:
+    """Returns the kb version an artifact was compiled from, or None if it is unreadable."""
+    try:
+        with open(file_path, 'rb') as f:
+            return _read_header(f.read(_HEADER.size + _SECTION.size * 32))[0]
+    except (OSError, ArtifactError, struct.error):
+        return None
+
+
+def open_artifact(file_path: str) -> Artifact:
+    """Memory-maps an artifact file read-only."""
+    with open(file_path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    version, sections = _read_header(buffer)
+    return Artifact(path=file_path, version=version, buffer=buffer, sections=sections)
@@ -0,0 +1,92 @@
+"""
+Exact nearest-neighbour search in NumPy.
+
+The CTCAE vector store is small (790 x 384), so exact search is a single
+matrix product. NumpyFlatIndex implements the part of the FAISS index
+interface the loaders use (d, ntotal, metric_type, search, reconstruct_n)
+over an embedding matrix that can be memory-mapped from an .npy file, so a
+deployment can skip importing faiss and get deterministic results.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Same values as faiss.METRIC_INNER_PRODUCT and faiss.METRIC_L2
+METRIC_INNER_PRODUCT = 0
+METRIC_L2 = 1
+
+
+class NumpyFlatIndex:
+    """
+    Brute-force index over a float32 embedding matrix, returning distances and
+    ids in the same layout as faiss.IndexFlat.search (squared L2 distances
+    ascending, or inner products descending; -1 pads missing results).
+    """
+    def __init__(self, embeddings: np.ndarray, metric_type: int = METRIC_L2):
+        if metric_type not in (METRIC_L2, METRIC_INNER_PRODUCT):
+            raise ValueError(f"Unsupported metric type {metric_type}")
+        self.embeddings = np.asarray(embeddings, dtype='float32')
+        if self.embeddings.ndim != 2:
+            raise ValueError(f"Expected a 2-D embedding matrix, got shape {self.embeddings.shape}")
+        self.metric_type = metric_type
+        # Squared norms are precomputed so L2 search is one matrix product
+        self._norms = np.einsum('ij,ij->i', self.embeddings, self.embeddings)
+
+    @classmethod
+    def from_npy(cls, file_path: str, metric_type: int = METRIC_L2, mmap: bool = True) -> "NumpyFlatIndex":
+        """Loads the embedding matrix from an .npy file, memory-mapped by default."""
+        return cls(np.load(file_path, mmap_mode='r' if mmap else None), metric_type)
+
+    @property
+    def d(self) -> int:
+        return self.embeddings.shape[1]
+
+    @property
+    def ntotal(self) -> int:
+        return self.embeddings.shape[0]
+
+    def search(self, queries: np.ndarray, k: int, ids: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Searches every vector, or only the rows in ids (sorted ascending, like a FAISS
+        IDSelector); returned ids are always row numbers of the full matrix.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype='float32'))
+        if queries.shape[1] != self.d:
+            raise ValueError(f"Query dimension {queries.shape[1]} does not match index dimension {self.d}")
+        embeddings, norms = self.embeddings, self._norms
+        if ids is not None:
+            ids = np.asarray(ids, dtype='int64')
+            embeddings, norms = embeddings[ids], norms[ids]
+        total = len(embeddings)
+
+        scores = queries @ embeddings.T
+        if self.metric_type == METRIC_L2:
+            # ||q - x||^2 = ||q||^2 - 2 q.x + ||x||^2, clipped against rounding below zero
+            scores = np.einsum('ij,ij->i', queries, queries)[:, None] - 2 * scores + norms
+            np.maximum(scores, 0, out=scores)
+            order_by = scores
+        else:
+            order_by = -scores
+
+        n = min(k, total)
+        distances = np.full((len(queries), k), np.inf if self.metric_type == METRIC_L2 else -np.inf, dtype='float32')
+        indices = np.full((len(queries), k), -1, dtype='int64')
+        if n == 0:
+            return distances, indices
+
+        # Partial selection, then a stable sort of the candidates (ties by lower id, like FAISS)
+        candidates = np.argpartition(order_by, n - 1, axis=1)[:, :n] if n < total \
+            else np.broadcast_to(np.arange(total), (len(queries), total))
+        candidate_scores = np.take_along_axis(order_by, candidates, axis=1)
+        order = np.lexsort((candidates, candidate_scores), axis=1)
+        rows = np.take_along_axis(candidates, order, axis=1)
+        distances[:, :n] = np.take_along_axis(scores, rows, axis=1)
+        indices[:, :n] = rows if ids is None else ids[rows]
+        return distances, indices
+
+    def reconstruct(self, i: int) -> np.ndarray:
+        return np.array(self.embeddings[i])
+
+    def reconstruct_n(self, i0: int, n: int) -> np.ndarray:
+        return np.array(self.embeddings[i0:i0 + n])
@@ -0,0 +1,147 @@
+"""
+Multi-query vector retrieval.
+
+Each symptom is its own query: the queries are encoded in one batched call,
+searched in one batched FAISS call, and the ranked hits are merged
+round-robin with a per-symptom quota so every symptom gets coverage instead
+of sharing the results of one blended embedding.
+
+In hybrid mode each symptom's dense ranking is fused with its BM25 ranking by
+reciprocal rank fusion before the merge; without an embedding model (e.g.
+while it is still loading) the BM25 rankings are used on their own.
+
+Given a CategoryIndex, each symptom searches the CTCAE categories it is routed
+to first, in both the dense and the BM25 ranking. Given a DocumentSelector,
+each symptom's top SELECTION_CANDIDATES are re-ranked by MMR before the merge,
+dense-only rankings after the distance cutoff and adaptive k; the per-query
+SelectionStats are appended to the stats list passed in.
+"""
+
+import os
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from llm.selection import SELECTION_CANDIDATES
+
+# "hybrid" (BM25 + dense), "dense" or "lexical" (BM25 only, never loads the model)
+RETRIEVAL_MODE = os.environ.get("ONCOLIFE_RETRIEVAL_MODE", "hybrid").lower()
+# Rank offset of reciprocal rank fusion; 60 is the value from the original RRF paper
+RRF_K = 60
+# Candidates taken from each ranking before fusion
+HYBRID_CANDIDATES = 20
+
+
+def symptom_quota(k: int, symptom_count: int) -> int:
+    """Documents each symptom may contribute so that together they fill k (at least one each)."""
+    return max(1, math.ceil(k / max(1, symptom_count)))
+
+
+def merge_ranked_hits(indices: np.ndarray, quota: int) -> List[int]:
+    """
+    Merges per-query ranked document ids round-robin by rank, skipping duplicates
+    and ids below zero (FAISS padding), until each query has used its quota.
+    """
+    taken = [0] * len(indices)
+    merged = {}
+    for rank in range(indices.shape[1] if len(indices) else 0):
+        for query, row in enumerate(indices):
+            if taken[query] >= quota:
+                continue
+            document_id = int(row[rank])
+            if document_id < 0 or document_id in merged:
+                continue
+            merged[document_id] = None
+            taken[query] += 1
+    return list(merged)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = RRF_K) -> List[int]:
+    """
+    Fuses ranked id lists by summing 1 / (k + rank) per id; ties go to the lower id.
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, document_id in enumerate(ranking):
+            document_id = int(document_id)
+            if document_id >= 0:
+                scores[document_id] = scores.get(document_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda document_id: (-scores[document_id], document_id))
+
+
+def _pad_rankings(rankings: Sequence[Sequence[int]], width: int) -> np.ndarray:
+    matrix = np.full((len(rankings), width), -1, dtype='int64')
+    for row, ranking in enumerate(rankings):
+        ranking = list(ranking)[:width]
+        matrix[row, :len(ranking)] = ranking
+    return matrix
+
+
+def _dense_search(index: Any, embeddings: np.ndarray, k: int, symptoms: Sequence[str],
+                  categories: Optional[Any]) -> Tuple[np.ndarray, np.ndarray]:
+    if categories is None:
+        return index.search(embeddings, k)
+    return categories.search(index, embeddings, k, symptoms)
+
+
+def _select(selector: Any, index: Any, embeddings: np.ndarray, rankings: np.ndarray, quota: int,
+            symptoms: Sequence[str], stats: Optional[List[Any]], cutoff: bool = True) -> List[int]:
+    selected, query_stats = selector.select(index, embeddings, rankings, quota, symptoms, cutoff)
+    if stats is not None:
+        stats.extend(query_stats)
+    return merge_ranked_hits(_pad_rankings(selected, rankings.shape[1]), quota)
+
+
+def search_hybrid_per_symptom(
+    model: Optional[Any],
+    index: Any,
+    lexical_index: Any,
+    symptoms: Sequence[str],
+    k: int = 5,
+    candidates: int = HYBRID_CANDIDATES,
+    categories: Optional[Any] = None,
+    selector: Optional[Any] = None,
+    stats: Optional[List[Any]] = None,
+) -> List[int]:
+    """
+    Returns document ids for the symptoms: per symptom, the BM25 ranking fused with
+    the dense ranking (one batched encode and search) by reciprocal rank fusion,
+    merged with a per-symptom quota. With no model the BM25 rankings are used alone.
+    """
+    if not symptoms:
+        return []
+    depth = max(k, candidates)
+    if categories is None:
+        lexical = lexical_index.search_many(symptoms, depth)
+    else:
+        lexical = [categories.lexical_search(lexical_index, symptom, depth) for symptom in symptoms]
+    rankings = [[document_id for document_id, _ in hits] for hits in lexical]
+    quota = symptom_quota(k, len(symptoms))
+    if model is not None and index is not None:
+        embeddings = np.asarray(model.encode(list(symptoms)), dtype='float32')
+        _, dense = _dense_search(index, embeddings, depth, symptoms, categories)
+        rankings = [reciprocal_rank_fusion([lexical, dense_ranking]) for lexical, dense_ranking in zip(rankings, dense)]
+        if selector is not None:
+            # The fused ranking is not ordered by embedding distance, so only MMR applies
+            return _select(selector, index, embeddings, _pad_rankings(rankings, depth), quota, symptoms, stats,
+                           cutoff=False)
+    return merge_ranked_hits(_pad_rankings(rankings, depth), quota)
+
+
+def search_per_symptom(model: Any, index: Any, symptoms: Sequence[str], k: int = 5,
+                       categories: Optional[Any] = None, selector: Optional[Any] = None,
+                       stats: Optional[List[Any]] = None) -> List[int]:
+    """
+    Returns document ids for the symptoms: one batched encode, one batched search
+    with k candidates per symptom, merged with a per-symptom quota.
+    """
+    if not symptoms:
+        return []
+    quota = symptom_quota(k, len(symptoms))
+    embeddings = np.asarray(model.encode(list(symptoms)), dtype='float32')
+    if selector is not None:
+        _, indices = _dense_search(index, embeddings, max(k, SELECTION_CANDIDATES), symptoms, categories)
+        return _select(selector, index, embeddings, indices, quota, symptoms, stats)
+    _, indices = _dense_search(index, embeddings, k, symptoms, categories)
+    return merge_ranked_hits(indices, quota)
@@ -0,0 +1,72 @@
+"""
+On-disk cache of text extracted from PDF and DOCX inputs.
+
+Extraction results are stored in a sidecar directory and keyed by the SHA-256
+of the source file plus the extractor version, so cold starts skip extraction
+and a document is only re-extracted when its bytes or the extractor change.
+"""
+
+import os
+import hashlib
+import tempfile
+from typing import Callable, Optional
+
+TEXT_CACHE_DIRNAME = ".text_cache"
+
+# Overrides the sidecar location, e.g. to point at a persistent volume
+TEXT_CACHE_DIR = os.environ.get("ONCOLIFE_TEXT_CACHE_DIR")
+
+
+def file_sha256(file_path: str) -> str:
+    """Returns the hex SHA-256 digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_dir_for(file_path: str) -> str:
+    """Returns the cache directory used for a source file."""
+    if TEXT_CACHE_DIR:
+        return TEXT_CACHE_DIR
+    return os.path.join(os.path.dirname(os.path.abspath(file_path)), TEXT_CACHE_DIRNAME)
+
+
+def cached_extract(
+    file_path: str,
+    extractor: Callable[[str], str],
+    extractor_version: str,
+    cache_dir: Optional[str] = None,
+) -> str:
+    """
+    Returns the extracted text of a file, running the extractor only on a cache miss.
+
+    Args:
+        file_path: The source document.
+        extractor: Function that extracts text from the source document.
+        extractor_version: Identifies the extractor; changing it invalidates old entries.
+        cache_dir: Overrides the cache directory.
+    """
+    cache_dir = cache_dir or cache_dir_for(file_path)
+    cache_path = os.path.join(cache_dir, f"{file_sha256(file_path)}-{extractor_version}.txt")
+
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+
+    text = extractor(file_path)
+
+    # Write atomically so concurrent workers never read a partial entry
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Warning: Could not write text cache for {os.path.basename(file_path)}: {e}")
+
+    return text
@@ -59,6 +59,7 @@ def test_chat_endpoint(payload: dict):
             "message_type": response['message_type'],
             "options": response['options'],
             "state": response['state'],
+            "kb_version": response['kb_version'],
             "chat_uuid": chat_uuid
         }
         
@@ -83,12 +84,17 @@ def initialize_models():
     try:
         import sys
         sys.path.insert(0, "/app")
-        from llm.context import ContextLoader
+        from llm.knowledge_base import get_knowledge_base
+        from test_chat_logic import MODEL_INPUTS_PATH
         
-        # Initialize context loader
-        context_loader = ContextLoader("model_inputs")
+        # Warm the process-wide knowledge base snapshot shared by every chat
+        knowledge_base = get_knowledge_base(MODEL_INPUTS_PATH)
         
-        return {"status": "Models initialized successfully"}
+        return {
+            "status": "Models initialized successfully",
+            "documents_loaded": len(knowledge_base.documents),
+            "kb_version": knowledge_base.version
+        }
         
     except Exception as e:
         return {"error": f"Error initializing models: {str(e)}"}
@@ -1,4 +1,5 @@
 import json
+import os
 import uuid
 from typing import Dict, Any, List, Tuple, AsyncGenerator, Generator
 from datetime import datetime
@@ -7,6 +8,9 @@ from constants import ConversationState
 from llm.gpt import GPT4oProvider
 from llm.context import ContextLoader
 
+# Shared with services.py through the process-wide knowledge base snapshot
+MODEL_INPUTS_PATH = os.path.join(os.path.dirname(__file__), "model_inputs")
+
 # Mock database models for Modal deployment
 class ChatModel:
     def __init__(self, **kwargs):
@@ -34,7 +38,7 @@ class ModalConversationService:
     def __init__(self):
         self.conversations = {}  # In-memory conversation storage
         self.llm_provider = GPT4oProvider()
-        self.context_loader = ContextLoader("model_inputs")
+        self.context_loader = ContextLoader(MODEL_INPUTS_PATH)
     
     def _get_or_create_conversation(self, chat_uuid: str) -> ChatModel:
         """Get existing conversation or create a new one."""
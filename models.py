@@ -27,6 +27,7 @@ class Message(BaseModel):
     content: str
     structured_data: Optional[Dict[str, Any]] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    kb_version: Optional[str] = None  # Knowledge base snapshot used to generate the message
 
     class Config:
         from_attributes = True
@@ -120,6 +121,9 @@ class WebSocketMessageOut(BaseModel):
     message_type: str
     content: str
     options: Optional[List[str]] = []
+    kb_version: Optional[str] = None
+    # Per-symptom attributes extracted this turn, stored on the assistant message
+    data_attributes: Optional[Dict[str, Any]] = None
 
 class ConnectionEstablished(BaseModel):
     """Message sent to the client upon successful WebSocket connection."""
@@ -1,5 +1,6 @@
 import json
 import os
+import asyncio
 from uuid import UUID
 from typing import Dict, Any, List, Tuple, AsyncGenerator, Generator
 from sqlalchemy.orm import Session
@@ -39,9 +40,16 @@ from llm.gpt import GPT4oProvider
 from llm.groq import GroqProvider
 from llm.cerebras import CerebrasProvider
 from llm.context import ContextLoader
+from llm.context_pool import run_in_context_pool
+from llm.prompt_builder import build_user_prompt
+from llm.context_bundles import SYMPTOM_SELECTION_OPTIONS
+from llm.alert_rules import collect_attributes, format_triggered_alerts
 
 LLM_PROVIDER = "gpt4o"  # Options: "gpt4o", "groq", "cerebras"
 
+# The knowledge base is loaded once per process from this directory and shared by every turn
+MODEL_INPUTS_PATH = os.path.join(os.path.dirname(__file__), 'model_inputs')
+
 def get_llm_provider():
     """Factory function to get the configured LLM provider."""
     if LLM_PROVIDER == "gpt4o":
@@ -102,11 +110,14 @@ class ConversationService:
 
     def _determine_next_state_and_response(self, chat: ChatModel, message: WebSocketMessageIn) -> Tuple[str, WebSocketMessageOut]:
         """The main state machine for the conversation."""
+        # Pin the knowledge base snapshot for this turn; a live reload only affects later turns
+        context_loader = ContextLoader(MODEL_INPUTS_PATH)
         current_state = chat.conversation_state
         next_state = current_state
         response_content = "I'm not sure how to respond to that. Can you try again?"
         response_options = []
         response_type = "text"
+        response_attributes = None
 
         if current_state == ConversationState.COMPLETED:
             response_content = "This conversation has ended. Please start a new one if you need assistance."
@@ -115,29 +126,43 @@ class ConversationService:
             next_state = ConversationState.SYMPTOM_SELECTION_SENT
             response_content = "Thank you. What symptoms are you experiencing? You can select multiple."
             response_type = "multi_select"
-            response_options = [
-                "Fever", "Nausea", "Vomiting", "Diarrhea", "Constipation", "Fatigue",
-                "Headache", "Mouth Sores", "Rash", "Shortness of Breath", "Other"
-            ]
+            # Each option has a CTCAE context bundle (see llm/context_bundles.py)
+            response_options = list(SYMPTOM_SELECTION_OPTIONS)
 
         elif current_state == ConversationState.SYMPTOM_SELECTION_SENT:
             next_state = ConversationState.FOLLOWUP_QUESTIONS
             symptoms = [s.strip() for s in message.content.split(',')]
-            chat.symptom_list = list(set((chat.symptom_list or []) + symptoms)) # Append unique symptoms
+            chat.symptom_list = context_loader.merge_symptoms(chat.symptom_list, symptoms) # Append unique canonical symptoms
             self.db.commit()
             
             context = {"patient_state": {"current_symptoms": chat.symptom_list}}
-            response_content = self._query_knowledge_base(context)
+            response_content = self._query_knowledge_base(context, context_loader)
 
         elif current_state == ConversationState.FOLLOWUP_QUESTIONS:
-            chat_history = self.db.query(MessageModel).filter(MessageModel.chat_uuid == chat.uuid).order_by(MessageModel.id.desc()).limit(20).all()
+            chat_history = self.db.query(MessageModel).filter(MessageModel.chat_uuid == chat.uuid).order_by(MessageModel.id.asc()).all()
+            all_messages = [Message.from_orm(m).model_dump(mode='json') for m in chat_history]
+            history_for_llm = all_messages[-20:]
+            # Structured attributes collected on earlier turns, per symptom, feed the alert rules
+            data_attributes = collect_attributes(all_messages)
             context = {
                 "patient_state": {"current_symptoms": chat.symptom_list},
                 "latest_input": message.content,
-                "history": [Message.from_orm(m).model_dump(mode='json') for m in reversed(chat_history)]
+                "history": history_for_llm,
+                "data_attributes": data_attributes
             }
             
-            llm_response = self._query_knowledge_base(context)
+            llm_response = self._query_knowledge_base(context, context_loader)
+
+            # File this turn's attributes under their symptoms and apply the red-flag overrides deterministically
+            llm_json = self._extract_json_from_response(llm_response) or {}
+            response_attributes, alert_overrides = context_loader.record_attributes(
+                llm_json.get("data_attributes"), chat.symptom_list or [], history_for_llm, data_attributes
+            )
+            if alert_overrides:
+                print(f"🚨 Alert overrides: {alert_overrides}")
+                chat.severity_list = context_loader.apply_severity_overrides(
+                    getattr(chat, 'severity_list', None), alert_overrides
+                )
 
             if "DONE" in llm_response:
                 response_content = "DONE"
@@ -156,6 +181,8 @@ class ConversationService:
             message_type=response_type,
             content=response_content,
             options=response_options,
+            kb_version=context_loader.knowledge_base.version,
+            data_attributes=response_attributes or None,
         )
         return next_state, assistant_response
 
@@ -302,7 +329,9 @@ class ConversationService:
              sender="assistant",
              message_type=assistant_response_details.message_type,
              content=assistant_response_details.content,
-             structured_data={"options": assistant_response_details.options} if assistant_response_details.options else None
+             structured_data=self._structured_data(
+                 assistant_response_details.options, assistant_response_details.data_attributes
+             )
         )
         
         # 4. Add all new objects to the session and commit once
@@ -363,17 +392,28 @@ class ConversationService:
         # 2. Get the full conversation history to send to the LLM
         chat_history = self.db.query(MessageModel).filter(MessageModel.chat_uuid == chat.uuid).order_by(MessageModel.id.asc()).all()
         history_for_llm = [Message.from_orm(m).model_dump(mode='json') for m in chat_history]
+        # Structured attributes collected on earlier turns, per symptom, feed the alert rules
+        data_attributes = collect_attributes(history_for_llm)
         
         context = {
+            "patient_state": {"current_symptoms": chat.symptom_list or []},
             "latest_input": message.content,
-            "history": history_for_llm
+            "history": history_for_llm,
+            "data_attributes": data_attributes
         }
 
         # 3. Stream the LLM response and build the full JSON string
-        llm_response_generator = self._query_knowledge_base_stream(context)
-        full_response_text = ""
-        for chunk_content in llm_response_generator:
-            full_response_text += chunk_content
+        # Retrieval and prompt assembly run in the bounded context pool and the blocking LLM
+        # client in a thread, so a slow turn never stalls the other connections on this loop.
+        # Pin the knowledge base snapshot for this turn; a live reload only affects later turns
+        context_loader = await run_in_context_pool(ContextLoader, MODEL_INPUTS_PATH)
+        print(f"KB_REAL: Streaming {LLM_PROVIDER.upper()} with real context (kb version {context_loader.knowledge_base.version})...")
+        llm_provider, system_prompt, user_prompt = await run_in_context_pool(
+            self._build_llm_prompts, context, context_loader
+        )
+        full_response_text = await asyncio.to_thread(
+            lambda: "".join(llm_provider.query(system_prompt=system_prompt, user_prompt=user_prompt))
+        )
         
         # 4. Parse the complete JSON response
         llm_json = self._extract_json_from_response(full_response_text)
@@ -393,7 +433,18 @@ class ConversationService:
 
         # Update chat with any newly identified symptoms
         if new_symptoms:
-            chat.symptom_list = list(set((chat.symptom_list or []) + new_symptoms))
+            chat.symptom_list = context_loader.merge_symptoms(chat.symptom_list, new_symptoms)
+            self.db.commit()
+
+        # File this turn's attributes under their symptoms and apply the red-flag overrides deterministically
+        new_attributes, alert_overrides = context_loader.record_attributes(
+            llm_json.get("data_attributes"), chat.symptom_list or [], history_for_llm, data_attributes
+        )
+        if alert_overrides:
+            print(f"🚨 Alert overrides: {alert_overrides}")
+            chat.severity_list = context_loader.apply_severity_overrides(
+                getattr(chat, 'severity_list', None), alert_overrides
+            )
             self.db.commit()
 
         # If the user is responding with their feeling, save it to the chat
@@ -440,7 +491,7 @@ class ConversationService:
             sender="assistant",
             message_type=db_message_type,
             content=content,
-            structured_data={"options": options} if options else None
+            structured_data=self._structured_data(options, new_attributes)
         )
         self.db.add(assistant_msg)
         self.db.commit()
@@ -449,6 +500,7 @@ class ConversationService:
         # Create the frontend message with the original response type
         frontend_message = Message.from_orm(assistant_msg)
         frontend_message.message_type = response_type if response_type != 'summary' else 'text'
+        frontend_message.kb_version = context_loader.knowledge_base.version
         
         yield frontend_message
 
@@ -456,8 +508,10 @@ class ConversationService:
         if response_type in ["summary", "end"]:
             summary_data = llm_json.get("summary_data", {})
             
-            chat.symptom_list = summary_data.get("symptom_list", chat.symptom_list)
-            chat.severity_list = summary_data.get("severity_list", chat.severity_list)
+            chat.symptom_list = context_loader.merge_symptoms(summary_data.get("symptom_list", chat.symptom_list), [])
+            chat.severity_list = context_loader.apply_severity_overrides(
+                summary_data.get("severity_list", getattr(chat, 'severity_list', None)), alert_overrides
+            )
             chat.longer_summary = summary_data.get("longer_summary", chat.longer_summary)
             chat.medication_list = summary_data.get("medication_list", chat.medication_list)
             chat.bulleted_summary = summary_data.get("bulleted_summary", chat.bulleted_summary)
@@ -470,6 +524,15 @@ class ConversationService:
 
             self.db.commit()
 
+    def _structured_data(self, options: List[str] = None, data_attributes: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Builds an assistant message's structured data from its options and extracted attributes."""
+        structured_data = {}
+        if options:
+            structured_data["options"] = options
+        if data_attributes:
+            structured_data["data_attributes"] = data_attributes
+        return structured_data or None
+
     def get_connection_ack(self, chat_uuid: UUID) -> ConnectionEstablished:
         """Acknowledges a WebSocket connection with the current chat state."""
         # This message is for backend confirmation, not for display in the UI.
@@ -481,43 +544,47 @@ class ConversationService:
         return ConnectionEstablished(
             content="Connection acknowledged.",
             chat_state={
-                "conversation_state": chat.conversation_state
+                "conversation_state": chat.conversation_state,
+                "kb_version": ContextLoader(MODEL_INPUTS_PATH).knowledge_base.version
             }
         )
         
-    def _query_knowledge_base(self, context: Dict[str, Any]) -> str:
+    def _build_llm_prompts(self, context: Dict[str, Any], context_loader: ContextLoader) -> Tuple[Any, str, str]:
         """
-        Queries the configured LLM model with the provided context and document knowledge base.
+        Retrieves the knowledge base context for the turn and returns the LLM provider with the
+        system and user prompts. Blocking: async callers run it in the context pool.
         """
-        print(f"KB_REAL: Querying {LLM_PROVIDER.upper()} with real context...")
-        
-        # 1. Load the knowledge base context from files
-        model_inputs_path = os.path.join(os.path.dirname(__file__), '..', '..', 'model_inputs')
-        context_loader = ContextLoader(model_inputs_path)
-        
+        # 1. Load the knowledge base context from the shared snapshot
         system_prompt = context_loader.load_system_prompt()
         
         # Get patient symptoms from the context, default to an empty list
         patient_symptoms = context.get('patient_state', {}).get('current_symptoms', [])
         knowledge_base_context = context_loader.load_context(symptoms=patient_symptoms)
+        data_attributes = context.get('data_attributes', {})
+        triggered_alerts = context_loader.evaluate_alerts(patient_symptoms, data_attributes)
+        pending_questions = context_loader.pending_questions_prompt(
+            patient_symptoms, context.get('history', []), data_attributes, triggered_alerts
+        )
 
-        # 2. Construct the user prompt for the LLM
+        # 2. Construct the user prompt for the LLM within the provider model's token budget
         # We combine the general knowledge base with the specific conversation context
-        user_prompt_parts = [
-            "### Knowledge Base Context ###",
-            knowledge_base_context,
-            "\n### Conversation Context ###",
-            f"Current Symptoms: {context.get('patient_state', {}).get('current_symptoms', [])}",
-            f"Chat History (most recent messages): {json.dumps(context.get('history', []), indent=2)}",
-            f"\n### User's Latest Message ###",
-            f"User: \"{context.get('latest_input', '')}\"",
-            "\n### Instructions ###",
-            "Follow the conversation workflow defined in your system instructions. Remember to respond with valid JSON only."
-        ]
-        user_prompt = "\n".join(user_prompt_parts)
+        llm_provider = get_llm_provider()
+        user_prompt = build_user_prompt(
+            knowledge_base_context, context, llm_provider.model, pending_questions,
+            format_triggered_alerts(triggered_alerts), context_loader.alert_attributes_prompt(patient_symptoms),
+        ).text
+
+        return llm_provider, system_prompt, user_prompt
+
+    def _query_knowledge_base(self, context: Dict[str, Any], context_loader: ContextLoader = None) -> str:
+        """
+        Queries the configured LLM model with the provided context and document knowledge base.
+        """
+        context_loader = context_loader or ContextLoader(MODEL_INPUTS_PATH)
+        print(f"KB_REAL: Querying {LLM_PROVIDER.upper()} with real context (kb version {context_loader.knowledge_base.version})...")
+        llm_provider, system_prompt, user_prompt = self._build_llm_prompts(context, context_loader)
 
         # 3. Call the LLM provider
-        llm_provider = get_llm_provider()
         response_generator = llm_provider.query(
             system_prompt=system_prompt,
             user_prompt=user_prompt
@@ -529,40 +596,16 @@ class ConversationService:
         print(f"KB_REAL: Received response from {LLM_PROVIDER.upper()}: '{full_response}'")
         return full_response if full_response else "I'm not sure what to ask next. Can you tell me more?"
 
-    def _query_knowledge_base_stream(self, context: Dict[str, Any]) -> Generator[str, None, None]:
+    def _query_knowledge_base_stream(self, context: Dict[str, Any], context_loader: ContextLoader = None) -> Generator[str, None, None]:
         """
         Queries the configured LLM model with the provided context and document knowledge base.
         Yields chunks of the response as they become available.
         """
-        print(f"KB_REAL: Streaming {LLM_PROVIDER.upper()} with real context...")
-        
-        # 1. Load the knowledge base context from files
-        model_inputs_path = os.path.join(os.path.dirname(__file__), '..', '..', 'model_inputs')
-        context_loader = ContextLoader(model_inputs_path)
-        
-        system_prompt = context_loader.load_system_prompt()
-        
-        # Get patient symptoms from the context, default to an empty list
-        patient_symptoms = context.get('patient_state', {}).get('current_symptoms', [])
-        knowledge_base_context = context_loader.load_context(symptoms=patient_symptoms)
-
-        # 2. Construct the user prompt for the LLM
-        # We combine the general knowledge base with the specific conversation context
-        user_prompt_parts = [
-            "### Knowledge Base Context ###",
-            knowledge_base_context,
-            "\n### Conversation Context ###",
-            f"Current Symptoms: {context.get('patient_state', {}).get('current_symptoms', [])}",
-            f"Chat History (most recent messages): {json.dumps(context.get('history', []), indent=2)}",
-            f"\n### User's Latest Message ###",
-            f"User: \"{context.get('latest_input', '')}\"",
-            "\n### Instructions ###",
-            "Follow the conversation workflow defined in your system instructions. Remember to respond with valid JSON only."
-        ]
-        user_prompt = "\n".join(user_prompt_parts)
+        context_loader = context_loader or ContextLoader(MODEL_INPUTS_PATH)
+        print(f"KB_REAL: Streaming {LLM_PROVIDER.upper()} with real context (kb version {context_loader.knowledge_base.version})...")
+        llm_provider, system_prompt, user_prompt = self._build_llm_prompts(context, context_loader)
 
         # 3. Call the LLM provider
-        llm_provider = get_llm_provider()
         response_generator = llm_provider.query(
             system_prompt=system_prompt,
             user_prompt=user_prompt
@@ -0,0 +1,135 @@
+"""
+Checks that the alert rules can fire from what the chat collects: every attribute a
+rule reads is either asked by a question of its symptom or listed for the LLM to
+report, and each symptom's rules only read that symptom's answers. Also covers the
+expression parser, value coercion and how overrides land on the severity list.
+"""
+
+import os
+import re
+
+import pytest
+
+from llm.alert_rules import (
+    AlertEngine, AlertRuleError, apply_overrides, collect_attributes, compile_expression, compile_rule,
+)
+from llm.context import ContextLoader
+from llm.question_bank import GENERAL_SCOPE
+
+MODEL_INPUTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_inputs")
+
+
+@pytest.fixture(scope="module")
+def loader():
+    return ContextLoader(MODEL_INPUTS)
+
+
+def test_every_rule_attribute_can_be_reported(loader):
+    engine = loader.knowledge_base.alert_engine
+    missing = {}
+    for rule in engine.rules:
+        questions = loader.pending_questions_prompt([rule.symptom], [], {}, [rule])
+        asked = set(re.findall(r"\((\w+)\)", questions))
+        listed = set()
+        for line in loader.alert_attributes_prompt([rule.symptom]).splitlines():
+            symptom, _, names = line[2:].partition(": ")
+            if symptom == rule.symptom:
+                listed.update(names.split(", "))
+        unreachable = rule.attributes - asked - listed
+        if unreachable:
+            missing[rule.id] = sorted(unreachable)
+    assert not missing
+
+
+def test_symptom_rules_read_only_their_symptom(loader):
+    attributes = {
+        "diarrhea": {"diarrhea_rating": "mild", "days_in_a_row": 5},
+        "fatigue": {"fatigue_rating": "moderate"},
+    }
+    assert loader.knowledge_base.alert_engine.override_grades(attributes, ["diarrhea", "fatigue"]) == {}
+
+    attributes["fatigue"]["days_in_a_row"] = 3
+    assert loader.knowledge_base.alert_engine.override_grades(attributes, ["diarrhea", "fatigue"]) == {"fatigue": 3}
+
+
+def test_red_flag_rules_read_every_symptom(loader):
+    triggered = loader.evaluate_alerts(["pain"], {"pain": {"chest_pain": True}})
+    assert {"ALERT_CHEST_PAIN", "ALERT_PAIN_CHEST"} <= {rule.id for rule in triggered}
+
+
+@pytest.mark.parametrize("expression", [
+    "diarrhea.rating > 1",        # attribute access
+    "days_in_a_row.__class__",
+    "f(days_in_a_row)",           # calls
+    "__import__('os')",
+    "days_in_a_row = 3",          # assignment
+    "days_in_a_row > other_name",  # comparisons are against literals only
+    "days_in_a_row >",
+    "rating in ['mild', 'severe'",
+    "",
+])
+def test_unsafe_or_malformed_expressions_are_rejected(expression):
+    with pytest.raises(AlertRuleError):
+        compile_expression(expression)
+
+
+def test_unknown_attributes_never_trigger():
+    predicate, attributes = compile_expression("not_collected_yet >= 3 or not_collected_flag")
+    assert attributes == {"not_collected_yet", "not_collected_flag"}
+    assert not predicate({})
+    assert not predicate({"not_collected_yet": None})
+
+
+def test_string_attribute_values_are_coerced_to_the_literal_type():
+    predicate, _ = compile_expression("temperature >= 100.4 and chills")
+    assert predicate({"temperature": "101.2°F", "chills": "Yes"})
+    assert not predicate({"temperature": "99", "chills": "yes"})
+    assert not predicate({"temperature": "hot", "chills": True})
+
+    predicate, _ = compile_expression("rating in ['severe', 'very severe']")
+    assert predicate({"rating": " Severe "})
+    assert predicate({"rating": ["mild", "very severe"]})
+    assert not predicate({"rating": "mild"})
+
+
+def test_override_grades_keep_the_highest_grade_per_symptom():
+    engine = AlertEngine([
+        compile_rule("LOW", "fatigue", "days_in_a_row >= 3", 2, ""),
+        compile_rule("HIGH", "fatigue", "days_in_a_row >= 5", 3, ""),
+    ])
+    assert engine.override_grades({"fatigue": {"days_in_a_row": "4"}}) == {"fatigue": 2}
+    assert engine.override_grades({"fatigue": {"days_in_a_row": 6}}) == {"fatigue": 3}
+    assert engine.override_grades({"fatigue": {"days_in_a_row": 6}}, ["diarrhea"]) == {}
+
+
+def test_apply_overrides_only_raises_grades():
+    assert apply_overrides({"fatigue": 3, "nausea": 1}, {"fatigue": 2, "nausea": 2}) == {"fatigue": 3, "nausea": 2}
+    assert apply_overrides({"fatigue": "unknown"}, {"fatigue": 2}) == {"fatigue": 2}
+    assert apply_overrides(None, {"fever": 3}) == {"fever": 3}
+
+
+def test_override_keys_reconcile_with_llm_severity_spellings(loader):
+    severity_list = {"Vomiting": 1, "Nausea": 2, "vomiting": 2}
+    assert loader.apply_severity_overrides(severity_list, {"vomiting": 3}) == {"vomiting": 3, "nausea": 2}
+    assert loader.apply_severity_overrides({"Vomiting": 1, "vomiting": 2}, {}) == {"vomiting": 2}
+
+
+def test_scope_attributes_files_flat_values_under_their_symptom(loader):
+    # Nested entries keep their symptom; a flat value asked by several symptoms goes to the one being assessed
+    assert loader.scope_attributes({"fatigue": {"fatigue_rating": "mild"}}, ["fatigue", "diarrhea"]) == {
+        "fatigue": {"fatigue_rating": "mild"}
+    }
+    assert loader.scope_attributes({"days_in_a_row": 3}, ["diarrhea", "fatigue"]) == {"diarrhea": {"days_in_a_row": 3}}
+    assert loader.scope_attributes({"days_in_a_row": 3}, ["fatigue", "diarrhea"]) == {"fatigue": {"days_in_a_row": 3}}
+    assert loader.scope_attributes({"days_in_a_row": 3}, []) == {GENERAL_SCOPE: {"days_in_a_row": 3}}
+
+
+def test_record_attributes_merges_in_place_and_returns_overrides(loader):
+    history = [{"sender": "assistant", "structured_data": {"data_attributes": {"fatigue": {"fatigue_rating": "moderate"}}}}]
+    attributes = collect_attributes(history)
+    new_attributes, overrides = loader.record_attributes({"days_in_a_row": 3}, ["fatigue"], history, attributes)
+    assert new_attributes == {"fatigue": {"days_in_a_row": 3}}
+    assert attributes == {"fatigue": {"fatigue_rating": "moderate", "days_in_a_row": 3}}
+    assert overrides == {"fatigue": 3}
+
+    assert loader.record_attributes("not a dict", ["fatigue"], history, attributes)[0] == {}
@@ -3,18 +3,24 @@ from typing import Dict, Any, Tuple
 from constants import ConversationState
 from llm.gpt import GPT4oProvider
 from llm.context import ContextLoader
+from llm.prompt_builder import build_user_prompt
+from llm.context_bundles import SYMPTOM_SELECTION_OPTIONS
+from llm.alert_rules import collect_attributes, format_triggered_alerts
 from models import WebSocketMessageIn, WebSocketMessageOut
 from datetime import datetime
 import json
 import os
 
+# Shared with services.py through the process-wide knowledge base snapshot
+MODEL_INPUTS_PATH = os.path.join(os.path.dirname(__file__), "model_inputs")
+
 class TestChatLogic:
     """Exact same conversation logic as patient-portal/develop, but without database dependencies."""
     
     def __init__(self):
         self.conversations = {}  # In-memory conversation storage
         self.llm_provider = GPT4oProvider()
-        self.context_loader = ContextLoader("model_inputs")
+        self.context_loader = ContextLoader(MODEL_INPUTS_PATH)
     
     def _get_or_create_conversation(self, chat_uuid: str) -> Dict[str, Any]:
         """Get existing conversation or create a new one."""
@@ -22,17 +28,19 @@ class TestChatLogic:
             self.conversations[chat_uuid] = {
                 'state': ConversationState.CHEMO_CHECK_SENT,
                 'messages': [],
-                'symptom_list': []
+                'symptom_list': [],
+                'severity_list': {}
             }
         return self.conversations[chat_uuid]
     
-    def _determine_next_state_and_response(self, conversation: Dict[str, Any], message: str) -> Tuple[str, str, str, list]:
+    def _determine_next_state_and_response(self, conversation: Dict[str, Any], message: str) -> Tuple[str, str, str, list, Dict[str, Any]]:
         """The EXACT same state machine as patient-portal/develop."""
         current_state = conversation['state']
         next_state = current_state
         response_content = "I'm not sure how to respond to that. Can you try again?"
         response_options = []
         response_type = "text"
+        response_attributes = None
 
         if current_state == ConversationState.COMPLETED:
             response_content = "This conversation has ended. Please start a new one if you need assistance."
@@ -42,17 +50,15 @@ class TestChatLogic:
             next_state = ConversationState.SYMPTOM_SELECTION_SENT
             response_content = "Thank you. What symptoms are you experiencing? You can select multiple."
             response_type = "multi_select"
-            response_options = [
-                "Fever", "Nausea", "Vomiting", "Diarrhea", "Constipation", "Fatigue",
-                "Headache", "Mouth Sores", "Rash", "Shortness of Breath", "Other"
-            ]
+            # Each option has a CTCAE context bundle (see llm/context_bundles.py)
+            response_options = list(SYMPTOM_SELECTION_OPTIONS)
 
         elif current_state == ConversationState.SYMPTOM_SELECTION_SENT:
             # EXACT same logic as patient-portal
             next_state = ConversationState.FOLLOWUP_QUESTIONS
             symptoms = [s.strip() for s in message.split(',')]
             current_symptoms = conversation['symptom_list'] or []
-            conversation['symptom_list'] = list(set(current_symptoms + symptoms))
+            conversation['symptom_list'] = self.context_loader.merge_symptoms(current_symptoms, symptoms)
             
             context = {"patient_state": {"current_symptoms": conversation['symptom_list']}}
             response_content = self._query_knowledge_base(context)
@@ -61,16 +67,33 @@ class TestChatLogic:
             # EXACT same logic as patient-portal
             # Get conversation history (last 20 messages)
             recent_messages = conversation['messages'][-20:] if len(conversation['messages']) > 20 else conversation['messages']
-            history_for_llm = [{"sender": msg['sender'], "content": msg['content']} for msg in recent_messages]
+            history_for_llm = [
+                {"sender": msg['sender'], "content": msg['content'], "structured_data": msg.get('structured_data')}
+                for msg in recent_messages
+            ]
+            # Structured attributes collected on earlier turns, per symptom, feed the alert rules
+            data_attributes = collect_attributes(conversation['messages'])
             
             context = {
                 "patient_state": {"current_symptoms": conversation['symptom_list']},
                 "latest_input": message,
-                "history": history_for_llm
+                "history": history_for_llm,
+                "data_attributes": data_attributes
             }
             
             llm_response = self._query_knowledge_base(context)
 
+            # File this turn's attributes under their symptoms and apply the red-flag overrides deterministically
+            llm_json = self._extract_json_from_response(llm_response) or {}
+            response_attributes, alert_overrides = self.context_loader.record_attributes(
+                llm_json.get("data_attributes"), conversation['symptom_list'], history_for_llm, data_attributes
+            )
+            if alert_overrides:
+                print(f"🚨 Alert overrides: {alert_overrides}")
+                conversation['severity_list'] = self.context_loader.apply_severity_overrides(
+                    conversation['severity_list'], alert_overrides
+                )
+
             if "DONE" in llm_response:
                 response_content = "DONE"
             else:
@@ -86,11 +109,22 @@ class TestChatLogic:
         # Update conversation state
         conversation['state'] = next_state
         
-        return next_state, response_content, response_type, response_options
+        return next_state, response_content, response_type, response_options, response_attributes
+
+    def _extract_json_from_response(self, text: str) -> Dict[str, Any]:
+        """Extracts the JSON object from an LLM reply, or None if it has none."""
+        json_start, json_end = text.find('{'), text.rfind('}') + 1
+        if json_start == -1 or json_end == 0:
+            return None
+        try:
+            parsed_json = json.loads(text[json_start:json_end])
+        except json.JSONDecodeError:
+            return None
+        return parsed_json if isinstance(parsed_json, dict) else None
     
     def _query_knowledge_base(self, context: Dict[str, Any]) -> str:
         """EXACT same RAG logic as patient-portal/develop."""
-        print(f"KB_REAL: Querying GPT4o with real context...")
+        print(f"KB_REAL: Querying GPT4o with real context (kb version {self.context_loader.knowledge_base.version})...")
         
         # 1. Load the knowledge base context from files
         system_prompt = self.context_loader.load_system_prompt()
@@ -98,21 +132,18 @@ class TestChatLogic:
         # Get patient symptoms from the context, default to an empty list
         patient_symptoms = context.get('patient_state', {}).get('current_symptoms', [])
         knowledge_base_context = self.context_loader.load_context(symptoms=patient_symptoms)
+        data_attributes = context.get('data_attributes', {})
+        triggered_alerts = self.context_loader.evaluate_alerts(patient_symptoms, data_attributes)
+        pending_questions = self.context_loader.pending_questions_prompt(
+            patient_symptoms, context.get('history', []), data_attributes, triggered_alerts
+        )
 
-        # 2. Construct the user prompt for the LLM
+        # 2. Construct the user prompt for the LLM within the provider model's token budget
         # We combine the general knowledge base with the specific conversation context
-        user_prompt_parts = [
-            "### Knowledge Base Context ###",
-            knowledge_base_context,
-            "\n### Conversation Context ###",
-            f"Current Symptoms: {context.get('patient_state', {}).get('current_symptoms', [])}",
-            f"Chat History (most recent messages): {json.dumps(context.get('history', []), indent=2)}",
-            f"\n### User's Latest Message ###",
-            f"User: \"{context.get('latest_input', '')}\"",
-            "\n### Instructions ###",
-            "Follow the conversation workflow defined in your system instructions. Remember to respond with valid JSON only."
-        ]
-        user_prompt = "\n".join(user_prompt_parts)
+        user_prompt = build_user_prompt(
+            knowledge_base_context, context, self.llm_provider.model, pending_questions,
+            format_triggered_alerts(triggered_alerts), self.context_loader.alert_attributes_prompt(patient_symptoms),
+        ).text
 
         # 3. Call the LLM provider
         response_generator = self.llm_provider.query(
@@ -128,6 +159,9 @@ class TestChatLogic:
     
     def generate_reply(self, user_message: str, chat_uuid: str = "test-chat") -> Dict[str, Any]:
         """Generate a reply using the EXACT same logic as patient-portal/develop."""
+        # Pin the knowledge base snapshot for this turn; a live reload only affects later turns
+        self.context_loader = self.context_loader.current()
+
         # Get or create conversation
         conversation = self._get_or_create_conversation(chat_uuid)
         
@@ -139,7 +173,7 @@ class TestChatLogic:
         })
         
         # Determine next state and response using EXACT same logic
-        next_state, response_content, response_type, response_options = self._determine_next_state_and_response(conversation, user_message)
+        next_state, response_content, response_type, response_options, response_attributes = self._determine_next_state_and_response(conversation, user_message)
         
         # Add assistant response to history
         conversation['messages'].append({
@@ -147,6 +181,7 @@ class TestChatLogic:
             'content': response_content,
             'message_type': response_type,
             'options': response_options,
+            'structured_data': {"data_attributes": response_attributes} if response_attributes else None,
             'timestamp': datetime.now().isoformat()
         })
         
@@ -156,5 +191,6 @@ class TestChatLogic:
             'sender': 'bot',
             'message_type': response_type,
             'options': response_options,
-            'state': next_state
+            'state': next_state,
+            'kb_version': self.context_loader.knowledge_base.version
         } 
\ No newline at end of file